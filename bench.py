@@ -0,0 +1,319 @@
+#!/usr/bin/python3
+
+#
+# bench.py
+#
+# benchmark suite for the model functions and the sweep workloads:
+# every camera_model function in scalar and array form, the np.vectorize
+# path test.py used to take, and sweeps from the 9-config f-number sweep
+# up to million-config grids. reports time per call, throughput (model
+# evaluations per second) and peak memory, and compares against a stored
+# baseline: a case slower or hungrier than the baseline by more than the
+# threshold is flagged and the run exits with status 1
+#
+# times are compared as ratios to a reference kernel timed in the same run
+# (a python loop for the per call cases, interpreter bound, a numpy
+# expression for the array ones, memory bound), so a baseline saved on one
+# machine still holds on a faster or slower one. the absolute times are
+# stored too, for reading; entries saved without a ratio compare absolute
+#
+# usage:
+#	python bench.py					# run, compare to bench_baseline.json
+#	python bench.py --save			# run and store as the new baseline
+#	python bench.py -k sweep		# only cases whose name contains 'sweep'
+#
+
+import argparse
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import camera_model as cm
+import catalog
+import decimate
+import export
+import jacobian
+import lut
+import solver
+import sweep
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(HERE, 'bench_baseline.json')
+THRESHOLD = 0.5			# relative slow down flagged
+MEMORY_THRESHOLD = 0.25	# relative peak memory growth flagged
+# timings vary by tens of percent from one process to the next on a busy
+# machine (memory does not): a baseline is the median of SAVE_ROUNDS
+# timings, a case flagged slower is timed again in RETRIES fresh processes
+# and only reported if its best time still is
+SAVE_ROUNDS = 3
+RETRIES = 3
+TIME_SLACK = 1e-6		# s, below which sub-microsecond cases are noise
+
+N_ARRAY = 100000
+# the rulers the other cases are timed against, always run, and the cases
+# the interpreter rather than numpy sets the pace of
+REFERENCES = ('reference/python', 'reference/numpy')
+PYTHON_BOUND = ('scalar/', 'vectorize/', 'lut/coc_scalar')
+
+def _reference_cases():
+	x = np.random.default_rng(2).uniform(1, 2, N_ARRAY)
+
+	def python():
+		s = 0.
+		for i in range(1, 1001):
+			s += abs(1.5 - math.sqrt(i)/i)
+		return s
+
+	return [('reference/python', python, 1000),
+		('reference/numpy', lambda: np.abs(x - 2.2*x/(x + 1.5))*0.5, N_ARRAY)]
+
+def _reference(name):
+	"""return the reference a case is timed against"""
+	if name in REFERENCES:
+		return None
+	return REFERENCES[0] if name.startswith(PYTHON_BOUND) else REFERENCES[1]
+
+def _model_cases():
+	"""(name, callable, evaluations per call) of every model function"""
+	rng = np.random.default_rng(0)
+	d = rng.uniform(0.15, 100, N_ARRAY)
+	f = rng.uniform(3, 50, N_ARRAY)
+	N = rng.uniform(1, 16, N_ARRAY)
+	fov = rng.uniform(10, 80, N_ARRAY)
+	H = cm.hyperfocal_dist(f, N, 0.0088)
+	s_s = cm.dof2s_s(1.0, f)
+	calls = {
+		'get_circle_of_confusion': ((5., 2.2, 16, 16.2),
+			(d, N, f, s_s)),
+		'get_circle_of_confusion_in_pix': ((5., 2.2, 16, 16.2, 2.2),
+			(d, N, f, s_s, 2.2)),
+		'target_size_in_pix': ((5., 44, 1944, 0.1), (d, fov, 1944, 0.1)),
+		'min_target_dist': ((44, 0.1), (fov, 0.1)),
+		'min_target_dist_with_cover': ((44, 0.1, 0.9), (fov, 0.1, 0.9)),
+		'min_FoV': ((5., 0.1), (d, 0.1)),
+		'sensor_FoV': ((16, 2.2, 1944), (f, 2.2, 1944)),
+		'max_target_dist': ((44, 1944, 10, 0.1), (fov, 1944, 10, 0.1)),
+		'hyperfocal_dist': ((16, 2.2, 0.0088), (f, N, 0.0088)),
+		'near_dist_acceptable': ((16, 1000., 12000.), (f, 1000., H)),
+		'far_dist_acceptable': ((16, 1000., 12000.), (f, 1000., H)),
+		'dof2s_s': ((5., 16), (d, f)),
+		's_s2dof': ((16.2, 16), (s_s, f)),
+	}
+	cases = []
+	for name, (scalar, array) in calls.items():
+		func = getattr(cm, name)
+		cases.append(('scalar/' + name, lambda func=func, a=scalar: func(*a), 1))
+		cases.append(('array/' + name,
+			lambda func=func, a=array: func(*a), N_ARRAY))
+	# the np.vectorize wrapper test.py used before the model broadcast
+	vcoc = np.vectorize(cm.get_circle_of_confusion_in_pix,
+		excluded=['N', 'f', 's_s', 'pixel_size'])
+	dv = d[:10000]
+	cases.append(('vectorize/get_circle_of_confusion_in_pix',
+		lambda: vcoc(dv, 2.2, 16, 16.2, 2.2), dv.size))
+	return cases
+
+def _export(path, **kwargs):
+	# a fresh table every call
+	shutil.rmtree(path, ignore_errors=True)
+	export.export_sweep(path, **kwargs)
+
+def _workload_cases():
+	"""(name, callable, evaluations per call) of realistic sweeps"""
+	dist = np.concatenate([np.arange(0.15, 20, .01), np.arange(20, 100, .25)])
+	f_numbers = [1, 1.2, 1.4, 1.8, 2, 2.2, 2.8, 4, 5.6]
+	grid = dict(focal_length=np.linspace(3, 50, 100),
+		f_number=np.linspace(1, 16, 50), pixel_size=[1.4, 2.2, 3.45, 5.5],
+		focus=np.geomspace(0.3, 100, 50), distance=10., accept_coc=4)
+	n_grid = 100*50*4*50
+	rng = np.random.default_rng(1)
+	n = 1000000
+	f, N = rng.uniform(3, 50, n), rng.uniform(1, 16, n)
+	cat = catalog.Catalog.from_columns(focal_length=rng.uniform(3, 50, 10000),
+		f_number=rng.uniform(1, 16, 10000))
+	d100 = np.geomspace(0.1, 1000, 100)
+	table = lut.coc_table(4, 12, cm.dof2s_s(4.1, 12))
+	d = rng.uniform(0.15, 100, n)
+	dd = np.geomspace(0.15, 100, n)
+	coc = cm.get_circle_of_confusion_in_pix(dd, 2.8, 16, cm.dof2s_s(1.5, 16), 2.2)
+	table_dir = os.path.join(tempfile.gettempdir(), 'camera_model_bench_export')
+	return [
+		('sweep/f_number_9', lambda: sweep.sweep(16, f_numbers, 2.2, None,
+			dist, 4, variables=['coc']), 9*dist.size),
+		('sweep/grid_1e6', lambda: sweep.sweep(variables=['coc', 'near', 'far'],
+			**grid), n_grid),
+		('sweep/grid_1e6_compact', lambda: sweep.sweep(variables=['coc', 'near',
+			'far'], precision='compact', **grid), n_grid),
+		('solver/critical_distances_1e6', lambda: solver.critical_distances(f,
+			N, 2.2, 1944, None, 4, 0.1, 10, 0.9), n),
+		('catalog/coc_1e4x100', lambda: cat.coc(d100, 4), 10000*100),
+		('jacobian/camera_1e6', lambda: jacobian.camera_jacobian(f, N, 2., 2.2,
+			d, 4), n),
+		('lut/coc_scalar', lambda: table(5.0), 1),
+		('lut/coc_1e6', lambda: table(d), n),
+		('decimate/minmax_1e6', lambda: decimate.decimate(dd, coc, 800,
+			thresholds=[4]), n),
+		('decimate/lttb_1e6', lambda: decimate.decimate(dd, coc, 1000, 'lttb',
+			thresholds=[4]), n),
+		('export/columns_1e6', lambda: _export(table_dir, variables=['coc'],
+			chunk_size=1 << 16, **grid), n_grid),
+	]
+
+def cases():
+	return _reference_cases() + _model_cases() + _workload_cases()
+
+def time_call(func, min_time = 0.2, repeat = 5):
+	"""return the best time per call in s over repeat runs of >= min_time"""
+	n = 1
+	while True:
+		t = time.perf_counter()
+		for _ in range(n):
+			func()
+		dt = time.perf_counter() - t
+		if dt >= min_time/repeat or n >= 1 << 20:
+			break
+		n *= 4
+	best = dt/n
+	for _ in range(repeat - 1):
+		t = time.perf_counter()
+		for _ in range(n):
+			func()
+		best = min(best, (time.perf_counter() - t)/n)
+	return best
+
+def peak_memory(func):
+	"""return the peak bytes allocated during one call"""
+	tracemalloc.start()
+	try:
+		func()
+		return tracemalloc.get_traced_memory()[1]
+	finally:
+		tracemalloc.stop()
+
+def run(selected, min_time = 0.2, rounds = 1):
+	"""
+	return {name: dict(time, throughput, peak_bytes, relative)}, time the
+	median of rounds timings and relative its ratio to the time of its
+	reference (selected includes the references, first)
+	"""
+	results = {}
+	for name, func, n in selected:
+		t = float(np.median([time_call(func, min_time) for _ in range(rounds)]))
+		results[name] = dict(time=t, throughput=n/t, peak_bytes=peak_memory(func))
+		ref = _reference(name)
+		if ref in results:
+			results[name]['relative'] = t/results[ref]['time']
+	return results
+
+def _time_case(name, min_time):
+	return time_call({c[0]: c[1] for c in cases()}[name], min_time)
+
+def confirm(selected, results, regressions, baseline, threshold = THRESHOLD,
+	min_time = 0.2):
+	"""
+	re-time the cases flagged slower, each in RETRIES new processes, keep
+	their best time and recompare
+	"""
+	import multiprocessing
+	from concurrent.futures import ProcessPoolExecutor
+	evals = {name: n for name, func, n in selected}
+	slower = [name for name, reasons in regressions.items()
+		if any(r.startswith('time') for r in reasons)]
+	with ProcessPoolExecutor(1, multiprocessing.get_context('spawn'),
+		max_tasks_per_child=1) as pool:
+		for name in slower:
+			times = pool.map(_time_case, [name]*RETRIES, [min_time]*RETRIES)
+			t = min([results[name]['time']] + list(times))
+			results[name].update(time=t, throughput=evals[name]/t)
+			ref = _reference(name)
+			if ref in results:
+				results[name]['relative'] = t/results[ref]['time']
+	return compare(results, baseline, threshold)
+
+def compare(results, baseline, threshold = THRESHOLD):
+	"""return {name: [reasons]} for every case regressing against baseline"""
+	regressions = {}
+	for name, r in results.items():
+		b = baseline.get(name)
+		if b is None or name in REFERENCES:
+			continue
+		reasons = []
+		if 'relative' in r and 'relative' in b:
+			# the baseline time scaled to this run's reference time
+			t = b['relative']*r['time']/r['relative']
+		else:
+			t = b['time']
+		if r['time'] > t*(1 + threshold) + TIME_SLACK:
+			reasons.append('time x{:.2f}'.format(r['time']/t))
+		if r['peak_bytes'] > b['peak_bytes']*(1 + MEMORY_THRESHOLD) + 4096:
+			reasons.append('memory x{:.2f}'.format(
+				r['peak_bytes']/max(b['peak_bytes'], 1)))
+		if reasons:
+			regressions[name] = reasons
+	return regressions
+
+def main():
+	parser = argparse.ArgumentParser(
+		description='benchmark the camera model and sweep workloads')
+	parser.add_argument('-k', '--filter', default='',
+		help='only run cases whose name contains this')
+	parser.add_argument('--baseline', default=BASELINE)
+	parser.add_argument('--save', action='store_true',
+		help='store the results as the new baseline')
+	parser.add_argument('--threshold', type=float, default=THRESHOLD,
+		help='relative slow down flagged')
+	parser.add_argument('--min-time', type=float, default=0.2,
+		help='seconds spent timing each case')
+	args = parser.parse_args()
+
+	selected = [c for c in cases() if c[0] in REFERENCES or
+		args.filter in c[0]]
+	results = run(selected, args.min_time, SAVE_ROUNDS if args.save else 1)
+	baseline = {}
+	if os.path.exists(args.baseline):
+		with open(args.baseline) as f:
+			baseline = json.load(f)
+	regressions = compare(results, baseline, args.threshold)
+	if regressions and not args.save:
+		regressions = confirm(selected, results, regressions, baseline,
+			args.threshold, args.min_time)
+	missing = [name for name in results if name not in baseline]
+	speed = ['{} x{:.2f}'.format(ref.split('/')[1],
+		results[ref]['time']/baseline[ref]['time'])
+		for ref in REFERENCES if ref in baseline]
+
+	print('{:<48} {:>12} {:>14} {:>12}'.format('case', 'time/call',
+		'evals/s', 'peak mem'))
+	for name, r in results.items():
+		flag = '  REGRESSION: ' + ', '.join(regressions[name]) \
+			if name in regressions else ''
+		if name in missing and not args.save:
+			flag = '  (no baseline)'
+		print('{:<48} {:>10.3g} s {:>14.3g} {:>9.1f} MB{}'.format(name,
+			r['time'], r['throughput'], r['peak_bytes']/2**20, flag))
+	if speed and not args.save:
+		print('reference time against the baseline:', ', '.join(speed))
+
+	if args.save:
+		baseline.update(results)
+		with open(args.baseline, 'w') as f:
+			json.dump(baseline, f, indent=1, sort_keys=True)
+		print('baseline saved to', args.baseline)
+		return 0
+	if not baseline:
+		# nothing to compare against would pass every run
+		print('warning: no baseline at {}, run with --save first'.format(
+			args.baseline), file=sys.stderr)
+		return 2
+	if missing:
+		print('warning: {} cases not in the baseline: {}'.format(len(missing),
+			', '.join(missing)), file=sys.stderr)
+	return 1 if regressions else 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,74 @@
+#!/usr/bin/python3
+
+#
+# bench_import.py
+#
+# cold start benchmark: imports every core module in a fresh interpreter
+# and fails (exit status 1) if one pulls in a plotting library or costs
+# more than the budget on top of numpy itself
+#
+# usage: python bench_import.py [--budget-ms 50] [--repeat 5]
+#
+
+import argparse
+import os
+import subprocess
+import sys
+
+CORE = ['camera_model', 'sweep', 'solver', 'design', 'cache', 'store',
+	'catalog', 'sampling', 'plotting', 'montecarlo',
+	'trajectory', 'coverage', 'lut',
+	'blur', 'sensormap', 'jacobian', 'parallel', 'decimate', 'instrument',
+	'export']
+HEAVY = ['matplotlib']		# must never be imported by the core
+BUDGET_MS = 50				# import cost on top of numpy, in ms
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def _run(args):
+	return subprocess.run([sys.executable] + args, cwd=HERE,
+		capture_output=True, text=True, check=True)
+
+def import_time(module):
+	"""
+	return the cold import time of module in ms, minus numpy's, from
+	python -X importtime in a fresh interpreter
+	"""
+	err = _run(['-X', 'importtime', '-c', 'import ' + module]).stderr
+	cumulative = {}
+	for line in err.splitlines():
+		if not line.startswith('import time:') or '|' not in line:
+			continue
+		fields = line[len('import time:'):].split('|')
+		if not fields[1].strip().isdigit():
+			continue		# the header line
+		cumulative[fields[2].strip()] = int(fields[1])
+	return (cumulative[module] - cumulative.get('numpy', 0))/1000
+
+def heavy_imports(module):
+	"""return the HEAVY packages that importing module loads"""
+	code = ('import sys, {}; print(" ".join(sorted(set('
+		'm.split(".")[0] for m in sys.modules))))').format(module)
+	loaded = _run(['-c', code]).stdout.split()
+	return [m for m in HEAVY if m in loaded]
+
+def main():
+	parser = argparse.ArgumentParser(
+		description='cold start import benchmark of the core modules')
+	parser.add_argument('--budget-ms', type=float, default=BUDGET_MS)
+	parser.add_argument('--repeat', type=int, default=5)
+	args = parser.parse_args()
+
+	failed = False
+	for module in CORE:
+		ms = min(import_time(module) for _ in range(args.repeat))
+		heavy = heavy_imports(module)
+		ok = ms <= args.budget_ms and not heavy
+		failed |= not ok
+		print('{:<14} {:8.1f} ms {}{}'.format(module, ms,
+			'ok' if ok else 'FAIL',
+			' (imports {})'.format(', '.join(heavy)) if heavy else ''))
+	return 1 if failed else 0
+
+if __name__ == '__main__':
+	sys.exit(main())
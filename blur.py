@@ -0,0 +1,159 @@
+#!/usr/bin/python3
+
+#
+# blur.py
+#
+# combined blur of defocus, diffraction and pixel sampling
+#
+# camera_model.get_circle_of_confusion is geometric defocus only; at f/4 -
+# f/5.6 on 2.2 um pixels the Airy disk (2.44*lambda*N, ~5 um at 550 nm and
+# f/4) is bigger than a pixel, so it matters as much as defocus. two views:
+#  - effective_blur_in_pix: one blur diameter. the three spots convolve, so
+#    their variances add; each is replaced by its per axis variance
+#    (uniform disk d^2/16, pixel box p^2/12, Airy core as a Gaussian of
+#    sigma 0.42*lambda*N) and the sum is given back as the diameter of the
+#    uniform disk with that variance, so with diffraction and pixel off it
+#    is exactly the CoC
+#  - mtf: the product of the defocus, diffraction and pixel aperture MTFs
+#    at a spatial frequency, and mtf50 where it falls to one half
+# everything broadcasts over distance, f-number, focal length, pixel size
+# and wavelength; a wavelength band is integrated over an extra trailing
+# axis in the same call
+#
+
+import numpy as np
+import camera_model as cm
+import solver
+
+NM_2_MM = 1e-6
+AIRY = 2.44				# Airy disk diameter, first zero, in lambda*N
+AIRY_SIGMA = 0.42		# Gaussian fit to the Airy core, in lambda*N
+WAVELENGTH = 550		# nm
+
+# (wavelengths in nm, weights): flat visible band, 10 nm steps
+VISIBLE = (np.arange(450, 651, 10, dtype=np.float64), np.ones(21))
+
+def airy_diameter(N, wavelength = WAVELENGTH):
+	"""
+	return the Airy disk diameter (to the first dark ring) in mm
+	wavelength: in nm
+	"""
+	return cm._out(AIRY*np.multiply(wavelength, NM_2_MM)*N)
+
+def _band_mean(func, band):
+	"""weighted mean of func(wavelength) over a band, on a trailing axis"""
+	wl, w = (np.asarray(a, dtype=np.float64) for a in band)
+	return np.tensordot(func(wl), w/w.sum(), axes=([-1], [0]))
+
+def _variance(s_t, N, f, s_s, pixel_size, wavelength, band, diffraction, pixel):
+	"""per axis variance of the combined spot in mm^2"""
+	var = np.square(cm.get_circle_of_confusion(s_t, N, f, s_s))/16
+	if diffraction:
+		N = np.asarray(N, dtype=np.float64)
+		if band is None:
+			sigma2 = np.square(AIRY_SIGMA*np.multiply(wavelength, NM_2_MM)*N)
+		else:
+			# only lambda^2 depends on the band: one weighted mean
+			sigma2 = np.square(AIRY_SIGMA*N*NM_2_MM)*_band_mean(np.square, band)
+		var = var + sigma2
+	if pixel:
+		var = var + np.square(np.divide(pixel_size, cm.MM_2_UM))/12
+	return var
+
+def effective_blur(s_t, N, f, s_s, pixel_size = 2.2, wavelength = WAVELENGTH,
+	band = None, diffraction = True, pixel = True):
+	"""
+	return the combined blur diameter in mm, the diameter of the uniform
+	disk with the same variance as defocus * diffraction * pixel aperture
+	s_t: distance from target, in m
+	s_s: distance b/w lens and sensor when in focus, in mm
+	pixel_size: in um
+	wavelength: in nm, broadcast like the other arguments
+	band: (wavelengths in nm, weights) integrated instead of wavelength,
+	e.g. VISIBLE
+	diffraction, pixel: include the Airy spot / pixel aperture
+	"""
+	return cm._out(4*np.sqrt(_variance(s_t, N, f, s_s, pixel_size, wavelength,
+		band, diffraction, pixel)))
+
+def effective_blur_in_pix(s_t, N, f, s_s, pixel_size = 2.2,
+	wavelength = WAVELENGTH, band = None, diffraction = True, pixel = True):
+	"""
+	return the combined blur diameter in pixels (see effective_blur), to
+	compare against an acceptable CoC in pixels
+	"""
+	blur = effective_blur(s_t, N, f, s_s, pixel_size, wavelength, band,
+		diffraction, pixel)
+	return cm._out(np.divide(blur, np.divide(pixel_size, cm.MM_2_UM)))
+
+# MTFs, spatial frequency in cycles per pixel (0.5 is Nyquist)
+
+def _j1(x):
+	"""Bessel J1, Abramowitz & Stegun 9.4.4 / 9.4.6, |error| < 1e-7"""
+	x = np.abs(np.asarray(x, dtype=np.float64))
+	small = x <= 3
+	y = np.square(np.where(small, x, 3)/3)
+	j_small = x*(0.5 + y*(-0.56249985 + y*(0.21093573 + y*(-0.03954289 +
+		y*(0.00443319 + y*(-0.00031761 + y*0.00001109))))))
+	z = 3/np.where(small, 3, x)
+	f1 = 0.79788456 + z*(0.00000156 + z*(0.01659667 + z*(0.00017105 +
+		z*(-0.00249511 + z*(0.00113653 - z*0.00020033)))))
+	t1 = np.where(small, 3, x) - 2.35619449 + z*(0.12499612 + z*(0.00005650 +
+		z*(-0.00637879 + z*(0.00074348 + z*(0.00079824 - z*0.00029166)))))
+	j_large = f1*np.cos(t1)/np.sqrt(np.where(small, 3, x))
+	return np.where(small, j_small, j_large)
+
+def defocus_mtf(freq, coc, pixel_size = 2.2):
+	"""
+	return the MTF of a uniform blur disk of diameter coc (mm), 2*J1(x)/x;
+	negative past the first zero (contrast reversal)
+	"""
+	x = np.pi*np.multiply(coc, freq)/np.divide(pixel_size, cm.MM_2_UM)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		return np.where(x < 1e-8, 1., 2*_j1(x)/x)
+
+def diffraction_mtf(freq, N, pixel_size = 2.2, wavelength = WAVELENGTH):
+	"""return the diffraction MTF of a circular aperture, 0 past cut-off"""
+	x = np.minimum(np.multiply(freq, wavelength)*NM_2_MM*N/np.divide(
+		pixel_size, cm.MM_2_UM), 1)
+	return 2/np.pi*(np.arccos(x) - x*np.sqrt(1 - x*x))
+
+def pixel_mtf(freq):
+	"""return the MTF of a square pixel with 100% fill factor"""
+	return np.abs(np.sinc(freq))
+
+def mtf(freq, s_t, N, f, s_s, pixel_size = 2.2, wavelength = WAVELENGTH,
+	band = None, diffraction = True, pixel = True):
+	"""
+	return the system MTF at freq cycles per pixel, defocus * diffraction *
+	pixel aperture, all arguments broadcast; with a band, the diffraction
+	MTF is the weighted mean over its wavelengths (a trailing axis summed
+	in the same call)
+	"""
+	coc = cm.get_circle_of_confusion(s_t, N, f, s_s)
+	m = defocus_mtf(freq, coc, pixel_size)
+	if diffraction:
+		if band is None:
+			m = m*diffraction_mtf(freq, N, pixel_size, wavelength)
+		else:
+			expand = lambda a: np.expand_dims(a, -1)
+			m = m*_band_mean(lambda wl: diffraction_mtf(expand(freq), expand(N),
+				expand(pixel_size), wl), band)
+	if pixel:
+		m = m*pixel_mtf(freq)
+	return cm._out(m)
+
+def mtf50(s_t, N, f, s_s, pixel_size = 2.2, wavelength = WAVELENGTH,
+	band = None, diffraction = True, pixel = True):
+	"""
+	return the frequency in cycles per pixel where the MTF falls to 0.5,
+	nan where it is still above 0.5 at Nyquist
+	"""
+	args = np.broadcast_arrays(*(np.asarray(a, dtype=np.float64)
+		for a in (s_t, N, f, s_s, pixel_size, wavelength)))
+	# below its first zero every factor decreases with frequency, so the
+	# MTF crosses 0.5 at most once on [0, Nyquist]
+	func = lambda nu: mtf(nu, *args[:5], args[5], band, diffraction, pixel) - 0.5
+	shape = args[0].shape
+	return cm._out(solver.find_root(func, np.zeros(shape), np.full(shape, 0.5)))
+
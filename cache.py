@@ -0,0 +1,309 @@
+#!/usr/bin/python3
+
+#
+# cache.py
+#
+# persistent cache for sweep and model results, keyed by a canonical hash
+# of the inputs and of the model source code
+#
+# two tiers: an in-memory LRU, and a disk tier with one directory per
+# entry holding plain .npy files, which come back memory-mapped so a hit
+# never loads the whole result into RAM. both tiers evict least recently
+# used entries beyond a byte budget; editing the model code changes the
+# version every key includes, so stale entries are never hit and
+# prune() removes them. a decorated function's keys also include the
+# source of the file it is defined in, so editing a report's own
+# computation misses as well (those entries age out of the disk budget)
+#
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from functools import wraps
+import numpy as np
+import sweep
+
+# modules whose source defines the results
+MODEL_MODULES = ('camera_model.py', 'sweep.py', 'blur.py')
+
+DEFAULT_DIR = os.environ.get('CAMERA_MODEL_CACHE',
+	os.path.join(os.path.expanduser('~'), '.cache', 'camera_model'))
+MEMORY_BYTES = 256 << 20
+DISK_BYTES = 4 << 30
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_version = None
+_sources = {}
+
+def model_version():
+	"""return a hash of the source of the model modules"""
+	global _version
+	if _version is None:
+		h = hashlib.sha256()
+		for name in MODEL_MODULES:
+			with open(os.path.join(_HERE, name), 'rb') as f:
+				h.update(f.read())
+		_version = h.hexdigest()[:16]
+	return _version
+
+def source_version(path):
+	"""return a hash of the file at path, '' if there is none"""
+	if path not in _sources:
+		try:
+			with open(path, 'rb') as f:
+				_sources[path] = hashlib.sha256(f.read()).hexdigest()[:16]
+		except (OSError, TypeError):		# no file, or path None
+			_sources[path] = ''
+	return _sources[path]
+
+def _update(h, value):
+	"""feed a canonical, type tagged encoding of value into hash h"""
+	if value is None or isinstance(value, str):
+		h.update(repr(value).encode())
+	elif isinstance(value, (bool, np.bool_)):
+		h.update(repr(bool(value)).encode())
+	elif isinstance(value, (int, float, np.number)):
+		# 2, 2.0 and np.float64(2) are the same model input
+		h.update(b'n' + np.float64(value).tobytes())
+	elif isinstance(value, np.ndarray):
+		a = np.ascontiguousarray(value)
+		h.update('a{}{}'.format(a.dtype.str, a.shape).encode())
+		h.update(a.tobytes())
+	elif isinstance(value, (list, tuple)):
+		h.update('l{}'.format(len(value)).encode())
+		for v in value:
+			_update(h, v)
+	elif isinstance(value, dict):
+		h.update('d{}'.format(len(value)).encode())
+		for k in sorted(value):
+			_update(h, k)
+			_update(h, value[k])
+	else:
+		raise TypeError('cannot hash {!r} for the cache'.format(type(value)))
+
+def cache_key(name, *args, **kwargs):
+	"""return the hex key of calling name(*args, **kwargs) with this model"""
+	h = hashlib.sha256()
+	_update(h, [model_version(), name, list(args), kwargs])
+	return h.hexdigest()
+
+def _nbytes(value):
+	if isinstance(value, sweep.SweepResult):
+		return (sum(a.nbytes for a in value.data.values()) +
+			sum(a.nbytes for a in value.axes.values()))
+	if isinstance(value, tuple):
+		return sum(_nbytes(v) for v in value)
+	return np.asarray(value).nbytes
+
+def _freeze(value):
+	"""
+	make the arrays of a cached value read-only: every caller gets the same
+	object, one writing into it would change what the others get
+	"""
+	if isinstance(value, sweep.SweepResult):
+		arrays = list(value.axes.values()) + list(value.data.values())
+	elif isinstance(value, tuple):
+		arrays = value
+	else:
+		arrays = [value]
+	for a in arrays:
+		if isinstance(a, np.ndarray):
+			a.setflags(write=False)
+	return value
+
+def _dir_bytes(path):
+	return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+class Cache:
+	"""
+	two tier LRU cache of arrays, tuples of arrays and SweepResults; the
+	arrays handed out (and those put) are read-only
+	directory: disk tier location, None for memory only
+	"""
+
+	def __init__(self, directory = DEFAULT_DIR, memory_bytes = MEMORY_BYTES,
+		disk_bytes = DISK_BYTES):
+		self.directory = directory
+		self.memory_bytes = memory_bytes
+		self.disk_bytes = disk_bytes
+		self._memory = OrderedDict()
+		self._memory_used = 0
+		self.hits = 0
+		self.misses = 0
+		if directory:
+			os.makedirs(directory, exist_ok=True)
+
+	def get(self, key):
+		"""return the cached value of key, or None"""
+		if key in self._memory:
+			self._memory.move_to_end(key)
+			self.hits += 1
+			return self._memory[key][0]
+		value = self._load(key)
+		if value is None:
+			self.misses += 1
+			return None
+		self.hits += 1
+		self._remember(key, _freeze(value))
+		return value
+
+	def put(self, key, value):
+		"""store value under key in both tiers"""
+		_freeze(value)
+		self._remember(key, value)
+		if self.directory:
+			self._store(key, value)
+			self._evict_disk()
+
+	def __call__(self, func):
+		"""
+		decorator caching func on its arguments, bound to its signature so
+		f(2) and f(2, n=<default>) share an entry, and on the source of the
+		file func is defined in
+		"""
+		import inspect		# slow to import, only needed to decorate
+		try:
+			source = source_version(inspect.getsourcefile(func))
+		except TypeError:		# a builtin
+			source = ''
+		name = '{}.{}@{}'.format(func.__module__, func.__qualname__, source)
+		signature = inspect.signature(func)
+
+		@wraps(func)
+		def wrapper(*args, **kwargs):
+			bound = signature.bind(*args, **kwargs)
+			bound.apply_defaults()
+			key = cache_key(name, dict(bound.arguments))
+			value = self.get(key)
+			if value is None:
+				value = func(*args, **kwargs)
+				self.put(key, value)
+			return value
+		return wrapper
+
+	def clear(self):
+		"""drop every entry of both tiers"""
+		self._memory.clear()
+		self._memory_used = 0
+		if self.directory:
+			for entry in os.listdir(self.directory):
+				shutil.rmtree(os.path.join(self.directory, entry),
+					ignore_errors=True)
+
+	def prune(self):
+		"""remove disk entries written by another model version"""
+		if not self.directory:
+			return
+		for entry in os.listdir(self.directory):
+			path = os.path.join(self.directory, entry)
+			try:
+				with open(os.path.join(path, 'meta.json')) as f:
+					stale = json.load(f)['version'] != model_version()
+			except (OSError, ValueError, KeyError):
+				stale = True
+			if stale:
+				shutil.rmtree(path, ignore_errors=True)
+
+	# memory tier
+
+	def _remember(self, key, value):
+		size = _nbytes(value)
+		if size > self.memory_bytes:
+			return
+		if key in self._memory:
+			self._memory_used -= self._memory.pop(key)[1]
+		self._memory[key] = (value, size)
+		self._memory_used += size
+		while self._memory_used > self.memory_bytes:
+			self._memory_used -= self._memory.popitem(last=False)[1][1]
+
+	# disk tier: <directory>/<key>/meta.json plus one .npy per array
+
+	def _store(self, key, value):
+		path = os.path.join(self.directory, key)
+		if os.path.isdir(path):
+			return
+		meta = dict(version=model_version())
+		arrays = {}
+		if isinstance(value, sweep.SweepResult):
+			meta.update(kind='sweep', axes=list(value.axes),
+				dims={n: list(d) for n, d in value.dims.items()},
+				attrs=value.attrs)
+			arrays.update(('axis.' + a, v) for a, v in value.axes.items())
+			arrays.update(('var.' + n, v) for n, v in value.data.items())
+		elif isinstance(value, tuple):
+			meta.update(kind='tuple', n=len(value))
+			arrays.update(('item.{}'.format(i), v) for i, v in enumerate(value))
+		else:
+			meta.update(kind='array')
+			arrays['value'] = value
+		tmp = tempfile.mkdtemp(dir=self.directory, prefix='.tmp-')
+		try:
+			for name, a in arrays.items():
+				np.save(os.path.join(tmp, name + '.npy'), np.asarray(a))
+			with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+				json.dump(meta, f)
+		except BaseException:		# a full disk, an unsaveable array
+			shutil.rmtree(tmp, ignore_errors=True)
+			raise
+		try:
+			os.rename(tmp, path)
+		except OSError:		# written concurrently by someone else
+			shutil.rmtree(tmp, ignore_errors=True)
+
+	def _load(self, key):
+		if not self.directory:
+			return None
+		path = os.path.join(self.directory, key)
+		try:
+			with open(os.path.join(path, 'meta.json')) as f:
+				meta = json.load(f)
+		except (OSError, ValueError):
+			return None
+		os.utime(path)		# mark as recently used for eviction
+
+		def load(name):
+			a = np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+			return a[()] if a.ndim == 0 else a
+
+		if meta['kind'] == 'sweep':
+			axes = {a: load('axis.' + a) for a in meta['axes']}
+			data = {n: load('var.' + n) for n in meta['dims']}
+			dims = {n: tuple(d) for n, d in meta['dims'].items()}
+			return sweep.SweepResult(axes, dims, data, meta['attrs'])
+		if meta['kind'] == 'tuple':
+			return tuple(load('item.{}'.format(i)) for i in range(meta['n']))
+		return load('value')
+
+	def _evict_disk(self):
+		entries = []
+		for entry in os.listdir(self.directory):
+			path = os.path.join(self.directory, entry)
+			if entry.startswith('.tmp-') or not os.path.isdir(path):
+				continue
+			entries.append((os.path.getmtime(path), _dir_bytes(path), path))
+		used = sum(e[1] for e in entries)
+		for mtime, size, path in sorted(entries):
+			if used <= self.disk_bytes:
+				break
+			shutil.rmtree(path, ignore_errors=True)
+			used -= size
+
+_default = None
+
+def default_cache():
+	"""return the process wide cache in DEFAULT_DIR"""
+	global _default
+	if _default is None:
+		_default = Cache()
+	return _default
+
+def cached_sweep(*args, **kwargs):
+	"""sweep.sweep through the default cache"""
+	if kwargs.get('out') is not None:
+		return sweep.sweep(*args, **kwargs)
+	return default_cache()(sweep.sweep)(*args, **kwargs)
+
@@ -2,21 +2,52 @@
 
 # 
 # camera_model.py
-#
+# 
 # module to characterize cameras
 # 
+# every function broadcasts over NumPy arrays in all of its arguments;
+# scalar arguments give back scalars, as before: single numbers take the
+# original math based expressions, bit-identical and without the ndarray
+# round trip (a division by zero there falls through to numpy, which
+# gives inf / nan)
+# 
 
 import numpy as np 
-import matplotlib.pyplot as plt
-from matplotlib.ticker import FormatStrFormatter
-from math import fabs, ceil, floor, tan, atan, radians, degrees
-import sys # for maxsize
+from math import fabs, ceil, tan, atan, radians, degrees
 
 M_2_MM = 1000
 MM_2_UM = 1000
 M_2_CM = 100
 CM_2_MM = 10
 
+def _out(x, cast = float):
+	"""
+	return x unchanged if it is an array, otherwise as a python scalar
+	cast: type used for scalar results (float, or int for pixel counts)
+	"""
+	if np.ndim(x) == 0:
+		return cast(x)
+	return x
+
+# numbers taking the math path; numpy scalars are what np.vectorize passes
+_NUMBERS = frozenset((int, float, np.float64, np.int64))
+
+def _scalar(*args):
+	"""return True if every argument is a single int or float"""
+	for a in args:
+		if a.__class__ not in _NUMBERS:		# faster than isinstance
+			return False
+	return True
+
+def _tan(x):
+	"""
+	np.tan for arrays; math.tan for scalars so that scalar results stay
+	bit-identical to the original math based model (np.tan can differ by 1 ulp)
+	"""
+	if np.ndim(x) == 0:
+		return tan(x)
+	return np.tan(x)
+
 def get_circle_of_confusion(s_t, N, f, s_s):
 	"""
 	return: diameter of CoC in mm
@@ -27,8 +58,14 @@ def get_circle_of_confusion(s_t, N, f, s_s):
 	s_s: distance b/w lens and sensor when in focus, in mm
 	s_t: distance from target, in m
 	"""
-	s_t *= M_2_MM
-	return (1/N) * fabs(f-s_s*(s_t-f)/s_t)
+	if _scalar(s_t, N, f, s_s):
+		try:
+			s_t = s_t*M_2_MM
+			return (1/N) * fabs(f-s_s*(s_t-f)/s_t)
+		except ZeroDivisionError:
+			pass
+	s_t = np.multiply(s_t, M_2_MM)	# never scale the caller's array in place
+	return _out(np.divide(1, N) * np.abs(f-s_s*(s_t-f)/s_t))
 
 def get_circle_of_confusion_in_pix(s_t, N, f, s_s, pixel_size = 2.2):
 	"""
@@ -43,7 +80,12 @@ def get_circle_of_confusion_in_pix(s_t, N, f, s_s, pixel_size = 2.2):
 	"""
 	# s_s = dof2s_s(dof, f)
 	d_CoC = get_circle_of_confusion(s_t, N, f, s_s)
-	return (d_CoC/(pixel_size/MM_2_UM))
+	if _scalar(d_CoC, pixel_size):
+		try:
+			return (d_CoC/(pixel_size/MM_2_UM))
+		except ZeroDivisionError:
+			pass
+	return _out(np.divide(d_CoC, np.divide(pixel_size, MM_2_UM)))
 
 def target_size_in_pix(s_t, FoV, res, feat_size):
 	"""
@@ -53,10 +95,18 @@ def target_size_in_pix(s_t, FoV, res, feat_size):
 	res: the sensor resolution in pixels (one dimension)
 	feat_size: size of target feature in m 
 	"""
-	FoV_rad = radians(FoV)
+	if _scalar(s_t, FoV, res, feat_size):
+		try:
+			return ceil(feat_size/(s_t * tan(radians(FoV)/res)))
+		except (ZeroDivisionError, OverflowError, ValueError):
+			pass
+	FoV_rad = np.radians(FoV)
 	iFoV = FoV_rad/res 		# sliver of FoV per pixel
-	x = s_t * tan(iFoV)		# pixel projection s_t metres away
-	return ceil(feat_size/x)
+	x = np.multiply(s_t, _tan(iFoV))	# pixel projection s_t metres away
+	n = np.ceil(feat_size/x)
+	if np.ndim(n) == 0 and not np.isfinite(n):
+		return float(n)		# no int holds inf / nan
+	return _out(n, int)
 
 def min_target_dist(FoV, feat_size):
 	"""
@@ -69,20 +119,55 @@ def min_target_dist(FoV, feat_size):
 	# iFoV = FoV_rad/res
 	# x = feat_size/res 		# required pixel projection
 	# return x/tan(iFoV)
-	return (feat_size/2)/tan(radians(FoV)/2)
+	if _scalar(FoV, feat_size):
+		try:
+			return (feat_size/2)/tan(radians(FoV)/2)
+		except ZeroDivisionError:
+			pass
+	return _out(np.divide(feat_size, 2)/_tan(np.radians(FoV)/2))
 
 def min_target_dist_with_cover(FoV, feat_size, cover):
-	feat_size = feat_size/cover
+	if _scalar(feat_size, cover):
+		try:
+			return min_target_dist(FoV, feat_size/cover)
+		except ZeroDivisionError:
+			pass
+	feat_size = np.divide(feat_size, cover)
 	return min_target_dist(FoV, feat_size)
 
 def min_FoV(dist, feat_size):
-	return degrees(2*atan(feat_size/(2*dist)))
+	if _scalar(dist, feat_size):
+		try:
+			return degrees(2*atan(feat_size/(2*dist)))
+		except ZeroDivisionError:
+			pass
+	return _out(np.degrees(2*np.arctan(np.divide(feat_size, np.multiply(2, dist)))))
+
+def sensor_FoV(f, pixel_size, res):
+	"""
+	return the field of view in degrees (one dimension) of a sensor behind a lens
+	f: focal length: in mm
+	pixel_size: size of a pixel square on the sensor, measured in um
+	res: the sensor resolution in pixels (one dimension)
+	"""
+	if _scalar(f, pixel_size, res):
+		try:
+			return degrees(2*atan(res*pixel_size/(2*MM_2_UM)/f))
+		except ZeroDivisionError:
+			pass
+	half_width = np.multiply(res, pixel_size)/(2*MM_2_UM)	# in mm
+	return _out(np.degrees(2*np.arctan(half_width/f)))
 
 def max_target_dist(FoV, res, min_n_pixel, feat_size):
-	FoV_rad = radians(FoV)
+	if _scalar(FoV, res, min_n_pixel, feat_size):
+		try:
+			return (feat_size/min_n_pixel)/tan(radians(FoV)/res)
+		except ZeroDivisionError:
+			pass
+	FoV_rad = np.radians(FoV)
 	iFoV = FoV_rad/res
-	x = feat_size/min_n_pixel 	# required pixel projection for detection
-	return x/tan(iFoV)
+	x = np.divide(feat_size, min_n_pixel) 	# required pixel projection for detection
+	return _out(x/_tan(iFoV))
 
 def hyperfocal_dist(f, N, c):
 	"""
@@ -92,36 +177,63 @@ def hyperfocal_dist(f, N, c):
 	N: f-number
 	c: circle of confusion in mm
 	"""
-	H = ((f**2)/(N*c)) + f
-	return H
+	if _scalar(f, N, c):
+		try:
+			return ((f**2)/(N*c)) + f
+		except ZeroDivisionError:
+			pass
+	H = ((f**2)/np.multiply(N, c)) + f
+	return _out(H)
 
 def near_dist_acceptable(f, focus, H):
 	"""
 	f: focal length: in mm
 	focus in mm
 	H: hyperfocal distance in mm
+	returns np.inf where the denominator vanishes
 	"""
-	if (H+focus-(2*f)) == 0:
-		return sys.maxsize # effectively infinite
-	return (focus*(H-f))/(H+focus-(2*f))
+	if _scalar(f, focus, H):
+		if (H+focus-(2*f)) == 0:
+			return np.inf
+		return (focus*(H-f))/(H+focus-(2*f))
+	den = np.add(H, focus)-np.multiply(2, f)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		near = np.multiply(focus, np.subtract(H, f))/den
+	return _out(np.where(den == 0, np.inf, near))
 
 def far_dist_acceptable(f, focus, H):
-	"""radians
+	"""
 	f: focal length: in mm
 	focus in mm
 	H: hyperfocal distance in mm
+	returns np.inf where the denominator vanishes (focused at H)
 	"""
-	if (H-focus == 0):
-		return sys.maxsize
-	return (focus*(H-f))/(H-focus)
+	if _scalar(f, focus, H):
+		if (H-focus == 0):
+			return np.inf
+		return (focus*(H-f))/(H-focus)
+	den = np.subtract(H, focus)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		far = np.multiply(focus, np.subtract(H, f))/den
+	return _out(np.where(den == 0, np.inf, far))
 
 def dof2s_s(dof, f):
 	"""dof in m"""
-	dof *= M_2_MM
-	return (f * dof) / (dof - f)
+	if _scalar(dof, f):
+		try:
+			dof_mm = dof*M_2_MM
+			return (f * dof_mm) / (dof_mm - f)
+		except ZeroDivisionError:
+			pass
+	dof = np.multiply(dof, M_2_MM)	# never scale the caller's array in place
+	return _out((np.multiply(f, dof)) / (dof - f))
 
 def s_s2dof(s_s, f):
 	"""s_s in mm"""
-	return ((f * s_s) / (s_s - f))/M_2_MM
-
+	if _scalar(s_s, f):
+		try:
+			return ((f * s_s) / (s_s - f))/M_2_MM
+		except ZeroDivisionError:
+			pass
+	return _out(((np.multiply(f, s_s)) / np.subtract(s_s, f))/M_2_MM)
 
@@ -0,0 +1,222 @@
+#!/usr/bin/python3
+
+#
+# catalog.py
+#
+# camera / lens / sensor catalog: Camera is a single record, Catalog a
+# column oriented table (a structured NumPy array) for thousands of
+# candidates, on which every model function runs in one vectorized call
+#
+
+import numpy as np
+import camera_model as cm
+import solver
+
+# one row per lens + sensor pair; focus nan means focused at hyperfocal
+DTYPE = np.dtype([
+	('name', 'U32'),
+	('focal_length', 'f8'),	# mm
+	('f_number', 'f8'),
+	('pixel_size', 'f8'),	# um
+	('res_x', 'i4'),		# pixels
+	('res_y', 'i4'),		# pixels
+	('fov_x', 'f8'),		# deg
+	('fov_y', 'f8'),		# deg
+	('focus', 'f8'),		# m
+])
+FIELDS = DTYPE.names
+
+class Camera:
+	"""
+	a single camera: lens, sensor and focus
+	focal_length: in mm
+	pixel_size: in um
+	res_x, res_y: sensor resolution in pixels
+	fov_x, fov_y: field of view in degrees, None to derive from the sensor
+	focus: focus distance in m, None for the hyperfocal distance
+	"""
+	__slots__ = FIELDS
+
+	def __init__(self, name, focal_length, f_number, pixel_size = 2.2,
+		res_x = 2592, res_y = 1944, fov_x = None, fov_y = None, focus = None):
+		self.name = name
+		self.focal_length = focal_length
+		self.f_number = f_number
+		self.pixel_size = pixel_size
+		self.res_x = res_x
+		self.res_y = res_y
+		if fov_x is None:
+			fov_x = cm.sensor_FoV(focal_length, pixel_size, res_x)
+		if fov_y is None:
+			fov_y = cm.sensor_FoV(focal_length, pixel_size, res_y)
+		self.fov_x = fov_x
+		self.fov_y = fov_y
+		self.focus = focus
+
+	def __repr__(self):
+		return 'Camera({!r}, {} mm, f/{}, {}x{} px of {} um)'.format(self.name,
+			self.focal_length, self.f_number, self.res_x, self.res_y,
+			self.pixel_size)
+
+	def astuple(self):
+		return tuple(np.nan if f == 'focus' and self.focus is None
+			else getattr(self, f) for f in FIELDS)
+
+class Catalog:
+	"""
+	table of cameras backed by one structured array (see DTYPE)
+	catalog['f_number'] is a column, catalog[i] a Camera, catalog[i:j] a
+	sub-catalog viewing the same memory and catalog[mask] a filtered copy
+	"""
+	__slots__ = ('table',)
+
+	def __init__(self, table):
+		self.table = table
+
+	@classmethod
+	def from_cameras(cls, cameras):
+		return cls(np.array([c.astuple() for c in cameras], dtype=DTYPE))
+
+	@classmethod
+	def from_columns(cls, **columns):
+		"""
+		return a catalog from equal length column arrays; missing fov_x,
+		fov_y are derived from the sensor, missing focus is hyperfocal
+		"""
+		n = len(next(iter(columns.values())))
+		table = np.zeros(n, dtype=DTYPE)
+		table['res_x'] = 2592
+		table['res_y'] = 1944
+		table['pixel_size'] = 2.2
+		table['fov_x'] = table['fov_y'] = table['focus'] = np.nan
+		for name, values in columns.items():
+			table[name] = values
+		for fov, res in (('fov_x', 'res_x'), ('fov_y', 'res_y')):
+			derive = np.isnan(table[fov])
+			table[fov][derive] = cm.sensor_FoV(table['focal_length'][derive],
+				table['pixel_size'][derive], table[res][derive])
+		return cls(table)
+
+	@classmethod
+	def load_csv(cls, path):
+		"""
+		return a catalog from a vendor CSV file with a header row naming
+		any of the DTYPE fields (other columns are ignored)
+		"""
+		with open(path) as f:
+			header = [h.strip() for h in f.readline().split(',')]
+			cols = [i for i, h in enumerate(header) if h in FIELDS]
+			dtype = [(header[i], DTYPE[header[i]]) for i in cols]
+			data = np.loadtxt(f, delimiter=',', dtype=dtype, usecols=cols,
+				ndmin=1)
+		return cls.from_columns(**{name: data[name] for name in data.dtype.names})
+
+	def save_csv(self, path):
+		with open(path, 'w') as f:
+			f.write(','.join(FIELDS) + '\n')
+			for row in self.table.tolist():
+				f.write(','.join(str(v) for v in row) + '\n')
+
+	def __len__(self):
+		return len(self.table)
+
+	def __repr__(self):
+		return 'Catalog({} cameras)'.format(len(self))
+
+	def __getitem__(self, key):
+		if isinstance(key, str):
+			return self.table[key]
+		if np.ndim(key) == 0 and not isinstance(key, slice):
+			row = self.table[key]
+			focus = None if np.isnan(row['focus']) else float(row['focus'])
+			return Camera(str(row['name']), *(row[f].item()
+				for f in FIELDS[1:-1]), focus=focus)
+		return Catalog(self.table[key])
+
+	def __iter__(self):
+		return (self[i] for i in range(len(self)))
+
+	def filter(self, **ranges):
+		"""
+		return the cameras with every given field in [lo, hi], e.g.
+		filter(focal_length=(8, 20), f_number=(None, 4)); None is open
+		"""
+		mask = np.ones(len(self), dtype=bool)
+		for name, (lo, hi) in ranges.items():
+			if lo is not None:
+				mask &= self.table[name] >= lo
+			if hi is not None:
+				mask &= self.table[name] <= hi
+		return Catalog(self.table[mask])
+
+	# the model over the whole catalog; per camera results come back as
+	# arrays of len(catalog), distance curves as (len(catalog), len(dist))
+
+	def column(self, name, extra_dims = 0):
+		"""return a column shaped to broadcast against extra_dims more axes"""
+		return self.table[name].reshape((-1,) + (1,)*extra_dims)
+
+	def fov(self, axis = 'y'):
+		return self.table['fov_' + axis]
+
+	def res(self, axis = 'y'):
+		return self.table['res_' + axis]
+
+	def accept_coc_mm(self, accept_coc):
+		"""acceptable CoC in pixels to mm on each camera's sensor"""
+		return np.multiply(accept_coc, self.table['pixel_size'])/cm.MM_2_UM
+
+	def hyperfocal(self, accept_coc):
+		"""return the hyperfocal distances in m"""
+		t = self.table
+		return cm.hyperfocal_dist(t['focal_length'], t['f_number'],
+			self.accept_coc_mm(accept_coc))/cm.M_2_MM
+
+	def focus(self, accept_coc):
+		"""return the focus distances in m, the hyperfocal one where unset"""
+		focus = self.table['focus']
+		return np.where(np.isnan(focus), self.hyperfocal(accept_coc), focus)
+
+	def dof_limits(self, accept_coc):
+		"""return (near, far) DoF limits in m"""
+		t = self.table
+		return solver.dof_limits(t['focal_length'], t['f_number'],
+			self.focus(accept_coc), accept_coc, t['pixel_size'])
+
+	def coc(self, dist, accept_coc):
+		"""return the CoC in pixels at every distance in m"""
+		f = self.column('focal_length', 1)
+		s_s = cm.dof2s_s(self.focus(accept_coc)[:, None], f)
+		return cm.get_circle_of_confusion_in_pix(dist, self.column('f_number', 1),
+			f, s_s, self.column('pixel_size', 1))
+
+	def target_pixels(self, dist, feat_size, axis = 'y'):
+		"""return the apparent feature size in pixels at every distance"""
+		return cm.target_size_in_pix(dist, self.fov(axis)[:, None],
+			self.res(axis)[:, None], feat_size)
+
+	def detection_range(self, feat_size, min_n_pixel, cover = 1, axis = 'y'):
+		"""return (min, max) detection distances in m"""
+		return solver.detection_range(self.fov(axis), self.res(axis),
+			feat_size, min_n_pixel, cover)
+
+	def critical_distances(self, accept_coc, feat_size, min_n_pixel,
+		cover = 1, axis = 'y'):
+		"""
+		return the solver.critical_distances dict for every camera, DoF
+		limits combined with the detection range
+		"""
+		t = self.table
+		return solver.critical_distances(t['focal_length'], t['f_number'],
+			t['pixel_size'], self.res(axis), self.focus(accept_coc), accept_coc,
+			feat_size, min_n_pixel, cover, self.fov(axis))
+
+# ESA LIES cameras from the notes in gantt.py, visible channel; the star
+# tracker's lens is not given, so its f-number is unknown (nan)
+LIES = Catalog.from_cameras([
+	Camera('star_tracker', 2592*2.2/(2*cm.MM_2_UM)/np.tan(np.radians(10)),
+		np.nan, 2.2, 2592, 1944, 20, 15),
+	Camera('near_range', 12, 4, 2.2, 2592, 1944, 40, 30),
+	Camera('docking', 3, 5.6, 2.2, 2592, 1944, 77.3, 61.9),
+])
+
@@ -0,0 +1,157 @@
+#!/usr/bin/python3
+
+#
+# coverage.py
+#
+# interval index of the ranges over which each camera of a multi-camera
+# system sees the target with acceptable blur and enough pixels, for mode
+# selection / handover along a trajectory
+#
+# the interval endpoints split the distance axis into elementary segments;
+# which cameras cover a segment is precomputed once (a packed bit row per
+# segment), so a query is one binary search over the endpoints, O(log n),
+# and a batch of queries is one np.searchsorted
+#
+# usage:
+#	index = CoverageIndex.from_catalog(catalog.LIES[1:], 4, 0.1, 10, 0.9)
+#	index.select(dist)		# camera to use at every distance, -1 for none
+#	index.gaps(0.05, 100), index.overlaps()
+#
+
+import numpy as np
+import catalog
+
+class CoverageIndex:
+	"""
+	half-open coverage intervals [lo, hi) in m, one per named camera;
+	cameras earlier in the list are preferred by select()
+	"""
+
+	def __init__(self, names, lo, hi):
+		self.names = list(names)
+		self.lo = np.asarray(lo, dtype=np.float64).reshape(-1)
+		self.hi = np.asarray(hi, dtype=np.float64).reshape(-1)
+		# empty or unknown ranges (nan) cover nothing
+		valid = np.isfinite(self.lo) & ~np.isnan(self.hi) & (self.lo < self.hi)
+		self.bounds = np.unique(np.concatenate((self.lo[valid], self.hi[valid])))
+		# segment i is [bounds[i], bounds[i + 1]), the last one is open ended
+		start = self.bounds[:, None]
+		covered = valid & (start >= self.lo) & (start < self.hi)
+		self._bits = np.packbits(covered, axis=1)
+		self.counts = covered.sum(axis=1)
+		# preferred camera of every segment: the first covering one
+		self._first = np.where(covered.any(axis=1), covered.argmax(axis=1), -1)
+
+	@classmethod
+	def from_catalog(cls, cat, accept_coc, feat_size, min_n_pixel, cover = 1,
+		axis = 'y'):
+		"""
+		index the usable range of every camera of a catalog.Catalog: in
+		focus (DoF limits) and detectable (between min_target_dist_with_cover
+		and max_target_dist), see solver.critical_distances
+		"""
+		d = cat.critical_distances(accept_coc, feat_size, min_n_pixel, cover, axis)
+		return cls([str(n) for n in cat['name']], d['min_usable'], d['max_usable'])
+
+	def __len__(self):
+		return len(self.names)
+
+	def __repr__(self):
+		return 'CoverageIndex({})'.format(', '.join('{} [{:g}, {:g})'.format(
+			n, lo, hi) for n, lo, hi in zip(self.names, self.lo, self.hi)))
+
+	def add(self, name, lo, hi):
+		"""return a new index with one more camera (lowest priority)"""
+		return CoverageIndex(self.names + [name], np.append(self.lo, lo),
+			np.append(self.hi, hi))
+
+	def ranges(self):
+		"""return the [lo, hi] list of every camera"""
+		return [[lo, hi] for lo, hi in zip(self.lo.tolist(), self.hi.tolist())]
+
+	# queries, all O(log n) per distance
+
+	def segment(self, dist):
+		"""return the segment index of every distance, -1 below all ranges"""
+		return np.searchsorted(self.bounds, dist, side='right') - 1
+
+	def query(self, dist):
+		"""
+		return a bool array of shape dist.shape + (len(self),): which
+		cameras cover every distance
+		"""
+		i = self.segment(dist)
+		bits = np.unpackbits(self._bits[np.maximum(i, 0)], axis=-1,
+			count=len(self)).astype(bool)
+		bits[i < 0] = False
+		return bits
+
+	def count(self, dist):
+		"""return how many cameras cover every distance"""
+		i = self.segment(dist)
+		return np.where(i >= 0, self.counts[np.maximum(i, 0)], 0)
+
+	def select(self, dist):
+		"""return the index of the preferred covering camera, -1 for none"""
+		i = self.segment(dist)
+		return np.where(i >= 0, self._first[np.maximum(i, 0)], -1)
+
+	# reports
+
+	def gaps(self, lo, hi):
+		"""return the [a, b) sub-ranges of [lo, hi) no camera covers"""
+		edges = np.concatenate(([lo], self.bounds[(self.bounds > lo) &
+			(self.bounds < hi)], [hi]))
+		empty = self.count(edges[:-1]) == 0
+		return _runs(edges, empty)
+
+	def overlaps(self):
+		"""
+		return (a, b, names) for every range covered by more than one camera,
+		where a handover can happen
+		"""
+		out = []
+		for i in np.flatnonzero(self.counts > 1):
+			names = [self.names[j] for j in np.flatnonzero(np.unpackbits(
+				self._bits[i], count=len(self)))]
+			a, b = self.bounds[i], self.bounds[i + 1]
+			if out and out[-1][1] == a and out[-1][2] == names:
+				out[-1] = (out[-1][0], b, names)
+			else:
+				out.append((a, b, names))
+		return [(float(a), float(b), n) for a, b, n in out]
+
+	def handovers(self, lo, hi):
+		"""
+		return (distance, from, to) where select() changes camera on [lo, hi),
+		names None where no camera covers
+		"""
+		edges = np.concatenate(([lo], self.bounds[(self.bounds > lo) &
+			(self.bounds < hi)]))
+		sel = self.select(edges)
+		change = np.flatnonzero(sel[1:] != sel[:-1]) + 1
+		name = lambda j: None if j < 0 else self.names[j]
+		return [(float(edges[k]), name(sel[k - 1]), name(sel[k])) for k in change]
+
+def _runs(edges, flags):
+	"""merge consecutive flagged [edges[i], edges[i + 1]) into (a, b) runs"""
+	out = []
+	for i in np.flatnonzero(flags):
+		a, b = float(edges[i]), float(edges[i + 1])
+		if out and out[-1][1] == a:
+			out[-1] = (out[-1][0], b)
+		else:
+			out.append((a, b))
+	return out
+
+def lies_index(accept_coc = 4, feat_size = 0.1, min_n_pixel = 10, cover = 0.9):
+	"""
+	return the coverage of the ESA LIES cameras (see gantt.py): docking and
+	near-range from the model; the star tracker detects by apparent
+	magnitude, which the model does not cover, so its 30 m - 10 km range is
+	taken from the notes
+	"""
+	index = CoverageIndex.from_catalog(catalog.LIES[2:0:-1], accept_coc,
+		feat_size, min_n_pixel, cover)
+	return index.add('star_tracker', 30, 10000)
+
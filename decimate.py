@@ -0,0 +1,157 @@
+#!/usr/bin/python3
+
+#
+# decimate.py
+#
+# point decimation for plotting: a curve of millions of samples is reduced
+# to what the screen can show before it reaches matplotlib, so rendering
+# time and SVG/PDF size depend on the figure width, not on the sweep
+#
+# two shape preserving methods over a sorted x: min/max binning (per
+# screen column keep the first, last, lowest and highest sample, exact
+# envelope, fast) and largest triangle three buckets (LTTB, a fixed point
+# budget, smoother looking). on top of either, the two samples around
+# every threshold crossing and around chosen x positions are always kept,
+# so the decimated polyline crosses a level (the acceptable CoC at the
+# near distance) at exactly the same x as the full one. the first nan of
+# every gap is kept too, so gaps stay gaps
+#
+# usage:
+#	x, y = decimate(dist, coc, 800, thresholds=[accept_coc])
+#	ax.plot(x, y)
+#
+
+import numpy as np
+
+METHODS = ('minmax', 'lttb')
+
+def _scale(x, log):
+	x = np.asarray(x, dtype=np.float64)
+	return np.log(x) if log else x
+
+def bin_starts(x, n_bins, log = False):
+	"""
+	return the index of the first sample of every non-empty bin of n_bins
+	equal width bins over [x[0], x[-1]] (in log x if log); x sorted
+	"""
+	x = np.asarray(x, dtype=np.float64)
+	if log:		# edges mapped back to x rather than all of x to log x
+		edges = np.exp(np.linspace(np.log(x[0]), np.log(x[-1]), n_bins + 1))
+	else:
+		edges = np.linspace(x[0], x[-1], n_bins + 1)
+	starts = np.searchsorted(x, edges[:-1])
+	starts[0] = 0
+	return np.unique(starts)
+
+def minmax_indices(x, y, n_bins, log = False):
+	"""
+	return the sorted indices of the first, last, minimum and maximum
+	sample of y in every one of n_bins bins over x (at most 4*n_bins)
+	"""
+	y = np.asarray(y, dtype=np.float64)
+	n = y.size
+	starts = bin_starts(x, n_bins, log)
+	ends = np.append(starts[1:], n)
+	with np.errstate(invalid='ignore'):
+		lo = np.fmin.reduceat(y, starts)
+		hi = np.fmax.reduceat(y, starts)
+	counts = ends - starts
+
+	def first(extreme):
+		# first sample of every bin equal to the bin's extreme, if any (all
+		# nan bins have none)
+		i = np.flatnonzero(y == np.repeat(extreme, counts))
+		j = i[np.minimum(np.searchsorted(i, starts), i.size - 1)] if i.size \
+			else starts
+		return j[(j >= starts) & (j < ends)]
+
+	return np.unique(np.concatenate([starts, ends - 1, first(lo), first(hi)]))
+
+def lttb_indices(x, y, n_out, log = False):
+	"""
+	return the sorted indices of n_out samples chosen by largest triangle
+	three buckets: first and last sample, and from each of n_out - 2 equal
+	count buckets the one spanning the largest triangle with the previous
+	choice and the mean of the next bucket
+	"""
+	y = np.asarray(y, dtype=np.float64)
+	n = y.size
+	if n_out >= n or n_out < 3:
+		return np.arange(n)
+	u = _scale(x, log)
+	edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+	ends = np.append(edges[1:], n)		# the last bucket is followed by x[-1]
+	out = np.empty(n_out, dtype=np.intp)
+	out[0], out[-1] = 0, n - 1
+	a = 0
+	for k in range(n_out - 2):
+		lo, hi = edges[k], edges[k + 1]
+		cu = u[hi:ends[k + 1]].mean()
+		cy = np.nanmean(y[hi:ends[k + 1]]) if k < n_out - 3 else y[-1]
+		area = np.abs((u[a] - cu)*(y[lo:hi] - y[a]) -
+			(u[a] - u[lo:hi])*(cy - y[a]))
+		area[np.isnan(area)] = -1
+		a = lo + int(area.argmax())
+		out[k + 1] = a
+	return out
+
+def crossing_indices(y, levels):
+	"""
+	return the indices of the samples on both sides of every crossing of
+	y through each level (and into or out of a nan gap), and of the first
+	and last sample of every run exactly on a level (a step of a staircase)
+	"""
+	y = np.asarray(y, dtype=np.float64)
+	keep = []
+	for level in np.atleast_1d(levels):
+		above = y > level
+		i = np.flatnonzero(above[:-1] != above[1:])
+		on = np.concatenate([[False], y == level, [False]])
+		ends = np.flatnonzero(on[1:] != on[:-1])	# run starts, run stops
+		keep += [i, i + 1, ends[0::2], ends[1::2] - 1]
+	return np.unique(np.concatenate(keep)) if keep else np.zeros(0, np.intp)
+
+def decimate_indices(x, y, n = 1000, method = 'minmax', thresholds = (),
+	keep_x = (), log = False):
+	"""
+	return the sorted indices of the samples of (x, y) to draw, see
+	decimate
+	"""
+	y = np.asarray(y)
+	if method == 'minmax':
+		idx = minmax_indices(x, y, n, log)
+	elif method == 'lttb':
+		idx = lttb_indices(x, y, n, log)
+	else:
+		raise ValueError('unknown method: {}, expected one of {}'.format(
+			method, METHODS))
+	j = np.searchsorted(x, np.atleast_1d(np.asarray(keep_x, dtype=np.float64)))
+	nan = np.isnan(y)
+	gaps = np.flatnonzero(nan[1:] & ~nan[:-1]) + 1
+	extra = np.concatenate([crossing_indices(y, thresholds), j - 1, j, gaps])
+	extra = extra[(extra >= 0) & (extra < y.size)]
+	return np.union1d(idx, extra).astype(np.intp)
+
+def decimate(x, y, n = 1000, method = 'minmax', thresholds = (), keep_x = (),
+	log = False):
+	"""
+	return (x, y) reduced to what n screen columns can show
+	x: sorted sample positions
+	y: samples, nan for gaps
+	n: bins for 'minmax' (up to 4 points each; the axes width in pixels is
+	exact), points for 'lttb'
+	thresholds: levels whose crossings the result keeps exact
+	keep_x: positions whose neighbouring samples are kept, e.g. an
+	annotated distance
+	log: bin in log x, for a log x axis
+	"""
+	x = np.asarray(x)
+	y = np.asarray(y)
+	if y.size <= (4*n if method == 'minmax' else n):
+		return x, y
+	idx = decimate_indices(x, y, n, method, thresholds, keep_x, log)
+	return x[idx], y[idx]
+
+def axes_pixels(ax):
+	"""return the width in display pixels of a matplotlib axes"""
+	return max(1, int(round(ax.get_window_extent().width)))
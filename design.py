@@ -0,0 +1,171 @@
+#!/usr/bin/python3
+
+#
+# design.py
+#
+# inverse design: lens parameters (focal length, f-number, focus distance,
+# FoV) that meet a mission requirement for a given sensor
+#
+# every requirement reduces to closed form bounds:
+#  - max_target_dist >= far gives a minimum focal length
+#  - min_target_dist_with_cover <= near gives a maximum focal length
+#  - keeping [near, far] inside the DoF gives a minimum f-number for each
+#    focal length, reached when focused at the harmonic mean of near and far
+# so candidate catalogs are pruned without enumerating focus or distances
+#
+
+import numpy as np
+import camera_model as cm
+import solver
+
+class Requirement:
+	"""
+	what a camera has to achieve
+	near, far: range of target distances to cover, in m (far may be np.inf)
+	feat_size: size of target feature in m
+	min_n_pixel: pixels the feature has to cover at far
+	accept_coc: acceptable CoC in pixels
+	cover: fraction of the FoV the feature may fill at near
+	"""
+	__slots__ = ('name', 'near', 'far', 'feat_size', 'min_n_pixel',
+		'accept_coc', 'cover')
+
+	def __init__(self, name, near, far, feat_size = 0.1, min_n_pixel = 10,
+		accept_coc = 4, cover = 0.9):
+		self.name = name
+		self.near = near
+		self.far = far
+		self.feat_size = feat_size
+		self.min_n_pixel = min_n_pixel
+		self.accept_coc = accept_coc
+		self.cover = cover
+
+	def __repr__(self):
+		return 'Requirement({!r}, near={} m, far={} m)'.format(self.name,
+			self.near, self.far)
+
+# ESA LIES cameras (see gantt.py); feature size, pixel count and cover as in
+# test.final_test. the star tracker detects by apparent magnitude, which this
+# model does not cover, so it has no requirement here
+DOCKING = Requirement('docking', 0.09, 15)
+NEAR_RANGE = Requirement('near-range', 2, 40)
+MISSIONS = {r.name: r for r in (DOCKING, NEAR_RANGE)}
+
+def _half_width(pixel_size, res):
+	"""half the sensor width in mm"""
+	return np.multiply(res, pixel_size)/(2*cm.MM_2_UM)
+
+def focal_length_bounds(req, pixel_size = 2.2, res = 1944):
+	"""
+	return (f_min, f_max) in mm: the feature covers min_n_pixel at far for
+	f >= f_min and fits cover of the FoV at near for f <= f_max;
+	f_min > f_max means no lens works with this sensor
+	pixel_size: in um
+	res: the sensor resolution in pixels (one dimension)
+	"""
+	w = _half_width(pixel_size, res)
+	# max_target_dist(FoV) >= far  <=>  FoV/res <= atan(feat/(n*far))
+	with np.errstate(divide='ignore'):
+		iFoV_max = np.arctan(np.divide(req.feat_size,
+			np.multiply(req.min_n_pixel, req.far)))
+	FoV_max = np.multiply(res, iFoV_max)
+	half = np.minimum(FoV_max, np.pi)/2
+	f_min = np.where(FoV_max < np.pi, w/np.tan(half), 0.)
+	# min_target_dist_with_cover(FoV) <= near
+	#  <=>  tan(FoV/2) >= feat/(2*cover*near)
+	f_max = w*2*np.multiply(req.cover, req.near)/req.feat_size
+	return f_min, f_max
+
+def best_focus(req):
+	"""
+	return the focus distance in m that centres [near, far] in the DoF:
+	the CoC is symmetric in 1/distance, so this is their harmonic mean
+	"""
+	return 2/(np.divide(1, req.near) + np.divide(1, req.far))
+
+def min_f_number(f, req, pixel_size = 2.2):
+	"""
+	return the smallest f-number keeping [near, far] within the DoF, when
+	focused at best_focus(req); np.inf if the focal length cannot focus there
+	f: focal length in mm
+	pixel_size: in um
+	"""
+	c = np.multiply(req.accept_coc, pixel_size)/cm.MM_2_UM
+	u_near = 1/np.multiply(req.near, cm.M_2_MM)
+	u_far = 1/np.multiply(req.far, cm.M_2_MM)
+	u_c = (u_near + u_far)/2
+	# DoF width in 1/distance is 2*N*c/(s_s*f) with s_s = f/(1 - f*u_c)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		N = np.square(f)*(u_near - u_far)/(2*c*(1 - np.multiply(f, u_c)))
+	return np.where(np.multiply(f, u_c) < 1, N, np.inf)
+
+def feasible(f, N, req, pixel_size = 2.2, res = 1944, rtol = 1e-9):
+	"""
+	return a boolean mask of the (f, N) pairs meeting req, checked against
+	the forward model at best_focus(req)
+	"""
+	crit = solver.critical_distances(f, N, pixel_size, res, best_focus(req),
+		req.accept_coc, req.feat_size, req.min_n_pixel, req.cover)
+	near_ok = crit['near'] <= req.near*(1 + rtol)
+	far_ok = crit['far'] >= np.multiply(req.far, 1 - rtol)
+	min_ok = crit['min_detect'] <= req.near*(1 + rtol)
+	max_ok = crit['max_detect'] >= np.multiply(req.far, 1 - rtol)
+	return near_ok & far_ok & min_ok & max_ok
+
+def feasible_region(req, pixel_size = 2.2, res = 1944, f = None,
+	N_max = 22):
+	"""
+	return the feasible region as a dict of arrays over focal length:
+	focal_length (mm), N_min (smallest f-number), focus (m), FoV (deg);
+	f: focal lengths to tabulate, default 200 log spaced in the bounds
+	N_max: slowest lens considered, focal lengths needing more are dropped
+	"""
+	f_min, f_max = focal_length_bounds(req, pixel_size, res)
+	if f is None:
+		if not f_min < f_max:
+			f = np.empty(0)
+		else:
+			f = np.geomspace(max(float(f_min), 1e-3), float(f_max), 200)
+	f = np.asarray(f, dtype=np.float64)
+	N = min_f_number(f, req, pixel_size)
+	keep = (f >= f_min) & (f <= f_max) & (N <= N_max)
+	f, N = f[keep], N[keep]
+	return dict(focal_length=f, N_min=N,
+		focus=np.full(f.shape, best_focus(req)),
+		FoV=cm.sensor_FoV(f, pixel_size, res))
+
+def pareto_front(cost_a, cost_b):
+	"""
+	return indices of the points not dominated when minimising both costs,
+	sorted by cost_a; O(n log n)
+	"""
+	order = np.lexsort((cost_b, cost_a))
+	b = cost_b[order]
+	best = np.minimum.accumulate(b)
+	# strictly better than everything cheaper in cost_a
+	front = np.ones(b.size, dtype=bool)
+	front[1:] = b[1:] < best[:-1]
+	return order[front]
+
+def pareto_designs(req, f, N, pixel_size = 2.2, res = 1944):
+	"""
+	return the Pareto-optimal lenses of a catalog for one sensor, trading a
+	fast lens (small f-number) against a wide FoV (short focal length)
+	f, N: focal length (mm) and f-number of every lens in the catalog
+	returns a dict of arrays: index (into the catalog), focal_length,
+	f_number, focus (m), FoV (deg)
+	"""
+	f = np.asarray(f, dtype=np.float64)
+	N = np.asarray(N, dtype=np.float64)
+	f_min, f_max = focal_length_bounds(req, pixel_size, res)
+	# prune on the focal length window first: only that slice is evaluated
+	order = np.argsort(f, kind='stable')
+	lo = np.searchsorted(f[order], f_min, side='left')
+	hi = np.searchsorted(f[order], f_max, side='right')
+	idx = order[lo:hi]
+	idx = idx[N[idx] >= min_f_number(f[idx], req, pixel_size)]
+	idx = idx[pareto_front(N[idx], f[idx])]
+	return dict(index=idx, focal_length=f[idx], f_number=N[idx],
+		focus=np.full(idx.shape, best_focus(req)),
+		FoV=cm.sensor_FoV(f[idx], pixel_size, res))
+
@@ -0,0 +1,420 @@
+#!/usr/bin/python3
+
+#
+# explore.py
+#
+# local interactive exploration server: sliders for focal length, f-number,
+# focus, acceptable CoC and pixel size in the browser, the CoC and feature
+# pixel curves over a fine distance grid redrawn on every move. standard
+# library http.server and numpy only, nothing to install
+#
+# every quantity is a node of a dependency graph (Graph). a slider sets an
+# input node; a request pulls the nodes it needs, and a node recomputes only
+# if one of its dependencies changed since it was last verified. a node
+# that recomputes to the same value does not invalidate its dependents
+# (early cutoff), so moving the acceptable CoC with a fixed focus redoes
+# the hyperfocal distance and the DoF limits but neither the FoV nor the
+# million point curves. the DoF limits come from a sweep precomputed over
+# the slider axes (sweep.sweep, compact precision), which also gives the
+# near / far against focus plot for free. curves go out decimated to the
+# plot width (decimate.py) with the threshold crossings exact
+#
+# usage: python explore.py [--port 8050] [--points 1000000]
+#	then open http://127.0.0.1:8050/
+#
+
+import argparse
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+import camera_model as cm
+import decimate
+import sweep
+
+# slider axes; focus 0 is the hyperfocal distance
+AXES = dict(
+	focal_length=np.array([3, 4, 5, 6, 8, 10, 12, 14, 16, 20, 25, 28, 35, 40,
+		50], dtype=np.float64),
+	f_number=np.array([1, 1.2, 1.4, 1.8, 2, 2.2, 2.8, 3.5, 4, 4.6, 5.6, 8, 11,
+		16]),
+	focus=np.concatenate([[0], np.round(np.geomspace(0.1, 100, 61), 3)]),
+	accept_coc=np.arange(1, 13, dtype=np.float64),
+	pixel_size=np.array([1.4, 2.2, 3.45, 5.5]),
+)
+DEFAULTS = dict(focal_length=3, f_number=5.6, focus=0, accept_coc=4,
+	pixel_size=2.2)
+RES = 1944
+FEAT_SIZE = 0.1
+MIN_N_PIXEL = 10
+POINTS = 1000000
+PLOT_WIDTH = 800		# decimation bins, the canvas width
+
+# arrays larger than this always count as changed: comparing a million
+# point curve costs about what recomputing its dependents does
+CUTOFF_SIZE = 1 << 16
+
+_UNSET = object()
+
+def _same(a, b):
+	if a is _UNSET or b is _UNSET:
+		return False
+	if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+		if np.size(a) > CUTOFF_SIZE:
+			return a is b
+		return np.array_equal(a, b, equal_nan=True)
+	if isinstance(a, tuple):
+		return len(a) == len(b) and all(_same(x, y) for x, y in zip(a, b))
+	return a == b or (a != a and b != b)
+
+class Node:
+	"""a value in the graph: an input, or func of the values of deps"""
+	__slots__ = ('name', 'deps', 'func', 'value', 'changed', 'verified')
+
+	def __init__(self, name, deps = (), func = None, value = _UNSET):
+		self.name = name
+		self.deps = deps
+		self.func = func
+		self.value = value
+		self.changed = 0		# revision the value last changed at
+		self.verified = -1		# revision the value was last known current at
+
+class Graph:
+	"""
+	incremental computation: set() inputs, get() derived nodes; a node is
+	recomputed only when a dependency changed since it was last verified
+	"""
+
+	def __init__(self):
+		self.nodes = {}
+		self.revision = 0
+		self.recomputed = []
+
+	def input(self, name, value):
+		self.nodes[name] = Node(name, value=value)
+
+	def derived(self, name, deps, func):
+		"""add node name = func(*values of deps)"""
+		self.nodes[name] = Node(name, tuple(self.nodes[d] for d in deps), func)
+
+	def set(self, name, value):
+		"""change an input; returns whether it changed"""
+		node = self.nodes[name]
+		if _same(node.value, value):
+			return False
+		self.revision += 1
+		node.value = value
+		node.changed = self.revision
+		return True
+
+	def get(self, name):
+		"""return the current value of a node, recomputing what is stale"""
+		node = self.nodes[name]
+		self._pull(node)
+		return node.value
+
+	def _pull(self, node):
+		if node.func is None or node.verified == self.revision:
+			return
+		stale = node.value is _UNSET
+		for dep in node.deps:
+			self._pull(dep)
+			stale = stale or dep.changed > node.verified
+		if stale:
+			start = time.perf_counter()
+			value = node.func(*(d.value for d in node.deps))
+			self.recomputed.append((node.name, time.perf_counter() - start))
+			if not _same(value, node.value):
+				node.value = value
+				node.changed = self.revision
+		node.verified = self.revision
+
+def precompute(res = RES):
+	"""
+	return the SweepResult of the DoF limits over the slider axes, focus 0
+	excluded (focused at the hyperfocal distance they are computed per
+	request)
+	"""
+	return sweep.sweep(AXES['focal_length'], AXES['f_number'],
+		AXES['pixel_size'], AXES['focus'][1:], 1., AXES['accept_coc'], res=res,
+		variables=['near', 'far'], precision='compact')
+
+def model_graph(dist, grid, res = RES, feat_size = FEAT_SIZE,
+	min_n_pixel = MIN_N_PIXEL, width = PLOT_WIDTH):
+	"""
+	return the Graph of the explorer over the distance grid dist (m), with
+	DoF limits looked up in grid (see precompute)
+	"""
+	g = Graph()
+	for name, value in DEFAULTS.items():
+		g.input(name, float(value))
+	g.input('dist', dist)
+
+	def index(axis, value):
+		return int(np.abs(grid.axes[axis] - value).argmin())
+
+	g.derived('c_mm', ('accept_coc', 'pixel_size'),
+		lambda acc, px: acc*px/cm.MM_2_UM)
+	g.derived('hyperfocal', ('focal_length', 'f_number', 'c_mm'),
+		lambda f, N, c: cm.hyperfocal_dist(f, N, c)/cm.M_2_MM)
+	g.derived('focus_m', ('focus', 'hyperfocal'),
+		lambda focus, H: focus if focus > 0 else H)
+
+	def dof(f, N, px, acc, focus, focus_m, H):
+		if focus > 0:		# on the precomputed grid
+			key = dict(focal_length=index('focal_length', f),
+				f_number=index('f_number', N), pixel_size=index('pixel_size', px),
+				focus=index('focus', focus), accept_coc=index('accept_coc', acc))
+			return (float(grid.isel('near', **key)), float(grid.isel('far', **key)))
+		near = cm.near_dist_acceptable(f, focus_m*cm.M_2_MM, H*cm.M_2_MM)
+		return (near/cm.M_2_MM, np.inf)
+
+	g.derived('dof', ('focal_length', 'f_number', 'pixel_size', 'accept_coc',
+		'focus', 'focus_m', 'hyperfocal'), dof)
+
+	def dof_vs_focus(f, N, px, acc):
+		key = dict(focal_length=index('focal_length', f),
+			f_number=index('f_number', N), pixel_size=index('pixel_size', px),
+			accept_coc=index('accept_coc', acc))
+		near = grid.isel('near', **key).astype(np.float64)
+		far = grid.isel('far', **key).astype(np.float64)
+		return grid.axes['focus'], near, far
+
+	g.derived('dof_vs_focus', ('focal_length', 'f_number', 'pixel_size',
+		'accept_coc'), dof_vs_focus)
+	g.derived('s_s', ('focus_m', 'focal_length'), cm.dof2s_s)
+	g.derived('fov', ('focal_length', 'pixel_size'),
+		lambda f, px: cm.sensor_FoV(f, px, res))
+	g.derived('detect', ('fov',), lambda fov: (
+		cm.min_target_dist(fov, feat_size), cm.max_target_dist(fov, res,
+		min_n_pixel, feat_size)/cm.M_2_MM))
+	g.derived('coc', ('dist', 'f_number', 'focal_length', 's_s', 'pixel_size'),
+		cm.get_circle_of_confusion_in_pix)
+	g.derived('pixels', ('dist', 'fov'),
+		lambda d, fov: cm.target_size_in_pix(d, fov, res, feat_size))
+	g.derived('coc_plot', ('dist', 'coc', 'accept_coc'),
+		lambda d, coc, acc: decimate.decimate(d, coc, width, thresholds=[acc],
+		log=True))
+	g.derived('pixels_plot', ('dist', 'pixels'),
+		lambda d, n: decimate.decimate(d, n, width, thresholds=[min_n_pixel],
+		log=True))
+	# the curves as JSON text, encoded again only when they change
+	g.derived('coc_json', ('coc_plot',),
+		lambda xy: json.dumps(dict(x=_floats(xy[0]), y=_floats(xy[1]))))
+	g.derived('pixels_json', ('pixels_plot',),
+		lambda xy: json.dumps(dict(x=_floats(xy[0]), y=_floats(xy[1]))))
+	g.derived('dof_json', ('dof_vs_focus',), lambda v: json.dumps(dict(
+		x=_floats(v[0]), near=_floats(v[1]), far=_floats(v[2]))))
+	return g
+
+def _floats(a, digits = 6):
+	"""return a as a list for JSON, rounded, None where not finite"""
+	a = np.asarray(a, dtype=np.float64)
+	finite = np.isfinite(a)
+	values = np.round(a, digits).tolist()
+	if finite.all():
+		return values
+	return [v if ok else None for v, ok in zip(values, finite.tolist())]
+
+class Explorer:
+	"""the graph behind the server, one update at a time"""
+
+	def __init__(self, points = POINTS, res = RES, feat_size = FEAT_SIZE,
+		min_n_pixel = MIN_N_PIXEL):
+		self.dist = np.geomspace(0.05, 200, points)
+		self.grid = precompute(res)
+		self.min_n_pixel = min_n_pixel
+		self.graph = model_graph(self.dist, self.grid, res, feat_size,
+			min_n_pixel)
+		self.lock = threading.Lock()
+
+	def axes(self):
+		return dict(axes={a: v.tolist() for a, v in AXES.items()},
+			defaults=DEFAULTS, points=self.dist.size, min_n_pixel=self.min_n_pixel)
+
+	def update(self, params):
+		"""
+		return the state as JSON text after setting the given slider values
+		(snapped to the slider axes), with the recomputed nodes and the
+		time taken in ms
+		"""
+		start = time.perf_counter()
+		with self.lock:
+			g = self.graph
+			g.recomputed = []
+			for name, value in params.items():
+				if name in AXES:
+					axis = AXES[name]
+					g.set(name, float(axis[np.abs(axis - value).argmin()]))
+			near, far = g.get('dof')
+			min_d, max_d = g.get('detect')
+			state = dict(
+				params={n: g.nodes[n].value for n in AXES},
+				hyperfocal=g.get('hyperfocal'), focus=g.get('focus_m'),
+				near=near, far=None if np.isinf(far) else far,
+				fov=g.get('fov'), min_detect=min_d, max_detect=max_d)
+			curves = (g.get('coc_json'), g.get('pixels_json'), g.get('dof_json'))
+			state['recomputed'] = [(n, round(dt*1e3, 2)) for n, dt in g.recomputed]
+		state['ms'] = (time.perf_counter() - start)*1e3
+		# the cached curve texts spliced in, not encoded again
+		return '{}, "coc": {}, "pixels": {}, "dof_vs_focus": {}}}'.format(
+			json.dumps(state)[:-1], *curves)
+
+PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><title>camera model explorer</title>
+<style>
+body{font:14px sans-serif;margin:16px}
+label{display:inline-block;width:150px}
+canvas{border:1px solid #ccc;margin:6px 0}
+#info{white-space:pre;font-family:monospace}
+</style></head><body>
+<div id="sliders"></div>
+<div id="info"></div>
+<canvas id="coc" width="800" height="260"></canvas><br>
+<canvas id="pixels" width="800" height="200"></canvas><br>
+<canvas id="dof" width="800" height="200"></canvas>
+<script>
+var axes, pending = null, busy = false;
+function plot(id, series, xmin, xmax, ymin, ymax, hline, vlines, title) {
+	var c = document.getElementById(id), g = c.getContext('2d');
+	var W = c.width, H = c.height, lx = Math.log(xmin), rx = Math.log(xmax);
+	function X(x) { return (Math.log(x) - lx)/(rx - lx)*W; }
+	function Y(y) { return H - (y - ymin)/(ymax - ymin)*H; }
+	g.clearRect(0, 0, W, H);
+	g.fillStyle = '#000'; g.fillText(title, 6, 12);
+	g.strokeStyle = '#ddd';
+	for (var d = Math.pow(10, Math.ceil(Math.log10(xmin))); d <= xmax; d *= 10) {
+		g.beginPath(); g.moveTo(X(d), 0); g.lineTo(X(d), H); g.stroke();
+		g.fillText(d + ' m', X(d) + 2, H - 4);
+	}
+	if (hline != null) {
+		g.strokeStyle = 'red'; g.setLineDash([6, 3]); g.beginPath();
+		g.moveTo(0, Y(hline)); g.lineTo(W, Y(hline)); g.stroke(); g.setLineDash([]);
+	}
+	(vlines || []).forEach(function(v) {
+		if (v == null) return;
+		g.strokeStyle = 'blue'; g.beginPath(); g.moveTo(X(v), 0); g.lineTo(X(v), H);
+		g.stroke();
+	});
+	series.forEach(function(s) {
+		g.strokeStyle = s.color; g.beginPath();
+		var up = false;
+		for (var i = 0; i < s.x.length; i++) {
+			if (s.y[i] == null || s.x[i] <= 0) { up = false; continue; }
+			var y = Y(Math.max(ymin, Math.min(ymax, s.y[i])));
+			if (up) g.lineTo(X(s.x[i]), y); else g.moveTo(X(s.x[i]), y);
+			up = true;
+		}
+		g.stroke();
+	});
+}
+function show(s) {
+	var p = s.params, f = function(v) { return v == null ? 'inf' : v.toPrecision(4); };
+	document.getElementById('info').textContent =
+		'hyperfocal ' + f(s.hyperfocal) + ' m   focus ' + f(s.focus) +
+		' m   DoF [' + f(s.near) + ', ' + f(s.far) + '] m   FoV ' + f(s.fov) +
+		' deg   detectable [' + f(s.min_detect) + ', ' + f(s.max_detect) + '] m\\n' +
+		'server ' + s.ms.toFixed(1) + ' ms, recomputed: ' + (s.recomputed.map(
+		function(r) { return r[0] + ' ' + r[1] + ' ms'; }).join(', ') || 'nothing');
+	plot('coc', [{x: s.coc.x, y: s.coc.y, color: '#000'}], 0.05, 200, -1, 15,
+		p.accept_coc, [s.near, s.far], 'CoC [pixels]');
+	plot('pixels', [{x: s.pixels.x, y: s.pixels.y, color: '#060'}], 0.05, 200,
+		0, 200, axes.min_n_pixel, [s.min_detect, s.max_detect],
+		'feature size [pixels]');
+	plot('dof', [{x: s.dof_vs_focus.x, y: s.dof_vs_focus.near, color: '#00c'},
+		{x: s.dof_vs_focus.x, y: s.dof_vs_focus.far, color: '#c00'}], 0.1, 100,
+		0, 100, null, [s.focus], 'near (blue) / far (red) DoF limit [m] vs focus');
+}
+function request() {
+	if (busy) { pending = true; return; }
+	busy = true; pending = false;
+	var q = Object.keys(axes.axes).map(function(a) {
+		var el = document.getElementById(a);
+		return a + '=' + axes.axes[a][el.value];
+	}).join('&');
+	fetch('/api/update?' + q).then(function(r) { return r.json(); })
+		.then(function(s) { show(s); busy = false; if (pending) request(); });
+}
+fetch('/api/axes').then(function(r) { return r.json(); }).then(function(a) {
+	axes = a;
+	var box = document.getElementById('sliders');
+	Object.keys(a.axes).forEach(function(name) {
+		var v = a.axes[name], i = v.indexOf(a.defaults[name]);
+		var row = document.createElement('div');
+		row.innerHTML = '<label>' + name + '</label><input type="range" id="' +
+			name + '" min="0" max="' + (v.length - 1) + '" value="' + i +
+			'"> <span id="' + name + '_v"></span>';
+		box.appendChild(row);
+		var el = row.querySelector('input'), out = row.querySelector('span');
+		function label() {
+			var x = v[el.value];
+			out.textContent = name == 'focus' && x == 0 ? 'hyperfocal' : x;
+		}
+		label();
+		el.addEventListener('input', function() { label(); request(); });
+	});
+	request();
+});
+</script></body></html>
+"""
+
+def make_handler(explorer):
+	class Handler(BaseHTTPRequestHandler):
+		def _send(self, body, content_type):
+			body = body.encode()
+			self.send_response(200)
+			self.send_header('Content-Type', content_type)
+			self.send_header('Content-Length', str(len(body)))
+			self.end_headers()
+			self.wfile.write(body)
+
+		def do_GET(self):
+			url = urlparse(self.path)
+			if url.path == '/':
+				self._send(PAGE, 'text/html; charset=utf-8')
+			elif url.path == '/api/axes':
+				self._send(json.dumps(explorer.axes()), 'application/json')
+			elif url.path == '/api/update':
+				try:
+					params = {k: float(v[0]) for k, v in parse_qs(url.query).items()}
+				except ValueError:
+					self.send_error(400, 'parameters must be numbers')
+					return
+				self._send(explorer.update(params), 'application/json')
+			else:
+				self.send_error(404)
+
+		def log_message(self, *args):
+			pass
+
+	return Handler
+
+def serve(host = '127.0.0.1', port = 8050, points = POINTS):
+	"""run the explorer until interrupted"""
+	explorer = Explorer(points)
+	server = ThreadingHTTPServer((host, port), make_handler(explorer))
+	print('camera model explorer on http://{}:{}/ ({} distances)'.format(host,
+		server.server_address[1], points))
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+
+def main():
+	parser = argparse.ArgumentParser(
+		description='interactive camera model explorer in the browser')
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('--port', type=int, default=8050)
+	parser.add_argument('--points', type=int, default=POINTS,
+		help='distances the curves are evaluated at')
+	args = parser.parse_args()
+	serve(args.host, args.port, args.points)
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,355 @@
+#!/usr/bin/python3
+
+#
+# export.py
+#
+# streaming columnar export of sweep and analysis results for tools
+# outside python: one row per cell of the sweep grid, a column per axis
+# and per variable, with units and the camera / model metadata embedded
+#
+# two formats: 'columns', a directory of one .npy file per column plus
+# meta.json (the files are appended chunk by chunk and their headers
+# written on close, so any reader mapping them gets the columns zero-copy,
+# np.load(..., mmap_mode='r'), and a column reshaped to attrs['shape'] is
+# the N-D grid); and 'csv', a '# {json metadata}' line, a 'name [unit]'
+# header and the rows. memory is one chunk of rows whatever the grid
+#
+# a table is only published complete: meta.json is written last, and a
+# writer left by an exception writes none (a csv is renamed to .partial).
+# sweep tables record their cell count in attrs['rows'], which read()
+# checks against the rows found
+#
+# usage:
+#	export_sweep('study', focal_length=..., ..., variables=['coc', 'near'])
+#	columns, meta = read('study')					# memory-mapped
+#	python export.py study study.csv				# columns -> csv, streaming
+#
+
+import argparse
+import json
+import os
+import struct
+import sys
+import numpy as np
+from numpy.lib import format as npy
+import sweep
+
+FORMATS = ('columns', 'csv')
+META = 'meta.json'
+KIND = 'camera_model.columns'
+VERSION = 1
+HEADER_BYTES = 128		# reserved .npy header, rewritten once the rows are known
+CHUNK_SIZE = sweep.CHUNK_SIZE
+# significant digits written to csv, enough to round trip
+DIGITS = {2: 5, 4: 9, 8: 17}
+
+class ExportError(ValueError):
+	"""a chunk or a file that does not match its columns"""
+
+def _npy_header(dtype, rows):
+	"""return the HEADER_BYTES long .npy (1.0) header of a 1-D column"""
+	text = "{{'descr': {!r}, 'fortran_order': False, 'shape': ({},), }}".format(
+		npy.dtype_to_descr(dtype), rows)
+	text = text.ljust(HEADER_BYTES - 11) + '\n'
+	return npy.magic(1, 0) + struct.pack('<H', len(text)) + text.encode('latin1')
+
+def _fmt(dtype):
+	if dtype.kind == 'f':
+		return '%.{}g'.format(DIGITS[dtype.itemsize])
+	return '%d'
+
+def _json_default(value):
+	if isinstance(value, (np.generic, np.ndarray)):
+		return value.tolist()
+	raise TypeError('not JSON serializable: {!r}'.format(value))
+
+class ColumnWriter:
+	"""
+	writes a table chunk by chunk to path, see the formats above; used as a
+	context manager it aborts (see abort) when the block raises
+	columns: list of (name, dtype)
+	units: optional dict of column name -> unit
+	attrs: JSON serializable metadata stored with the table; attrs['rows'],
+	if given, is the row count close() requires
+	"""
+
+	def __init__(self, path, columns, units = None, attrs = None,
+		format = 'columns'):
+		if format not in FORMATS:
+			raise ValueError('unknown format: {}, expected one of {}'.format(
+				format, ', '.join(FORMATS)))
+		self.path = path
+		self.format = format
+		self.columns = [(name, np.dtype(dtype)) for name, dtype in columns]
+		units = units or {}
+		self.meta = dict(kind=KIND, version=VERSION, rows=0, columns=[
+			dict(name=name, dtype=dtype.str, unit=units.get(name, ''))
+			for name, dtype in self.columns], attrs=attrs or {})
+		if format == 'columns':
+			os.makedirs(path, exist_ok=True)
+			if os.path.exists(os.path.join(path, META)):
+				raise FileExistsError('table already exists: ' + path)
+			self._files = []
+			for col, (name, dtype) in zip(self.meta['columns'], self.columns):
+				col['file'] = name + '.npy'
+				f = open(os.path.join(path, col['file']), 'wb')
+				f.write(_npy_header(dtype, 0))
+				self._files.append(f)
+		else:
+			self._file = open(path, 'w')
+			# the row count is only known at the end, csv goes without it
+			meta = {k: v for k, v in self.meta.items() if k != 'rows'}
+			self._file.write('# ' + json.dumps(meta, default=_json_default) + '\n')
+			self._file.write(','.join('{} [{}]'.format(c['name'], c['unit'])
+				if c['unit'] else c['name'] for c in self.meta['columns']) + '\n')
+			self._fmt = ','.join(_fmt(dtype) for _, dtype in self.columns)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		if exc_type is None:
+			self.close()
+		else:
+			self.abort()
+
+	def write(self, chunk):
+		"""append rows: chunk is a dict of column name -> 1-D array"""
+		try:
+			values = [np.asarray(chunk[name]).astype(dtype, copy=False)
+				for name, dtype in self.columns]
+		except KeyError as e:
+			raise ExportError('chunk has no column {}'.format(e)) from None
+		rows = values[0].size
+		if any(v.ndim != 1 or v.size != rows for v in values):
+			raise ExportError('chunk columns must be 1-D and of equal length')
+		if self.format == 'columns':
+			for f, v in zip(self._files, values):
+				f.write(np.ascontiguousarray(v).data)
+		else:
+			np.savetxt(self._file, np.column_stack([v.astype(np.float64)
+				for v in values]), fmt=self._fmt)
+		self.meta['rows'] += rows
+
+	def abort(self):
+		"""
+		close the files without publishing the table: no meta.json for
+		'columns', a csv is renamed to path + '.partial'
+		"""
+		if self.format == 'csv':
+			if not self._file.closed:
+				self._file.close()
+				os.replace(self.path, self.path + '.partial')
+			return
+		for f in self._files:
+			f.close()
+
+	def close(self):
+		"""finish the file headers and write the metadata"""
+		expected = self.meta['attrs'].get('rows')
+		if expected is not None and expected != self.meta['rows']:
+			self.abort()
+			raise ExportError('{} rows written, {} expected: {}'.format(
+				self.meta['rows'], expected, self.path))
+		if self.format == 'csv':
+			if not self._file.closed:
+				self._file.close()
+			return
+		for f, (_, dtype) in zip(self._files, self.columns):
+			if f.closed:
+				continue
+			f.seek(0)
+			f.write(_npy_header(dtype, self.meta['rows']))
+			f.close()
+		tmp = os.path.join(self.path, META + '.tmp')
+		with open(tmp, 'w') as f:
+			json.dump(self.meta, f, indent=1, default=_json_default)
+		os.replace(tmp, os.path.join(self.path, META))
+
+def write_table(path, columns, units = None, attrs = None, format = 'columns'):
+	"""write a dict of column name -> 1-D array (an analysis result) at once"""
+	columns = {k: np.atleast_1d(np.asarray(v)) for k, v in columns.items()}
+	with ColumnWriter(path, [(k, v.dtype) for k, v in columns.items()], units,
+		attrs, format) as w:
+		w.write(columns)
+
+def read(path):
+	"""
+	return (dict of column name -> 1-D array, metadata) of an exported
+	table; 'columns' come back memory-mapped, csv is parsed whole
+	"""
+	if os.path.isdir(path):
+		try:
+			with open(os.path.join(path, META)) as f:
+				meta = json.load(f)
+		except FileNotFoundError:
+			raise ExportError('incomplete table, no {}: {}'.format(META,
+				path)) from None
+		if meta.get('kind') != KIND:
+			raise ExportError('not an exported table: ' + path)
+		columns = {c['name']: np.load(os.path.join(path, c['file']),
+			mmap_mode='r') for c in meta['columns']}
+	else:
+		with open(path) as f:
+			first = f.readline()
+		if not first.startswith('# {'):
+			raise ExportError('not an exported table: ' + path)
+		meta = json.loads(first[2:])
+		data = np.loadtxt(path, delimiter=',', skiprows=2, ndmin=2)
+		columns = {c['name']: data[:, i].astype(c['dtype'])
+			for i, c in enumerate(meta['columns'])}
+		meta['rows'] = data.shape[0]
+	expected = meta['attrs'].get('rows', meta['rows'])
+	if any(v.size != expected for v in columns.values()) or \
+		meta['rows'] != expected:
+		raise ExportError('incomplete table, {} rows expected: {}'.format(
+			expected, path))
+	return columns, meta
+
+# sweeps
+
+def table_dims(dims):
+	"""return the axes, in sweep.AXES order, spanned by tuples of dims"""
+	used = set().union(*dims)
+	return tuple(a for a in sweep.AXES if a in used)
+
+def _row_chunks(shape, chunk_size):
+	"""yield (start, stop, per axis indices) over a C-order grid"""
+	n = int(np.prod(shape))
+	for start in range(0, n, chunk_size):
+		stop = min(start + chunk_size, n)
+		yield start, stop, np.unravel_index(np.arange(start, stop), shape)
+
+def _sweep_columns(dims, variables, dtypes):
+	columns = [(a, np.float64) for a in dims]
+	columns += [(n, dtypes[n]) for n in variables]
+	units = {n: sweep.UNITS[n] for n, _ in columns}
+	return columns, units
+
+def _sweep_attrs(dims, axes, attrs):
+	import cache		# model version only, keeps the import light
+	shape = [axes[a].size for a in dims]
+	out = dict(dims=list(dims), shape=shape, rows=int(np.prod(shape)),
+		axes={a: v.tolist() for a, v in axes.items()},
+		model_version=cache.model_version())
+	out.update(attrs)
+	return out
+
+def _evaluate(name, cells, dtype, res, feat_size, fov):
+	"""return variable name at the cells (dict of axis -> 1-D values)"""
+	v = {a: x.astype(dtype, copy=False) for a, x in cells.items()}
+	if fov is not None:
+		v['fov'] = fov
+	n = next(iter(cells.values())).size
+	return np.broadcast_to(sweep.VARIABLES[name][1](v, res, feat_size), (n,))
+
+def export_sweep(path, focal_length, f_number, pixel_size, focus, distance,
+	accept_coc, res = 1944, feat_size = 0.1, variables = None,
+	precision = 'float64', format = 'columns', chunk_size = CHUNK_SIZE,
+	attrs = None, check = True, fov = None):
+	"""
+	evaluate a sweep (see sweep.sweep for the axes) chunk by chunk straight
+	into an exported table over the axes the variables span, never holding
+	more than chunk_size rows; variables over fewer axes repeat along the
+	others. precision 'compact' stores the variables in the dtypes of
+	sweep.COMPACT (packed bits become a bool column)
+	fov: fixed field of view in degrees, see sweep.sweep
+	attrs: extra metadata, e.g. the camera
+	check: for 'compact', compare sweep.CHECK_SAMPLES random cells against
+	float64 first (stored in attrs['check']), and raise
+	sweep.PrecisionError beyond tolerance before anything is written
+	return the table metadata
+	"""
+	axes = sweep.make_axes(focal_length, f_number, pixel_size, focus, distance,
+		accept_coc)
+	variables = variables or list(sweep.DEFAULT_VARIABLES)
+	compute, dtypes = {}, {}
+	for name in variables:
+		c, s, bits = sweep.storage(name, axes, res, feat_size, precision, fov)
+		compute[name], dtypes[name] = c, np.dtype(np.bool_) if bits else s
+	dims = table_dims([sweep.variable_dims(n, axes) for n in variables])
+	columns, units = _sweep_columns(dims, variables, dtypes)
+	meta = _sweep_attrs(dims, axes, dict(res=res, feat_size=feat_size,
+		precision=precision))
+	if fov is not None:
+		meta['fov'] = fov
+	shape = tuple(axes[a].size for a in dims)
+	if precision != 'float64' and check:
+		rng = np.random.default_rng(0)
+		flat = rng.integers(0, meta['rows'], min(sweep.CHECK_SAMPLES,
+			meta['rows']))
+		cells = {a: axes[a][i] for a, i in zip(dims,
+			np.unravel_index(flat, shape))}
+		meta['check'] = sweep.require_precision({name: sweep.precision_error(
+			name, _evaluate(name, cells, compute[name], res, feat_size,
+			fov).astype(dtypes[name]), _evaluate(name, cells, np.float64, res,
+			feat_size, fov)) for name in variables})
+	meta.update(attrs or {})
+	with ColumnWriter(path, columns, units, meta, format) as w:
+		for start, stop, idx in _row_chunks(shape, chunk_size):
+			cells = {a: axes[a][i] for a, i in zip(dims, idx)}
+			chunk = dict(cells)
+			for name in variables:
+				chunk[name] = _evaluate(name, cells, compute[name], res,
+					feat_size, fov)
+			w.write(chunk)
+	return w.meta
+
+def export_result(path, result, variables = None, format = 'columns',
+	chunk_size = CHUNK_SIZE, attrs = None):
+	"""
+	write a sweep.SweepResult (also one over memory-mapped arrays, e.g. a
+	ResultStore's) to an exported table chunk by chunk, as export_sweep
+	return the table metadata
+	"""
+	variables = variables or list(result.data)
+	dims = table_dims([result.dims[n] for n in variables])
+	packed = result.attrs.get('packed', {})
+	dtypes = {n: np.dtype(np.bool_) if n in packed else result.data[n].dtype
+		for n in variables}
+	columns, units = _sweep_columns(dims, variables, dtypes)
+	meta = _sweep_attrs(dims, result.axes, {k: v for k, v in
+		result.attrs.items() if k in ('res', 'feat_size', 'fov', 'precision')})
+	meta.update(attrs or {})
+	shape = tuple(result.axes[a].size for a in dims)
+	with ColumnWriter(path, columns, units, meta, format) as w:
+		for start, stop, idx in _row_chunks(shape, chunk_size):
+			pos = dict(zip(dims, idx))
+			chunk = {a: result.axes[a][i] for a, i in pos.items()}
+			for name in variables:
+				var_shape = tuple(result.axes[a].size for a in result.dims[name])
+				flat = np.ravel_multi_index(tuple(pos[a]
+					for a in result.dims[name]), var_shape)
+				if name in packed:
+					chunk[name] = sweep._bits_at(result.data[name], flat)
+				else:
+					chunk[name] = np.take(result.data[name].reshape(-1), flat)
+			w.write(chunk)
+	return w.meta
+
+def convert(src, dst, format = 'csv', chunk_size = CHUNK_SIZE):
+	"""rewrite the exported table src as dst in format, chunk by chunk"""
+	columns, meta = read(src)
+	units = {c['name']: c['unit'] for c in meta['columns']}
+	with ColumnWriter(dst, [(c['name'], c['dtype']) for c in meta['columns']],
+		units, meta['attrs'], format) as w:
+		for start in range(0, meta['rows'], chunk_size):
+			w.write({n: v[start:start + chunk_size] for n, v in columns.items()})
+	return w.meta
+
+def main():
+	parser = argparse.ArgumentParser(
+		description='convert an exported table between formats')
+	parser.add_argument('src')
+	parser.add_argument('dst')
+	parser.add_argument('-f', '--format', choices=FORMATS, default=None,
+		help='output format, default from the dst extension')
+	args = parser.parse_args()
+	fmt = args.format or ('csv' if args.dst.endswith('.csv') else 'columns')
+	meta = convert(args.src, args.dst, fmt)
+	print('{} rows, {} columns -> {}'.format(meta['rows'], len(meta['columns']),
+		args.dst), file=sys.stderr)
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -10,6 +10,8 @@ import matplotlib.font_manager as font_manager
 import matplotlib.dates
 from matplotlib.dates import WEEKLY,MONTHLY, DateFormatter, rrulewrapper, RRuleLocator 
 import numpy as np
+import plotting
+import coverage
   
 
 # ST: 20degx15deg, 2592x1944pix, apparent mag 6 (5) maxd 89 km, mind 50m (coc 4 pix) 29m (coc 7 pix)
@@ -32,8 +34,8 @@ def CreateGanttChart():#(fname):
         Give file name.
     """ 
     ylabels = ["Docking cameras", "Near-range cameras", "Star Tracker"]
-    customDates = [[.09,15],[2,40],[30,10000]]
-    customDates2 = [.09,15,2,40,30,10000]
+    # docking and near-range from the model, star tracker from the notes
+    customDates = coverage.lies_index().ranges()
 #     try:
 #         textlist=open(fname).readlines()
 #     except:
@@ -45,37 +47,7 @@ def CreateGanttChart():#(fname):
 #             ylabels.append(ylabel.replace('\n',''))
 #             customDates.append([_create_date(startdate.replace('\n','')),_create_date(enddate.replace('\n',''))])
              
-    ilen=len(ylabels)
-    pos = np.arange(0.5,ilen*0.5+0.5,0.5)
-    task_dates = {}
-    for i,task in enumerate(ylabels):
-        task_dates[task] = customDates[i]
-    fig = plt.figure(figsize=(20,8))
-    ax = fig.add_subplot(111)
-    for i in range(len(ylabels)):
-         start_date,end_date = task_dates[ylabels[i]]
-         ax.barh((i*0.5)+0.5, end_date - start_date, left=start_date, height=0.3, align='center', edgecolor='lightgreen', color='orange', alpha = 0.8)
-    locsy, labelsy = plt.yticks(pos,ylabels)
-    plt.setp(labelsy, fontsize = 14)
-#    ax.axis('tight')
-    ax.set_ylim(ymin = -0.1, ymax = ilen*0.5+0.5)
-    ax.grid(color = 'g', linestyle = ':')
-    # ax.xaxis_date()
-    # rule = rrulewrapper(WEEKLY, interval=1)
-    # loc = RRuleLocator(rule)
-    #formatter = DateFormatter("%d-%b '%y")
-    # formatter = DateFormatter("%d-%b")
-  
-    # ax.xaxis.set_major_locator(loc)
-    # ax.xaxis.set_major_formatter(formatter)
-    labelsx = ax.get_xticklabels()
-    plt.setp(labelsx, rotation=30, fontsize=10)
-    plt.xscale('log')
-    font = font_manager.FontProperties(size='small')
-    ax.legend(loc=1,prop=font)
-    plt.xticks(customDates2)
-    ax.invert_yaxis()
-    # fig.autofmt_xdate()
+    plotting.gantt_figure(ylabels, customDates)
     plt.savefig('gantt.svg')
     plt.show()
  
@@ -0,0 +1,294 @@
+#!/usr/bin/python3
+
+#
+# instrument.py
+#
+# opt-in instrumentation of the model and of the sweep / render stages:
+# call count, element count, wall time (total and self) and result bytes
+# per stage, optionally the peak traced allocation (tracemalloc), exported
+# as JSON, as folded stacks for flamegraph.pl / speedscope and as a Chrome
+# trace event file (chrome://tracing, Perfetto)
+#
+# disabled it costs nothing: the model functions are only wrapped while a
+# Profiler is enabled (the module attributes are swapped, and restored on
+# disable), and stage() hands back a shared no-op context. everything goes
+# through module attributes (cm.hyperfocal_dist), so calls between model
+# functions show up nested. unit conversions are inline arithmetic inside
+# the functions and count as their self time. one thread at a time
+#
+# usage:
+#	with instrument.profile() as prof:
+#		sweep.sweep(...)
+#	prof.save('prof')		# prof.json, prof.folded, prof.trace.json
+# or, for a whole run: CAMERA_MODEL_PROFILE=prof python report.py
+#
+
+import atexit
+import importlib
+import json
+import os
+import time
+from contextlib import nullcontext
+from functools import wraps
+import numpy as np
+
+# modules whose public functions are wrapped by default
+TARGETS = ('camera_model', 'blur', 'solver', 'decimate', 'plotting')
+MAX_EVENTS = 1 << 20		# trace events kept, the rest are only counted
+ENV = 'CAMERA_MODEL_PROFILE'
+
+_NULL = nullcontext()
+_active = None
+
+def _size(value):
+	"""return (elements, bytes) of a result"""
+	if isinstance(value, np.ndarray):
+		return value.size, value.nbytes
+	if isinstance(value, (tuple, list)):
+		sizes = [_size(v) for v in value]
+		return sum(s[0] for s in sizes), sum(s[1] for s in sizes)
+	if isinstance(value, dict):
+		return _size(list(value.values()))
+	if isinstance(value, (int, float, np.generic)):
+		return 1, 0
+	return 0, 0
+
+class Stat:
+	"""accumulated measurements of one stage"""
+	__slots__ = ('calls', 'elements', 'time', 'self_time', 'bytes', 'peak_bytes')
+
+	def __init__(self):
+		self.calls = self.elements = self.bytes = self.peak_bytes = 0
+		self.time = self.self_time = 0.
+
+	def as_dict(self):
+		return {k: getattr(self, k) for k in self.__slots__}
+
+class _Stage:
+	__slots__ = ('profiler', 'name', 'elements')
+
+	def __init__(self, profiler, name, elements):
+		self.profiler = profiler
+		self.name = name
+		self.elements = elements
+
+	def __enter__(self):
+		self.profiler._enter(self.name)
+		return self
+
+	def __exit__(self, *exc):
+		self.profiler._exit(self.elements, 0)
+
+class Profiler:
+	"""
+	collects per stage measurements while enabled
+	targets: module names whose public functions are wrapped
+	memory: also record the peak traced allocation of every stage
+	(tracemalloc, slows numpy allocation down noticeably)
+	trace: keep one event per call, up to max_events, for chrome_trace()
+	"""
+
+	def __init__(self, targets = TARGETS, memory = False, trace = True,
+		max_events = MAX_EVENTS):
+		self.targets = tuple(targets)
+		self.memory = memory
+		self.trace = trace
+		self.max_events = max_events
+		self.reset()
+		self._patched = []
+
+	def reset(self):
+		"""drop everything measured so far"""
+		self.stats = {}
+		self.folded = {}
+		self.events = []
+		self.dropped = 0
+		self._stack = []
+		self._t0 = time.perf_counter()
+		self.wall = 0.
+
+	# enabling
+
+	def enable(self):
+		"""wrap the target functions and make stage() record"""
+		global _active
+		if _active is not None:
+			raise RuntimeError('a profiler is already enabled')
+		if self.memory:
+			import tracemalloc
+			self._tracemalloc = tracemalloc
+			self._started_tracemalloc = not tracemalloc.is_tracing()
+			if self._started_tracemalloc:
+				tracemalloc.start()
+		for name in self.targets:
+			module = importlib.import_module(name)
+			for attr, func in list(vars(module).items()):
+				if (attr.startswith('_') or not callable(func) or
+					isinstance(func, type) or
+					getattr(func, '__module__', None) != name):
+					continue
+				setattr(module, attr, self._wrap(func, name + '.' + attr))
+				self._patched.append((module, attr, func))
+		self._enabled_at = time.perf_counter()
+		_active = self
+		return self
+
+	def disable(self):
+		"""restore the original functions"""
+		global _active
+		if _active is not self:
+			return
+		for module, attr, func in reversed(self._patched):
+			setattr(module, attr, func)
+		self._patched = []
+		if self.memory and self._started_tracemalloc:
+			self._tracemalloc.stop()
+		self.wall += time.perf_counter() - self._enabled_at
+		_active = None
+
+	def __enter__(self):
+		return self.enable()
+
+	def __exit__(self, *exc):
+		self.disable()
+
+	# measuring
+
+	def _wrap(self, func, name):
+		@wraps(func)
+		def wrapper(*args, **kwargs):
+			self._enter(name)
+			out = None
+			try:
+				out = func(*args, **kwargs)
+				return out
+			finally:
+				self._exit(*_size(out))
+		return wrapper
+
+	def stage(self, name, elements = 0):
+		"""return a context manager measuring a named stage"""
+		return _Stage(self, name, elements)
+
+	def _enter(self, name):
+		stack = self._stack
+		path = stack[-1][5] + ';' + name if stack else name
+		# name, start, time in children, traced at start, peak floor, path
+		frame = [name, 0., 0., 0, 0, path]
+		if self.memory:
+			current, peak = self._tracemalloc.get_traced_memory()
+			if stack:
+				stack[-1][4] = max(stack[-1][4], peak)
+			self._tracemalloc.reset_peak()
+			frame[3] = frame[4] = current
+		stack.append(frame)
+		frame[1] = time.perf_counter()
+
+	def _exit(self, elements, nbytes):
+		end = time.perf_counter()
+		stack = self._stack
+		name, start, children, current, floor, path = stack.pop()
+		dt = end - start
+		if stack:
+			stack[-1][2] += dt
+		stat = self.stats.get(name)
+		if stat is None:
+			stat = self.stats[name] = Stat()
+		stat.calls += 1
+		stat.elements += elements
+		stat.time += dt		# recursion counts the inner calls again
+		stat.self_time += dt - children
+		stat.bytes += nbytes
+		if self.memory:
+			peak = max(floor, self._tracemalloc.get_traced_memory()[1])
+			stat.peak_bytes = max(stat.peak_bytes, peak - current)
+			if stack:
+				stack[-1][4] = max(stack[-1][4], peak)
+		self.folded[path] = self.folded.get(path, 0.) + dt - children
+		if self.trace:
+			if len(self.events) < self.max_events:
+				self.events.append((name, start - self._t0, dt, elements,
+					len(stack)))
+			else:
+				self.dropped += 1
+
+	# exporting
+
+	def summary(self):
+		"""return {stage: measurements}, slowest self time first"""
+		items = sorted(self.stats.items(), key=lambda kv: -kv[1].self_time)
+		return {name: s.as_dict() for name, s in items}
+
+	def to_json(self):
+		"""return the summary as a JSON document"""
+		return json.dumps(dict(wall=self.wall, memory=self.memory,
+			dropped_events=self.dropped, stages=self.summary()), indent=1)
+
+	def folded_stacks(self):
+		"""
+		return the self time of every call stack in the folded format of
+		flamegraph.pl and speedscope, 'a;b;c microseconds' per line
+		"""
+		return ''.join('{} {}\n'.format(path, int(round(t*1e6)))
+			for path, t in sorted(self.folded.items()))
+
+	def chrome_trace(self):
+		"""return the calls as Chrome trace events (complete events, in us)"""
+		pid = os.getpid()
+		events = [dict(name=name, cat=name.split('.')[0], ph='X', ts=t*1e6,
+			dur=dt*1e6, pid=pid, tid=0, args=dict(elements=n, depth=depth))
+			for name, t, dt, n, depth in self.events]
+		return dict(traceEvents=events, displayTimeUnit='ms',
+			otherData=dict(dropped_events=self.dropped))
+
+	def save(self, prefix):
+		"""write prefix.json, prefix.folded and, if traced, prefix.trace.json"""
+		with open(prefix + '.json', 'w') as f:
+			f.write(self.to_json())
+		with open(prefix + '.folded', 'w') as f:
+			f.write(self.folded_stacks())
+		if self.trace:
+			with open(prefix + '.trace.json', 'w') as f:
+				json.dump(self.chrome_trace(), f)
+
+	def table(self, n = 20):
+		"""return the n slowest stages (self time) as a text table"""
+		lines = ['{:<48} {:>9} {:>12} {:>10} {:>10}'.format('stage', 'calls',
+			'elements', 'total s', 'self s')]
+		for name, s in list(self.summary().items())[:n]:
+			lines.append('{:<48} {:>9} {:>12} {:>10.4f} {:>10.4f}'.format(name,
+				s['calls'], s['elements'], s['time'], s['self_time']))
+		return '\n'.join(lines)
+
+def stage(name, elements = 0):
+	"""
+	return a context manager measuring a named stage of the enabled
+	profiler, a shared no-op if none is
+	elements: number of cells / samples the stage handles
+	"""
+	if _active is None:
+		return _NULL
+	return _active.stage(name, elements)
+
+def active():
+	"""return the enabled Profiler, or None"""
+	return _active
+
+def profile(targets = TARGETS, memory = False, trace = True,
+	max_events = MAX_EVENTS):
+	"""return a Profiler to use as context manager, see Profiler"""
+	return Profiler(targets, memory, trace, max_events)
+
+def _from_env():
+	prefix = os.environ.get(ENV)
+	if not prefix or _active is not None:
+		return
+	prof = Profiler().enable()
+
+	def finish():
+		prof.disable()
+		prof.save(prefix)
+
+	atexit.register(finish)
+
+_from_env()
@@ -0,0 +1,167 @@
+#!/usr/bin/python3
+
+#
+# jacobian.py
+#
+# analytic derivatives of the camera model, broadcast like the model
+#
+# the d_* functions mirror the camera_model functions of the same name and
+# return a dict of the value and its partial derivatives with respect to
+# each argument. camera_jacobian chains them into the derivatives of the
+# quantities a lens search optimizes (hyperfocal, near, far, s_s, CoC in
+# pixels) with respect to the camera parameters (focal length, f-number,
+# focus, pixel size, target distance), for a whole batch in one call
+#
+# partials are nan where the model has a pole (focused exactly at the
+# hyperfocal distance for far, at f for s_s) or a kink (CoC at the focus)
+#
+
+import numpy as np
+import camera_model as cm
+
+PARAMS = ('focal_length', 'f_number', 'focus', 'pixel_size', 'distance')
+QUANTITIES = ('hyperfocal', 'near', 'far', 's_s', 'coc')
+UNITS = {'hyperfocal': 'm', 'near': 'm', 'far': 'm', 's_s': 'mm',
+	'coc': 'pixels'}
+
+def d_hyperfocal_dist(f, N, c):
+	"""
+	return dict(value, f, N, c): hyperfocal distance in mm (see
+	camera_model.hyperfocal_dist) and its partials
+	"""
+	Nc = np.multiply(N, c)
+	f2 = np.square(f)
+	return dict(value=cm.hyperfocal_dist(f, N, c), f=2*np.divide(f, Nc) + 1,
+		N=-f2/(np.multiply(N, Nc)), c=-f2/(np.multiply(Nc, c)))
+
+def d_near_dist_acceptable(f, focus, H):
+	"""
+	return dict(value, f, focus, H): near DoF limit in mm (see
+	camera_model.near_dist_acceptable) and its partials, all in mm
+	"""
+	den = np.add(H, focus) - np.multiply(2, f)
+	Hf = np.subtract(H, f)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		den2 = np.square(den)
+		return dict(value=cm.near_dist_acceptable(f, focus, H),
+			f=(2*np.multiply(focus, Hf) - np.multiply(focus, den))/den2,
+			focus=np.multiply(Hf, np.subtract(H, np.multiply(2, f)))/den2,
+			H=np.multiply(focus, np.subtract(focus, f))/den2)
+
+def d_far_dist_acceptable(f, focus, H):
+	"""
+	return dict(value, f, focus, H): far DoF limit in mm (see
+	camera_model.far_dist_acceptable) and its partials, nan at focus == H
+	"""
+	den = np.subtract(H, focus)
+	Hf = np.subtract(H, f)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		den = np.where(den == 0, np.nan, den)
+		den2 = np.square(den)
+		return dict(value=cm.far_dist_acceptable(f, focus, H),
+			f=-np.divide(focus, den), focus=np.multiply(Hf, H)/den2,
+			H=np.multiply(focus, np.subtract(f, focus))/den2)
+
+def d_dof2s_s(dof, f):
+	"""
+	return dict(value, dof, f): lens to sensor distance in mm (see
+	camera_model.dof2s_s) and its partials, dof in m
+	"""
+	D = np.multiply(dof, cm.M_2_MM)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		den2 = np.square(D - f)
+		return dict(value=cm.dof2s_s(dof, f),
+			dof=-cm.M_2_MM*np.square(f)/den2, f=np.square(D)/den2)
+
+def d_get_circle_of_confusion(s_t, N, f, s_s):
+	"""
+	return dict(value, s_t, N, f, s_s): CoC diameter in mm (see
+	camera_model.get_circle_of_confusion) and its partials, s_t in m;
+	nan at the focus distance, where the CoC has its kink
+	"""
+	S = np.multiply(s_t, cm.M_2_MM)
+	g = f - np.multiply(s_s, S - f)/S	# signed CoC times N
+	sign = np.where(g == 0, np.nan, np.sign(g))
+	value = cm.get_circle_of_confusion(s_t, N, f, s_s)
+	k = sign/np.asarray(N, dtype=np.float64)
+	return dict(value=value, s_t=-cm.M_2_MM*k*np.multiply(s_s, f)/np.square(S),
+		N=-np.divide(value, N), f=k*(1 + np.divide(s_s, S)),
+		s_s=k*(np.divide(f, S) - 1))
+
+def camera_jacobian(f, N, focus, pixel_size, distance, accept_coc):
+	"""
+	return {quantity: dict(value, focal_length, f_number, focus, pixel_size,
+	distance)} for every QUANTITY (units in UNITS, parameters in mm, -, m,
+	um, m), broadcast over all arguments; partials that do not vary along
+	an axis come back as read-only broadcast views
+	focus: in m, None for the hyperfocal distance (which then moves with
+	focal length, f-number and pixel size)
+	accept_coc: acceptable CoC in pixels, a constant
+	"""
+	shape = np.broadcast(f, N, pixel_size, distance,
+		0. if focus is None else focus).shape
+	c = np.multiply(accept_coc, pixel_size)/cm.MM_2_UM
+	dH = d_hyperfocal_dist(f, N, c)
+	# partials that vanish stay scalar 0 until pack()
+	H = dict.fromkeys(PARAMS, 0.)
+	H.update(focal_length=dH['f'], f_number=dH['N'],
+		pixel_size=dH['c']*np.divide(accept_coc, cm.MM_2_UM))
+	# focus in mm and its partials
+	if focus is None:
+		F_value, F = dH['value'], dict(H)
+	else:
+		F_value = np.multiply(focus, cm.M_2_MM)
+		F = dict.fromkeys(PARAMS, 0.)
+		F['focus'] = cm.M_2_MM
+
+	def chain(d):
+		"""partials of d (wrt f, focus, H) in every parameter"""
+		return {p: (d['f'] if p == 'focal_length' else 0) + d['focus']*F[p] +
+			d['H']*H[p] for p in PARAMS}
+
+	near = d_near_dist_acceptable(f, F_value, dH['value'])
+	far = d_far_dist_acceptable(f, F_value, dH['value'])
+	dn, df = chain(near), chain(far)
+
+	ds = d_dof2s_s(F_value/cm.M_2_MM, f)
+	S = {p: ds['dof']*(F[p]/cm.M_2_MM) for p in PARAMS}
+	S['focal_length'] = S['focal_length'] + ds['f']
+
+	dc = d_get_circle_of_confusion(distance, N, f, ds['value'])
+	px_mm = np.divide(pixel_size, cm.MM_2_UM)
+	C = {p: dc['s_s']*S[p] for p in PARAMS}
+	C['focal_length'] = C['focal_length'] + dc['f']
+	C['f_number'] = C['f_number'] + dc['N']
+	C['distance'] = C['distance'] + dc['s_t']
+	coc = {p: v/px_mm for p, v in C.items()}
+	coc['pixel_size'] = coc['pixel_size'] - \
+		dc['value']/(px_mm*np.asarray(pixel_size, dtype=np.float64))
+
+	def pack(value, partials, scale = 1):
+		"""scale to the output unit, broadcast (read-only views) to shape"""
+		out = dict(value=value, **partials)
+		if scale != 1:
+			out = {k: np.divide(v, scale) for k, v in out.items()}
+		return {k: cm._out(np.broadcast_to(v, shape)) for k, v in out.items()}
+
+	# focused at or beyond the hyperfocal distance: sharp out to infinity
+	beyond = F_value >= dH['value']
+	far_value = np.where(beyond, np.inf, far['value'])
+	df = {p: np.where(beyond, np.nan, v) for p, v in df.items()}
+	return dict(hyperfocal=pack(dH['value'], H, cm.M_2_MM),
+		near=pack(near['value'], dn, cm.M_2_MM),
+		far=pack(far_value, df, cm.M_2_MM),
+		s_s=pack(ds['value'], S),
+		coc=pack(dc['value']/px_mm, coc))
+
+def stack(jac, quantities = QUANTITIES, params = PARAMS):
+	"""
+	return (values, J) from a camera_jacobian dict: values of shape
+	batch + (len(quantities),), J of shape batch + (len(quantities),
+	len(params)), for optimizers working on plain arrays
+	"""
+	values = np.stack([jac[q]['value'] for q in quantities], axis=-1)
+	J = np.stack([np.stack([jac[q][p] for p in params], axis=-1)
+		for q in quantities], axis=-2)
+	return values, J
+
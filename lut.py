@@ -0,0 +1,190 @@
+#!/usr/bin/python3
+
+#
+# lut.py
+#
+# lookup tables for per-frame queries of a fixed camera: the CoC in pixels
+# and the apparent feature size in pixels, tabulated on a uniform grid in
+# log distance. a query is one log, one multiply and a linear
+# interpolation, O(1) whatever the table size
+#
+# both curves are K*|1/d - c| (c = 1/focus for the CoC, 0 for the feature
+# size), so the interpolation error has a closed form bound: h^2/8 *
+# max|g''| on a smooth cell, S*h/2 on the cell holding the kink at the
+# focus (S the largest slope there), with g(u) = K*|exp(-u) - c| and h the
+# step in u = ln(d). tables are sized so that bound is below the tolerance,
+# and the bound is stored with the table
+#
+# a table file is a 64 byte header followed by the float64 values, loaded
+# with np.memmap
+#
+
+import math
+import struct
+import numpy as np
+import camera_model as cm
+
+MAGIC = b'CMLUT\x00\x00\x01'
+# magic, kind, n, ln(lo), step, bound, K, c
+HEADER = struct.Struct('<8s2q5d')
+HEADER_SIZE = 64
+KINDS = ('coc', 'pixels')
+
+class LogTable:
+	"""
+	values of g(d) at d = lo*exp(k*step), k = 0 .. n-1, in m
+	bound: maximum interpolation error over [lo, hi], in the table's unit
+	"""
+	__slots__ = ('kind', 'values', 'u0', 'step', 'bound', 'K', 'c', '_inv',
+		'_last', '_list')
+
+	def __init__(self, kind, values, u0, step, bound, K, c):
+		self.kind = kind
+		self.values = values
+		self.u0 = u0
+		self.step = step
+		self.bound = bound
+		self.K = K
+		self.c = c
+		self._inv = 1/step
+		# the last grid position, with room for the rounding of log(hi)
+		self._last = (len(values) - 1)*(1 + 1e-12)
+		self._list = None
+
+	def __len__(self):
+		return len(self.values)
+
+	def __repr__(self):
+		return 'LogTable({}, {} values over [{:g}, {:g}] m, error <= {:.3g})'.format(
+			self.kind, len(self), self.lo, self.hi, self.bound)
+
+	@property
+	def lo(self):
+		return math.exp(self.u0)
+
+	@property
+	def hi(self):
+		return math.exp(self.u0 + (len(self) - 1)*self.step)
+
+	def __call__(self, dist):
+		"""
+		return the interpolated value at every distance in m, nan outside
+		[lo, hi]; a python scalar takes a pure python path, for per frame
+		calls
+		"""
+		if isinstance(dist, (float, int)):
+			return self._scalar(dist)
+		dist = np.asarray(dist, dtype=np.float64)
+		x = (np.log(dist) - self.u0)*self._inv
+		n = len(self.values)
+		i = np.clip(x.astype(np.intp), 0, n - 2)
+		t = x - i
+		v = self.values
+		out = v[i] + t*(v[i + 1] - v[i])
+		return cm._out(np.where((x < 0) | (x > self._last), np.nan, out))
+
+	def _scalar(self, dist):
+		if self._list is None:
+			self._list = self.values.tolist()
+		v = self._list
+		x = (math.log(dist) - self.u0)*self._inv if dist > 0 else -1.
+		if not 0 <= x <= self._last:
+			return math.nan
+		i = min(int(x), len(v) - 2)
+		return v[i] + (x - i)*(v[i + 1] - v[i])
+
+	def save(self, path):
+		with open(path, 'wb') as f:
+			f.write(HEADER.pack(MAGIC, KINDS.index(self.kind), len(self.values),
+				self.u0, self.step, self.bound, self.K, self.c).ljust(HEADER_SIZE,
+				b'\x00'))
+			f.write(np.ascontiguousarray(self.values, dtype='<f8').tobytes())
+
+	@classmethod
+	def load(cls, path):
+		"""load a table saved with save(), its values memory-mapped"""
+		with open(path, 'rb') as f:
+			magic, kind, n, u0, step, bound, K, c = HEADER.unpack(
+				f.read(HEADER.size))
+		if magic != MAGIC:
+			raise ValueError('not a lookup table file: ' + path)
+		values = np.memmap(path, dtype='<f8', mode='r', offset=HEADER_SIZE,
+			shape=(n,))
+		return cls(KINDS[kind], values, u0, step, bound, K, c)
+
+def error_bound(K, c, u0, step, n):
+	"""
+	return the maximum linear interpolation error of g(u) = K*|exp(-u) - c|
+	tabulated at u0 + k*step, k = 0 .. n-1
+	"""
+	# |g'| and |g''| are both K*exp(-u), largest at the cell's left end
+	bound = step*step/8*K*math.exp(-u0)
+	if c > 0:
+		k = math.floor((-math.log(c) - u0)/step)
+		if 0 <= k < n - 1:
+			bound = max(bound, step/2*K*math.exp(-(u0 + k*step)))
+	return bound
+
+def _size(K, c, lo, hi, tol, max_n):
+	"""return the smallest table size over [lo, hi] with error_bound <= tol"""
+	u0, span = math.log(lo), math.log(hi/lo)
+	# the smooth cells need step <= sqrt(8*tol/(K/lo)), the kink cell about
+	# 2*tol/(K*c); start from the smaller and grow until the bound holds
+	step = math.sqrt(8*tol*lo/K)
+	if c > 0:
+		step = min(step, 2*tol/(K*c))
+	n = max(2, math.ceil(span/step) + 1)
+	while n <= max_n:
+		if error_bound(K, c, u0, span/(n - 1), n) <= tol:
+			return n
+		n = math.ceil(n*1.05) + 1
+	raise ValueError('tolerance {} needs more than {} values'.format(tol, max_n))
+
+def _grid(lo, hi, n):
+	u0 = math.log(lo)
+	step = math.log(hi/lo)/(n - 1)
+	return u0, step, np.exp(u0 + step*np.arange(n))
+
+def coc_table(N, f, s_s, pixel_size = 2.2, lo = 0.15, hi = 100, tol = 1e-3,
+	max_n = 1 << 24):
+	"""
+	return the LogTable of camera_model.get_circle_of_confusion_in_pix over
+	[lo, hi] m, within tol pixels
+	"""
+	# CoC in pixels = K*|1/d - 1/focus|, d in m
+	K = s_s*f/(N*pixel_size/cm.MM_2_UM)/cm.M_2_MM
+	c = 1/cm.s_s2dof(s_s, f)
+	n = _size(K, c, lo, hi, tol, max_n)
+	u0, step, d = _grid(lo, hi, n)
+	values = cm.get_circle_of_confusion_in_pix(d, N, f, s_s, pixel_size)
+	return LogTable('coc', values, u0, step, error_bound(K, c, u0, step, n), K, c)
+
+def pixel_table(FoV, res, feat_size, lo = 0.15, hi = 100, tol = 1e-3,
+	max_n = 1 << 24):
+	"""
+	return the LogTable of the apparent feature size in pixels before
+	rounding up, over [lo, hi] m within tol pixels; np.ceil of a lookup is
+	camera_model.target_size_in_pix except where the size is within tol of
+	an integer
+	"""
+	K = feat_size/np.tan(np.radians(FoV)/res)
+	n = _size(K, 0., lo, hi, tol, max_n)
+	u0, step, d = _grid(lo, hi, n)
+	return LogTable('pixels', K/d, u0, step, error_bound(K, 0., u0, step, n),
+		K, 0.)
+
+def camera_tables(camera, accept_coc = 4, feat_size = 0.1, lo = 0.15,
+	hi = 100, tol = 1e-3):
+	"""
+	return {'coc': ..., 'pixels': ...} tables of a catalog.Camera; focus
+	None is the hyperfocal distance
+	"""
+	focus = camera.focus
+	if focus is None:
+		focus = cm.hyperfocal_dist(camera.focal_length, camera.f_number,
+			accept_coc*camera.pixel_size/cm.MM_2_UM)/cm.M_2_MM
+	s_s = cm.dof2s_s(focus, camera.focal_length)
+	return dict(coc=coc_table(camera.f_number, camera.focal_length, s_s,
+		camera.pixel_size, lo, hi, tol),
+		pixels=pixel_table(camera.fov_y, camera.res_y, feat_size, lo, hi, tol))
+
@@ -0,0 +1,165 @@
+#!/usr/bin/python3
+
+#
+# montecarlo.py
+#
+# Monte Carlo tolerance analysis: manufacturing spread on focal length,
+# sensor to lens distance (s_s), f-number and focus, drawn in batches and
+# evaluated against a requirement (see design.Requirement)
+#
+# every batch has its own RNG stream spawned from one SeedSequence, and
+# batch aggregates are merged in batch order, so results only depend on
+# the seed, never on how many worker processes ran the batches. only
+# aggregates (counts, moments, histograms) leave a batch, never samples
+#
+
+import math
+import numpy as np
+import camera_model as cm
+import solver
+
+BATCH_SIZE = 1 << 17
+# CoC histogram bins in pixels, last bin open ended
+COC_BINS = np.linspace(0, 20, 81)
+
+# 1 sigma (normal) or half width (uniform) of every toleranced parameter
+DEFAULT_TOLERANCES = {
+	'focal_length': 0.01,	# mm
+	's_s': 0.005,			# mm, sensor placement along the axis
+	'f_number': 0.05,
+	'focus': 0.,			# m, error of the focusing procedure
+}
+
+def _draw(rng, n, nominal, tol, dist):
+	if not tol:
+		return np.full(n, float(nominal))
+	if dist == 'uniform':
+		return rng.uniform(nominal - tol, nominal + tol, n)
+	return rng.normal(nominal, tol, n)
+
+def _moments(x):
+	"""(n, mean, M2) of the finite values of x"""
+	x = x[np.isfinite(x)]
+	if not x.size:
+		return (0, 0., 0.)
+	mean = x.mean()
+	return (x.size, float(mean), float(np.sum(np.square(x - mean))))
+
+def _merge_moments(a, b):
+	"""merge two (n, mean, M2), Chan et al."""
+	n = a[0] + b[0]
+	if not n:
+		return a
+	delta = b[1] - a[1]
+	return (n, a[1] + delta*b[0]/n, a[2] + b[2] + delta*delta*a[0]*b[0]/n)
+
+def evaluate_batch(seed, n, camera, req, tolerances, dist = 'normal'):
+	"""
+	return the aggregates of n perturbed copies of camera
+	seed: np.random.SeedSequence of this batch
+	camera: nominal catalog.Camera; focus None is the nominal hyperfocal
+	"""
+	rng = np.random.default_rng(seed)
+	c_mm = req.accept_coc*camera.pixel_size/cm.MM_2_UM
+	focus = camera.focus
+	if focus is None:
+		focus = cm.hyperfocal_dist(camera.focal_length, camera.f_number,
+			c_mm)/cm.M_2_MM
+	# the sensor is placed for the nominal lens; the real lens then focuses
+	# wherever that placement puts it
+	f = _draw(rng, n, camera.focal_length, tolerances.get('focal_length'), dist)
+	N = _draw(rng, n, camera.f_number, tolerances.get('f_number'), dist)
+	focus = _draw(rng, n, focus, tolerances.get('focus'), dist)
+	s_s = cm.dof2s_s(focus, camera.focal_length) + _draw(rng, n, 0.,
+		tolerances.get('s_s'), dist)
+
+	near, far = solver.coc_crossings_in_pix(N, f, s_s, req.accept_coc,
+		camera.pixel_size)
+	FoV = cm.sensor_FoV(f, camera.pixel_size, camera.res_y)
+	min_d, max_d = solver.detection_range(FoV, camera.res_y, req.feat_size,
+		req.min_n_pixel, req.cover)
+	coc_near = cm.get_circle_of_confusion_in_pix(req.near, N, f, s_s,
+		camera.pixel_size)
+	coc_far = cm.get_circle_of_confusion_in_pix(req.far, N, f, s_s,
+		camera.pixel_size)
+
+	checks = dict(in_focus=(near <= req.near) & (far >= req.far),
+		detect_far=max_d >= req.far, fit_near=min_d <= req.near)
+	ok = checks['in_focus'] & checks['detect_far'] & checks['fit_near']
+	return dict(n=n, passed=int(ok.sum()),
+		checks={k: int(v.sum()) for k, v in checks.items()},
+		moments=dict(near=_moments(near), far=_moments(far),
+			coc_near=_moments(coc_near), coc_far=_moments(coc_far)),
+		hist=dict(coc_near=np.histogram(np.minimum(coc_near, COC_BINS[-1]),
+			COC_BINS)[0], coc_far=np.histogram(np.minimum(coc_far,
+			COC_BINS[-1]), COC_BINS)[0]))
+
+def _batch_job(args):
+	return evaluate_batch(*args)
+
+def _merge(total, batch):
+	if total is None:
+		return batch
+	total['n'] += batch['n']
+	total['passed'] += batch['passed']
+	for k in total['checks']:
+		total['checks'][k] += batch['checks'][k]
+	for k in total['moments']:
+		total['moments'][k] = _merge_moments(total['moments'][k],
+			batch['moments'][k])
+	for k in total['hist']:
+		total['hist'][k] = total['hist'][k] + batch['hist'][k]
+	return total
+
+def wilson_interval(k, n, z = 1.959964):
+	"""return the (lo, hi) Wilson score interval of a proportion k/n"""
+	if not n:
+		return (0., 1.)
+	p = k/n
+	den = 1 + z*z/n
+	centre = (p + z*z/(2*n))/den
+	half = z*math.sqrt(p*(1 - p)/n + z*z/(4*n*n))/den
+	return (max(0., centre - half), min(1., centre + half))
+
+def tolerance_analysis(camera, req, tolerances = None, n = 1000000,
+	seed = 0, batch_size = BATCH_SIZE, processes = None, dist = 'normal',
+	z = 1.959964):
+	"""
+	return the yield of camera under manufacturing tolerances as a dict:
+	n, passed, yield, ci (Wilson interval at z, default 95%), rate of every
+	check (in_focus, detect_far, fit_near), mean and std of the DoF limits
+	and of the CoC at req.near and req.far, CoC histograms over COC_BINS
+	tolerances: dict like DEFAULT_TOLERANCES, 1 sigma or uniform half width
+	processes: worker processes (None: all cores, 1: in this process); the
+	result is the same for any value
+	dist: 'normal' or 'uniform'
+	"""
+	if n < 1 or batch_size < 1:
+		raise ValueError('n and batch_size must be at least 1, got {} and '
+			'{}'.format(n, batch_size))
+	tolerances = DEFAULT_TOLERANCES if tolerances is None else tolerances
+	sizes = [batch_size]*(n//batch_size) + ([n % batch_size] if n % batch_size
+		else [])
+	seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+	jobs = [(s, m, camera, req, tolerances, dist) for s, m in zip(seeds, sizes)]
+	total = None
+	if processes == 1 or len(jobs) < 2:
+		for b in map(_batch_job, jobs):
+			total = _merge(total, b)
+	else:
+		from concurrent.futures import ProcessPoolExecutor
+		with ProcessPoolExecutor(max_workers=processes) as pool:
+			# map yields in submission order: merged identically every run
+			for b in pool.map(_batch_job, jobs):
+				total = _merge(total, b)
+
+	stats = {}
+	for k, (m, mean, M2) in total['moments'].items():
+		stats[k] = dict(n=m, mean=mean if m else np.nan,
+			std=math.sqrt(M2/(m - 1)) if m > 1 else np.nan)
+	return {'n': total['n'], 'passed': total['passed'],
+		'yield': total['passed']/total['n'],
+		'ci': wilson_interval(total['passed'], total['n'], z),
+		'rates': {k: v/total['n'] for k, v in total['checks'].items()},
+		'stats': stats, 'hist': total['hist'], 'bins': COC_BINS}
+
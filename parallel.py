@@ -0,0 +1,224 @@
+#!/usr/bin/python3
+
+#
+# parallel.py
+#
+# process pool scheduler for large sweeps: the sweep is split into work
+# units (one chunk of sweep.iter_chunks of one variable), workers write
+# their unit straight into shared memory result arrays and only send back
+# a small acknowledgement, never the values
+#
+# every cell is computed by the same code whichever worker takes its unit,
+# so results are bit-identical for any number of processes. with
+# precision='compact' the arrays have sweep.storage's dtypes; a packed bit
+# variable's units rarely end on a byte boundary, so workers write their
+# whole bytes and send back the few bits at either end, which this process
+# writes, never two processes the same byte. progress is
+# reported per finished unit; a cancelled run keeps the finished units and
+# run() resumes with the rest
+#
+# usage:
+#	with ParallelSweep(focal_length=..., f_number=..., ...) as ps:
+#		result = ps.run(progress=print)		# views into shared memory
+#	result = parallel_sweep(...)				# ordinary arrays, shm released
+#
+
+import os
+import numpy as np
+import sweep
+
+class SweepCancelled(Exception):
+	"""raised by ParallelSweep.run when cancel() turned true"""
+
+def _attach(name):
+	"""attach to an existing block without handing it to this process'
+	resource tracker, which would unlink it when the worker exits"""
+	from multiprocessing import shared_memory
+	try:
+		return shared_memory.SharedMemory(name=name, track=False)
+	except TypeError:		# python < 3.13: keep it from registering at all
+		from multiprocessing import resource_tracker
+		register = resource_tracker.register
+		resource_tracker.register = lambda *args: None
+		try:
+			return shared_memory.SharedMemory(name=name)
+		finally:
+			resource_tracker.register = register
+
+# worker side state, set once per process by _init_worker
+_worker = {}
+
+def _init_worker(axes, res, feat_size, chunk_size, blocks):
+	_worker.update(axes=axes, res=res, feat_size=feat_size,
+		chunk_size=chunk_size, shm={}, flat={}, compute={}, bits={})
+	for name, (shm_name, dtype, size, compute, bits) in blocks.items():
+		shm = _attach(shm_name)
+		_worker['shm'][name] = shm
+		_worker['flat'][name] = np.ndarray(size, dtype=dtype, buffer=shm.buf)
+		_worker['compute'][name] = compute
+		_worker['bits'][name] = bits
+
+def _run_unit(name, chunk):
+	"""
+	compute one chunk of variable name into shared memory, return (name,
+	chunk, cells, edges): edges are the (start bit, bools) of a packed
+	variable left to the caller, in bytes other units write into too
+	"""
+	w = _worker
+	start, stop, values = next(sweep.iter_chunks(w['axes'], name, w['res'],
+		w['feat_size'], w['chunk_size'], chunk, w['compute'][name]))
+	if not w['bits'][name]:
+		w['flat'][name][start:stop] = values
+		return name, chunk, stop - start, ()
+	a = min(-(-start//8)*8, stop)		# whole bytes cover [a, b)
+	b = max(stop//8*8, a)
+	values = np.asarray(values, dtype=np.bool_)
+	w['flat'][name][a//8:b//8] = np.packbits(values[a - start:b - start])
+	return name, chunk, stop - start, ((start, values[:a - start]),
+		(b, values[b - start:]))
+
+class ParallelSweep:
+	"""
+	a sweep (see sweep.sweep for the axes) evaluated by a process pool into
+	shared memory; close() (or leaving the with block) releases the memory,
+	after which results returned by run() must not be used
+	processes: worker processes, None for os.cpu_count()
+	precision, check: as for sweep.sweep, the check runs once run() has
+	computed every unit
+	"""
+
+	def __init__(self, focal_length, f_number, pixel_size, focus, distance,
+		accept_coc, res = 1944, feat_size = 0.1, variables = None,
+		chunk_size = sweep.CHUNK_SIZE, processes = None,
+		precision = 'float64', check = True):
+		from multiprocessing import shared_memory
+		self.axes = sweep.make_axes(focal_length, f_number, pixel_size, focus,
+			distance, accept_coc)
+		self.res = res
+		self.feat_size = feat_size
+		self.chunk_size = chunk_size
+		self.processes = processes or os.cpu_count()
+		self.variables = variables or list(sweep.DEFAULT_VARIABLES)
+		self.precision = precision
+		self.check = check
+		self.dims, self.data, self._shm, self._units = {}, {}, {}, []
+		self._compute, self.packed, self.stored = {}, {}, {}
+		for name in self.variables:
+			dims = sweep.variable_dims(name, self.axes)
+			shape = tuple(self.axes[a].size for a in dims)
+			compute, dtype, bits = sweep.storage(name, self.axes, res, feat_size,
+				precision)
+			self._compute[name] = compute
+			self.stored[name] = 'bits' if bits else dtype.name
+			size = int(np.prod(shape))
+			if bits:
+				self.packed[name] = shape
+				shape = (-(-size//8),)
+			shm = shared_memory.SharedMemory(create=True,
+				size=max(1, int(np.prod(shape))*dtype.itemsize))
+			self._shm[name] = shm
+			self.dims[name] = dims
+			self.data[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+			self._units += [(name, i, stop - start) for i, (start, stop)
+				in enumerate(sweep.chunk_bounds(self.axes, name, chunk_size))]
+		self.done = set()
+		self.total_cells = sum(u[2] for u in self._units)
+		self.attrs = dict(res=res, feat_size=feat_size)
+		if precision != 'float64':
+			self.attrs.update(precision=precision, storage=self.stored,
+				packed=self.packed)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def close(self):
+		self.data = {}
+		for shm in self._shm.values():
+			try:
+				shm.close()
+			except BufferError:
+				pass		# views still held: the mapping goes with the last one
+			shm.unlink()
+		self._shm = {}
+
+	def result(self):
+		"""return the SweepResult viewing the shared arrays"""
+		return sweep.SweepResult(self.axes, dict(self.dims), dict(self.data),
+			dict(self.attrs))
+
+	def _finish(self, fut):
+		"""record a finished unit, write its edge bits, return its cells"""
+		name, chunk, n, edges = fut.result()
+		for start, values in edges:
+			sweep._write_bits(self.data[name], start, values)
+		self.done.add((name, chunk))
+		return n
+
+	def run(self, progress = None, cancel = None):
+		"""
+		compute every unit not done yet and return result()
+		progress: optional callable(cells done, total cells) after each unit
+		cancel: optional callable polled between units; once it returns
+		True pending units are dropped and SweepCancelled is raised, the
+		finished ones are kept for the next run()
+		"""
+		# imported here, concurrent.futures is slow to import
+		from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+		todo = [u for u in self._units if (u[0], u[1]) not in self.done]
+		cells = self.total_cells - sum(u[2] for u in todo)
+		blocks = {n: (shm.name, self.data[n].dtype.str, self.data[n].size,
+			self._compute[n], n in self.packed) for n, shm in self._shm.items()}
+		pool = ProcessPoolExecutor(self.processes, initializer=_init_worker,
+			initargs=(self.axes, self.res, self.feat_size, self.chunk_size,
+			blocks))
+		# a bounded number of units in flight, so cancelling is prompt
+		pending, queue = set(), iter(todo)
+		try:
+			while True:
+				while len(pending) < 2*self.processes:
+					unit = next(queue, None)
+					if unit is None:
+						break
+					pending.add(pool.submit(_run_unit, unit[0], unit[1]))
+				if not pending:
+					break
+				finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+				for fut in finished:
+					cells += self._finish(fut)
+					if progress:
+						progress(cells, self.total_cells)
+				if cancel is not None and cancel():
+					for fut in pending:
+						fut.cancel()
+					# units already running still finish and count as done
+					for fut in wait(pending)[0]:
+						if not fut.cancelled():
+							self._finish(fut)
+					raise SweepCancelled('{} of {} cells done'.format(
+						sum(u[2] for u in self._units if (u[0], u[1]) in self.done),
+						self.total_cells))
+		finally:
+			pool.shutdown(wait=True, cancel_futures=True)
+		if self.precision != 'float64' and self.check:
+			self.attrs['check'] = sweep.require_precision(sweep.check_precision(
+				self.result()))
+		return self.result()
+
+def parallel_sweep(focal_length, f_number, pixel_size, focus, distance,
+	accept_coc, res = 1944, feat_size = 0.1, variables = None,
+	chunk_size = sweep.CHUNK_SIZE, processes = None, progress = None,
+	precision = 'float64', check = True):
+	"""
+	return the SweepResult of sweep.sweep computed by a process pool, as
+	ordinary arrays (copied out of shared memory, which is then released)
+	"""
+	with ParallelSweep(focal_length, f_number, pixel_size, focus, distance,
+		accept_coc, res, feat_size, variables, chunk_size, processes,
+		precision, check) as ps:
+		r = ps.run(progress)
+		data = {n: a.copy() for n, a in r.data.items()}
+		return sweep.SweepResult(r.axes, r.dims, data, r.attrs)
+
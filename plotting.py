@@ -0,0 +1,114 @@
+#!/usr/bin/python3
+
+#
+# plotting.py
+#
+# visualization layer for the camera model. matplotlib is only imported
+# when a figure is actually drawn, so importing this module (or any of the
+# model modules) stays cheap for batch jobs
+#
+
+from math import ceil
+import camera_model as cm
+import decimate
+
+COLORS = ['r', 'k', 'b', 'c', 'm', 'g', '#D2691E', 'y', '#556b2f']
+
+def _pyplot():
+	import matplotlib.pyplot as plt
+	return plt
+
+def plot_coc(ax, dist, curves, labels = None, accept_coc = None,
+	near_d = None, pixel_flag = True, colors = COLORS, method = 'minmax'):
+	"""
+	draw CoC curves against distance on ax, as in the test.py figures
+	dist: distance data in m
+	curves: CoC arrays, one per configuration, in pixels (or mm)
+	labels: legend label of every curve
+	accept_coc: acceptable CoC drawn as a horizontal line, same unit
+	near_d: near distance in m to annotate, None for no annotation
+	pixel_flag: curves are in pixels rather than mm
+	method: decimation of long curves to the axes width (see
+	decimate.decimate), keeping the accept_coc crossings and the samples
+	around near_d exact; None draws every sample
+	"""
+	unit = 'pixels' if pixel_flag else 'mm'
+	if labels is None:
+		labels = ['CoC diameter [{}]'.format(unit)]*len(curves)
+	n = decimate.axes_pixels(ax)
+	log = ax.get_xscale() == 'log'
+	thresholds = () if accept_coc is None else [accept_coc]
+	keep_x = () if near_d is None else [near_d]
+	for i, coc in enumerate(curves):
+		x, y = dist, coc
+		if method is not None:
+			x, y = decimate.decimate(dist, coc, n, method, thresholds, keep_x,
+				log)
+		ax.plot(x, y, colors[i % len(colors)], label=labels[i])
+	if accept_coc is not None:
+		ax.hlines(accept_coc, -0.5, dist[-1], colors='r',
+			linestyles='dashdot', label='Acceptable CoC [{}]'.format(unit))
+		if near_d is not None:
+			ax.annotate('Near distance: {} cm'.format(ceil(near_d*cm.M_2_CM)),
+				xy=(near_d, accept_coc),
+				xycoords='data',
+				xytext=(+0, +0),
+				textcoords='offset points',
+				fontsize=10,
+				arrowprops=dict(facecolor='blue'))
+	ax.set_ylabel('CoC diameter [{}]'.format(unit))
+	ax.set_xlabel('Distance [m]')
+	ax.set_ylim([-1, 15])
+	ax.grid(visible=True, which='major', color='k', linestyle='-')
+	ax.grid(visible=True, which='minor', color='grey', linestyle='--')
+	ax.tick_params(axis='x', which='minor')
+	ax.legend(loc='best', shadow=True)
+	return ax
+
+def coc_figure(dist, curves, labels = None, accept_coc = None, near_d = None,
+	pixel_flag = True, title = 'Circle of confusion', colors = COLORS,
+	figure = None, method = 'minmax'):
+	"""
+	return a new figure with the CoC curves, see plot_coc
+	figure: callable creating the figure, default pyplot.figure; pass
+	matplotlib.figure.Figure to stay clear of pyplot's global state
+	"""
+	fig = (figure or _pyplot().figure)()
+	ax = fig.add_subplot(111)
+	plot_coc(ax, dist, curves, labels, accept_coc, near_d, pixel_flag, colors,
+		method)
+	ax.set_title(title)
+	return fig
+
+def plot_gantt(ax, labels, ranges, ticks = None):
+	"""
+	draw the operating range of every camera as a bar on a log distance axis
+	labels: camera names, top to bottom
+	ranges: [min, max] distance in m of every camera
+	ticks: distances to put x ticks at, default every range end (3 digits)
+	"""
+	n = len(labels)
+	pos = [(i*0.5)+0.5 for i in range(n)]
+	for i in range(n):
+		start, end = ranges[i]
+		ax.barh(pos[i], end - start, left=start, height=0.3, align='center',
+			edgecolor='lightgreen', color='orange', alpha = 0.8)
+	ax.set_yticks(pos)
+	ax.set_yticklabels(labels, fontsize=14)
+	ax.set_ylim(-0.1, n*0.5+0.5)
+	ax.grid(color = 'g', linestyle = ':')
+	ax.set_xscale('log')
+	if ticks is None:
+		ticks = [float('{:.3g}'.format(d)) for r in ranges for d in r]
+	ax.set_xticks(ticks)
+	ax.set_xticklabels(['{:g}'.format(t) for t in ticks], rotation=30,
+		fontsize=10)
+	ax.invert_yaxis()
+	return ax
+
+def gantt_figure(labels, ranges, ticks = None, figure = None):
+	"""return a new figure with the camera ranges, see plot_gantt"""
+	fig = (figure or _pyplot().figure)(figsize=(20, 8))
+	plot_gantt(fig.add_subplot(111), labels, ranges, ticks)
+	return fig
+
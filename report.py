@@ -0,0 +1,173 @@
+#!/usr/bin/python3
+
+#
+# report.py
+#
+# headless report pipeline: the figures of test.py and gantt.py rendered
+# to PNG/SVG/PDF without a window. scenarios are computed once in the
+# parent process, then the figures are rendered in parallel by a process
+# pool; workers only draw, they never recompute model data
+#
+# usage: python report.py [-o report] [-f png svg pdf] [-j N] [scenario ...]
+#
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import camera_model as cm
+import coverage
+import instrument
+import plotting
+
+FORMATS = ('png', 'svg', 'pdf')
+
+# two segment distance grids of test.py, in m
+DIST_FINAL = np.concatenate([np.arange(0.15, 10, .01), np.arange(11, 100, .25)])
+DIST_SWEEP = np.concatenate([np.arange(0.15, 20, .01), np.arange(20, 100, .25)])
+
+F_NUMBERS = [1, 1.2, 1.4, 1.8, 2, 2.2, 2.8, 4, 5.6]
+FOCAL_LENGTHS = [8, 12, 16, 20, 24, 28, 36, 40, 50]
+
+# the test.py analyses: every config is (focal length in mm, f-number),
+# focus in m or None for the hyperfocal distance
+SCENARIOS = {
+	'final': dict(kind='coc', title='Circle of confusion', dist=DIST_FINAL,
+		configs=[(3, 5.6)], focus=None, pixel_size=2.2, accept_coc=4,
+		colors=['k'], labels=None),
+	'f_number': dict(kind='coc', title='Circle of confusion, [variable N]',
+		dist=DIST_SWEEP, configs=[(16, N) for N in F_NUMBERS], focus=None,
+		pixel_size=2.2, accept_coc=4,
+		labels=['f/{:.1f}'.format(N) for N in F_NUMBERS]),
+	'focal': dict(kind='coc', title='Circle of confusion, [variable f]',
+		dist=DIST_SWEEP, configs=[(f, 4.6) for f in FOCAL_LENGTHS], focus=0.3,
+		pixel_size=2.2, accept_coc=4,
+		labels=['f/{:.1f}, {:d}mm'.format(4.6, f) for f in FOCAL_LENGTHS]),
+	'focal_and_f': dict(kind='coc',
+		title='Circle of confusion, [variable N, f]', dist=DIST_SWEEP,
+		configs=list(zip(FOCAL_LENGTHS, F_NUMBERS)), focus=None,
+		pixel_size=2.2, accept_coc=4,
+		labels=['f/{:.1f}, {:d}mm'.format(N, f)
+			for f, N in zip(FOCAL_LENGTHS, F_NUMBERS)]),
+	'gantt': dict(kind='gantt',
+		labels=['Docking cameras', 'Near-range cameras', 'Star Tracker'],
+		accept_coc=4, feat_size=0.1, min_n_pixel=10, cover=0.9),
+}
+
+def compute_coc(scenario):
+	"""
+	return the figure data of a 'coc' scenario: every config's CoC curve
+	in pixels, evaluated in one broadcast call
+	"""
+	f, N = (np.array(v, dtype=np.float64)[:, None]
+		for v in zip(*scenario['configs']))
+	c_mm = scenario['accept_coc']*scenario['pixel_size']/cm.MM_2_UM
+	H = cm.hyperfocal_dist(f, N, c_mm)
+	focus = H/cm.M_2_MM if scenario['focus'] is None else scenario['focus']
+	focus = np.broadcast_to(focus, f.shape)
+	curves = cm.get_circle_of_confusion_in_pix(scenario['dist'], N, f,
+		cm.dof2s_s(focus, f), scenario['pixel_size'])
+	# test.py annotates the near distance of its last configuration
+	near_d = cm.near_dist_acceptable(f[-1, 0], focus[-1, 0]*cm.M_2_MM,
+		H[-1, 0])/cm.M_2_MM
+	return dict(kind='coc', dist=scenario['dist'], curves=curves,
+		labels=scenario.get('labels'), accept_coc=scenario['accept_coc'],
+		near_d=near_d, title=scenario['title'],
+		colors=scenario.get('colors', plotting.COLORS))
+
+def compute(scenario):
+	"""return the data a scenario's figure is drawn from"""
+	if scenario['kind'] == 'coc':
+		return compute_coc(scenario)
+	if scenario['kind'] == 'gantt':
+		index = coverage.lies_index(scenario['accept_coc'],
+			scenario['feat_size'], scenario['min_n_pixel'], scenario['cover'])
+		return dict(kind='gantt', labels=scenario['labels'],
+			ranges=index.ranges())
+	return dict(scenario)
+
+def render(name, data, out_dir, formats = FORMATS):
+	"""
+	draw the figure data with the non-interactive Agg canvas and save it
+	once per format; returns the written paths
+	"""
+	from matplotlib.figure import Figure
+	with instrument.stage('report.draw.' + name):
+		fig = _figure(data, Figure)
+	paths = []
+	for fmt in formats:
+		path = os.path.join(out_dir, '{}.{}'.format(name, fmt))
+		with instrument.stage('report.save.' + fmt):
+			fig.savefig(path, format=fmt)
+		paths.append(path)
+	return paths
+
+def _figure(data, Figure):
+	"""return the figure of the data, drawn on a Figure of class Figure"""
+	if data['kind'] == 'coc':
+		fig = plotting.coc_figure(data['dist'], data['curves'], data['labels'],
+			data['accept_coc'], data['near_d'], True, data['title'],
+			data['colors'], figure=Figure)
+	elif data['kind'] == 'gantt':
+		fig = plotting.gantt_figure(data['labels'], data['ranges'],
+			data.get('ticks'), figure=Figure)
+	else:
+		raise ValueError('unknown figure kind: {}'.format(data['kind']))
+	return fig
+
+def _render_job(job):
+	return render(*job)
+
+def build_report(scenarios, out_dir = 'report', formats = FORMATS,
+	processes = None):
+	"""
+	compute every scenario, then render them across a process pool;
+	scenarios: dict of name -> scenario (see SCENARIOS)
+	processes: pool size, default os.cpu_count(); 1 renders in process
+	returns the written paths
+	"""
+	os.makedirs(out_dir, exist_ok=True)
+	jobs = []
+	for name, s in scenarios.items():
+		with instrument.stage('report.compute.' + name):
+			jobs.append((name, compute(s), out_dir, tuple(formats)))
+	if processes == 1 or len(jobs) < 2:
+		results = map(_render_job, jobs)
+		return [p for paths in results for p in paths]
+	with ProcessPoolExecutor(max_workers=processes) as pool:
+		results = pool.map(_render_job, jobs)
+		return [p for paths in results for p in paths]
+
+def main():
+	parser = argparse.ArgumentParser(
+		description='render the camera model figures to files')
+	parser.add_argument('scenarios', nargs='*', default=list(SCENARIOS),
+		help='scenarios to render (default all): ' + ', '.join(SCENARIOS))
+	parser.add_argument('-o', '--out-dir', default='report')
+	parser.add_argument('-f', '--formats', nargs='+', default=['png'],
+		choices=FORMATS)
+	parser.add_argument('-j', '--processes', type=int, default=None)
+	parser.add_argument('--profile', metavar='PREFIX',
+		help='render in process and write the instrument profile to '
+		'PREFIX.json, PREFIX.folded and PREFIX.trace.json')
+	args = parser.parse_args()
+
+	unknown = [s for s in args.scenarios if s not in SCENARIOS]
+	if unknown:
+		parser.error('unknown scenario: ' + ', '.join(unknown))
+	scenarios = {s: SCENARIOS[s] for s in args.scenarios}
+	if args.profile:
+		with instrument.profile() as prof:
+			paths = build_report(scenarios, args.out_dir, args.formats, 1)
+		prof.save(args.profile)
+		print(prof.table(), file=sys.stderr)
+	else:
+		paths = build_report(scenarios, args.out_dir, args.formats,
+			args.processes)
+	for path in paths:
+		print(path)
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+
+#
+# sampling.py
+#
+# adaptive distance sampling for the CoC and pixel curves: intervals are
+# split where linear interpolation misses the curve by more than the
+# tolerance (the kink at the focus distance, the steep near range) and
+# left coarse where it is flat, and every threshold crossing is inserted
+# exactly. replaces the fixed two segment np.arange grids of test.py
+#
+
+import numpy as np
+import camera_model as cm
+import solver
+
+def _midpoints(a, b, log):
+	return np.sqrt(a*b) if log else 0.5*(a + b)
+
+def _refine(func, x, y, atol, rtol, log, max_points):
+	"""split intervals until every midpoint is within tolerance"""
+	while x.size < max_points:
+		a, b = x[:-1], x[1:]
+		m = _midpoints(a, b, log)
+		ym = func(m)
+		linear = y[:-1] + (y[1:] - y[:-1])*(m - a)/(b - a)
+		err = np.abs(ym - linear)
+		split = (err > atol + rtol*np.abs(ym)) & (m > a) & (m < b)
+		if not split.any():
+			break
+		keep = np.flatnonzero(split)[:max_points - x.size]
+		x = np.insert(x, keep + 1, m[keep])
+		y = np.insert(y, keep + 1, ym[keep])
+	return x, y
+
+def adaptive_sample(func, lo, hi, atol = 1e-2, rtol = 1e-3, thresholds = (),
+	crossings = None, log = True, n_init = 33, max_points = 1 << 20):
+	"""
+	return (x, y): a sorted sampling of func on [lo, hi] such that linear
+	interpolation between neighbouring samples is within atol + rtol*|y| of
+	func at every interval midpoint
+	func: vectorized function of the distance
+	thresholds: levels whose crossings are located and inserted as samples
+	crossings: optional callable(level) returning the exact crossing
+	distances, used instead of root finding when the curve inverts in
+	closed form
+	log: bisect in log distance (for ranges over many decades)
+	max_points: stop refining once the sampling reaches this size
+	"""
+	grid = np.geomspace if log else np.linspace
+	x = grid(lo, hi, n_init)
+	y = func(x)
+	x, y = _refine(func, x, y, atol, rtol, log, max_points)
+	for level in thresholds:
+		if crossings is not None:
+			xc = np.atleast_1d(crossings(level)).astype(np.float64)
+			xc = xc[(xc > lo) & (xc < hi)]
+		else:
+			d = y - level
+			i = np.flatnonzero(np.sign(d[:-1])*np.sign(d[1:]) < 0)
+			if log:
+				g = lambda u: func(np.exp(u)) - level
+				xc = np.exp(solver.find_root(g, np.log(x[i]), np.log(x[i + 1])))
+			else:
+				xc = solver.find_root(lambda u: func(u) - level, x[i], x[i + 1])
+		xc = xc[np.isfinite(xc)]
+		j = np.searchsorted(x, xc)
+		x = np.insert(x, j, xc)
+		y = np.insert(y, j, func(xc))
+	# a crossing (the kink at the focus distance above all) splits an
+	# interval whose midpoint passed; its two halves are checked again
+	return _refine(func, x, y, atol, rtol, log, max_points)
+
+def coc_curve(N, f, s_s, pixel_size = 2.2, lo = 0.15, hi = 100,
+	accept_coc = None, atol = 1e-2, rtol = 1e-3, **kwargs):
+	"""
+	return (dist, coc): the CoC in pixels of one camera, adaptively sampled
+	over [lo, hi] m; the near/far accept_coc crossings and the in-focus
+	distance (the kink, CoC 0) are exact samples
+	"""
+	func = lambda d: cm.get_circle_of_confusion_in_pix(d, N, f, s_s, pixel_size)
+
+	def crossings(level):
+		if level == 0:
+			return cm.s_s2dof(s_s, f)
+		return solver.coc_crossings_in_pix(N, f, s_s, level, pixel_size)
+
+	levels = [0] + ([] if accept_coc is None else [accept_coc])
+	return adaptive_sample(func, lo, hi, atol, rtol, levels, crossings,
+		**kwargs)
+
+def pixel_curve(FoV, res, feat_size, lo = 0.15, hi = 100, min_n_pixel = None,
+	atol = 1e-2, rtol = 1e-3, **kwargs):
+	"""
+	return (dist, pixels): the apparent feature size in pixels before
+	rounding up (see camera_model.target_size_in_pix), adaptively sampled
+	over [lo, hi] m; the min_n_pixel detection limit is an exact sample
+	"""
+	iFoV = np.radians(FoV)/res
+	func = lambda d: feat_size/(d*np.tan(iFoV))
+	crossings = lambda n: cm.max_target_dist(FoV, res, n, feat_size)
+	levels = [] if min_n_pixel is None else [min_n_pixel]
+	return adaptive_sample(func, lo, hi, atol, rtol, levels, crossings,
+		**kwargs)
+
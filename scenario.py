@@ -0,0 +1,495 @@
+#!/usr/bin/python3
+
+#
+# scenario.py
+#
+# declarative scenario runner: scenario files (JSON or TOML) describe
+# cameras, requirements, sweeps and outputs; they are validated up front
+# (every problem reported with its location, nothing runs on a bad file),
+# then run in one invocation
+#
+# the critical distances of all scenarios are one vectorized call over a
+# catalog of their cameras. sweeps and figures become tasks keyed by the
+# canonical hash of their inputs (cache.cache_key), so scenarios sharing a
+# sweep or a figure compute it once, and the unique tasks run across a
+# process pool; an 'export' output streams the sweep into an export.py
+# table instead, the camera embedded in its metadata
+#
+# every scenario with a requirement is checked (usable range covers
+# [near, far]). a known shortfall is marked expect = "fail": it is reported
+# as XFAIL, and once it passes as XPASS, which fails the run until the mark
+# is dropped. --baseline compares against an earlier results.json for
+# nightly regression. exit status 1 if anything failed unexpectedly
+#
+# usage: python scenario.py scenarios/lies.toml [-o scenario_out] [-j N]
+#	[--baseline old/results.json] [--cache]
+#
+# file layout (TOML shown, JSON has the same structure):
+#	[defaults.requirement]		# fields merged into every requirement table
+#	accept_coc = 4
+#	[[scenario]]
+#	name = "docking"
+#	camera = "docking"			# catalog.LIES name, or a table of Camera fields
+#	requirement = "docking"		# design.MISSIONS name, or a table of fields
+#	outputs = ["critical", "check", "sweep", "figure", "export"]
+#	expect = "fail"				# the check is known to fail, default "pass"
+#	[scenario.sweep]			# axes: number, list or {geomspace = [lo, hi, n]}
+#	distance = {geomspace = [0.1, 100, 500]}
+#
+
+import argparse
+import json
+import math
+import os
+import shutil
+import sys
+import numpy as np
+import cache
+import catalog
+import design
+import export
+import report
+import sweep
+
+OUTPUTS = ('critical', 'check', 'sweep', 'figure', 'export')
+DEFAULT_OUTPUTS = ('critical', 'check')
+CRITICAL = ('near', 'far', 'min_detect', 'max_detect', 'min_usable',
+	'max_usable')
+RTOL = 1e-9		# relative change flagged against the baseline
+
+NUMBER = (int, float)
+# field: (type, required)
+CAMERA_FIELDS = {
+	'name': (str, False),
+	'focal_length': (NUMBER, True),
+	'f_number': (NUMBER, True),
+	'pixel_size': (NUMBER, False),
+	'res_x': (int, False),
+	'res_y': (int, False),
+	'fov_x': (NUMBER, False),
+	'fov_y': (NUMBER, False),
+	'focus': (NUMBER, False),
+}
+REQUIREMENT_FIELDS = {
+	'name': (str, False),
+	'near': (NUMBER, True),
+	'far': (NUMBER, True),
+	'feat_size': (NUMBER, False),
+	'min_n_pixel': (NUMBER, False),
+	'accept_coc': (NUMBER, False),
+	'cover': (NUMBER, False),
+}
+SWEEP_FIELDS = dict({a: ('axis', False) for a in sweep.AXES},
+	variables=(list, False), res=(int, False), feat_size=(NUMBER, False),
+	precision=(str, False))
+SCENARIO_FIELDS = {
+	'name': (str, True),
+	'camera': ((str, dict), True),
+	'requirement': ((str, dict), False),
+	'sweep': (dict, False),
+	'outputs': (list, False),
+	'formats': (list, False),
+	'expect': (str, False),
+}
+EXPECT = ('pass', 'fail')
+SPACINGS = {'linspace': np.linspace, 'geomspace': np.geomspace}
+
+class ScenarioError(ValueError):
+	"""invalid scenario files; args[0] lists every problem found"""
+
+# loading and validation
+
+def read(path):
+	"""return the parsed document of a .json or .toml scenario file"""
+	if path.endswith('.toml'):
+		import tomllib		# python >= 3.11
+		with open(path, 'rb') as f:
+			return tomllib.load(f)
+	with open(path) as f:
+		return json.load(f)
+
+def _type_name(t):
+	names = {int: 'an integer', float: 'a number', str: 'a string',
+		dict: 'a table', list: 'a list'}
+	if t == NUMBER:
+		return 'a number'
+	if isinstance(t, tuple):
+		return ' or '.join(names[x] for x in t)
+	return names[t]
+
+def _is(value, t):
+	# bool is an int to python, never a valid field value here
+	return isinstance(value, t) and not isinstance(value, bool)
+
+def _check_axis(value, where, errors):
+	if _is(value, NUMBER):
+		return
+	if _is(value, list):
+		if not value or not all(_is(v, NUMBER) for v in value):
+			errors.append('{}: expected a non-empty list of numbers'.format(where))
+		return
+	if _is(value, dict) and len(value) == 1 and next(iter(value)) in SPACINGS:
+		(kind, args), = value.items()
+		if (not _is(args, list) or len(args) != 3 or
+			not all(_is(v, NUMBER) for v in args) or not _is(args[2], int) or
+			args[2] < 1 or (kind == 'geomspace' and min(args[:2]) <= 0)):
+			errors.append('{}.{}: expected [lo, hi, n] with n a positive '
+				'integer{}'.format(where, kind,
+				', lo and hi > 0' if kind == 'geomspace' else ''))
+		return
+	errors.append('{}: expected a number, a list of numbers or a table '
+		'with one of {}'.format(where, ', '.join(SPACINGS)))
+
+def _check_table(table, fields, where, errors):
+	for key in table:
+		if key not in fields:
+			errors.append('{}.{}: unknown field, expected one of {}'.format(where,
+				key, ', '.join(fields)))
+	for key, (t, required) in fields.items():
+		if key not in table:
+			if required:
+				errors.append('{}.{}: missing'.format(where, key))
+		elif t == 'axis':
+			_check_axis(table[key], '{}.{}'.format(where, key), errors)
+		elif not _is(table[key], t):
+			errors.append('{}.{}: expected {}, got {!r}'.format(where, key,
+				_type_name(t), table[key]))
+
+def _merge_defaults(raw, defaults):
+	"""
+	default tables fill the fields of the scenario's tables of the same
+	name, other defaults (outputs, a mission name) fill absent keys
+	"""
+	out = dict(raw)
+	for key, value in defaults.items():
+		if isinstance(value, dict):
+			if isinstance(out.get(key), dict):
+				out[key] = dict(value, **out[key])
+		elif key not in out:
+			out[key] = value
+	return out
+
+def validate(raw, where = 'scenario'):
+	"""
+	return the errors (strings, empty if none) of one raw scenario table
+	"""
+	errors = []
+	if not isinstance(raw, dict):
+		return ['{}: expected a table'.format(where)]
+	_check_table(raw, SCENARIO_FIELDS, where, errors)
+	camera = raw.get('camera')
+	if isinstance(camera, str):
+		if camera not in catalog.LIES['name']:
+			errors.append('{}.camera: unknown camera {!r}, expected a table or '
+				'one of {}'.format(where, camera, ', '.join(catalog.LIES['name'])))
+	elif isinstance(camera, dict):
+		_check_table(camera, CAMERA_FIELDS, where + '.camera', errors)
+	req = raw.get('requirement')
+	if isinstance(req, str):
+		if req not in design.MISSIONS:
+			errors.append('{}.requirement: unknown mission {!r}, expected a '
+				'table or one of {}'.format(where, req, ', '.join(design.MISSIONS)))
+	elif isinstance(req, dict):
+		_check_table(req, REQUIREMENT_FIELDS, where + '.requirement', errors)
+	if isinstance(raw.get('sweep'), dict):
+		_check_table(raw['sweep'], SWEEP_FIELDS, where + '.sweep', errors)
+		for v in raw['sweep'].get('variables', []):
+			if v not in sweep.VARIABLES:
+				errors.append('{}.sweep.variables: unknown variable {!r}'.format(
+					where, v))
+		if raw['sweep'].get('precision', 'float64') not in sweep.PRECISIONS:
+			errors.append('{}.sweep.precision: expected one of {}'.format(where,
+				', '.join(sweep.PRECISIONS)))
+	for key, allowed in (('outputs', OUTPUTS), ('formats', report.FORMATS)):
+		for v in raw.get(key, []) if isinstance(raw.get(key), list) else []:
+			if v not in allowed:
+				errors.append('{}.{}: unknown {!r}, expected one of {}'.format(
+					where, key, v, ', '.join(allowed)))
+	# DEFAULT_OUTPUTS is a tuple and includes the check
+	outputs = raw.get('outputs', DEFAULT_OUTPUTS)
+	checked = isinstance(outputs, (list, tuple)) and 'check' in outputs
+	if checked and req is None:
+		errors.append('{}.outputs: check needs a requirement'.format(where))
+	if isinstance(raw.get('expect'), str) and raw['expect'] not in EXPECT:
+		errors.append('{}.expect: expected one of {}'.format(where,
+			', '.join(EXPECT)))
+	return errors
+
+def load(paths):
+	"""
+	return the raw scenarios of every file, defaults merged in; raises
+	ScenarioError listing every problem of every file
+	"""
+	scenarios, errors, names = [], [], {}
+	for path in paths:
+		try:
+			doc = read(path)
+		except (OSError, ValueError) as e:
+			errors.append('{}: {}'.format(path, e))
+			continue
+		if not isinstance(doc, dict):
+			errors.append('{}: expected a table at the top level'.format(path))
+			continue
+		for key in doc:
+			if key not in ('defaults', 'scenario'):
+				errors.append('{}: unknown top level key {!r}, expected defaults '
+					'or scenario'.format(path, key))
+		defaults = doc.get('defaults', {})
+		items = doc.get('scenario', [])
+		if isinstance(items, dict):
+			items = [items]
+		for i, raw in enumerate(items):
+			where = '{}: scenario[{}]'.format(path, i)
+			if isinstance(raw, dict) and isinstance(defaults, dict):
+				raw = _merge_defaults(raw, defaults)
+			problems = validate(raw, where)
+			errors += problems
+			if problems:
+				continue
+			if raw['name'] in names:
+				errors.append('{}.name: {!r} already used by {}'.format(where,
+					raw['name'], names[raw['name']]))
+			names[raw['name']] = where
+			scenarios.append(raw)
+	if errors:
+		raise ScenarioError('\n'.join(errors))
+	return scenarios
+
+# normalized scenarios
+
+def make_camera(spec):
+	"""return the catalog.Camera of a validated camera field"""
+	if isinstance(spec, str):
+		return catalog.LIES[int(np.flatnonzero(catalog.LIES['name'] == spec)[0])]
+	spec = dict(spec)
+	return catalog.Camera(spec.pop('name', 'camera'), **spec)
+
+def make_requirement(spec):
+	"""return the design.Requirement of a validated requirement field"""
+	if spec is None or isinstance(spec, str):
+		return design.MISSIONS.get(spec)
+	spec = dict(spec)
+	return design.Requirement(spec.pop('name', 'requirement'), **spec)
+
+def _axis(value):
+	if isinstance(value, dict):
+		(kind, (lo, hi, n)), = value.items()
+		return SPACINGS[kind](lo, hi, n)
+	return np.asarray(value, dtype=np.float64)
+
+def sweep_args(camera, req, spec):
+	"""
+	return the sweep.sweep keyword arguments of a scenario: axes not given
+	are the camera's values, the distance axis defaults to the report grid.
+	the camera's fov_y holds for the sweep, like for its critical distances,
+	unless the sweep changes its lens or sensor
+	"""
+	accept_coc = req.accept_coc if req is not None else 4
+	args = dict(focal_length=camera.focal_length, f_number=camera.f_number,
+		pixel_size=camera.pixel_size, focus=camera.focus,
+		distance=report.DIST_FINAL, accept_coc=accept_coc,
+		res=camera.res_y, feat_size=req.feat_size if req is not None else 0.1)
+	if not {'focal_length', 'pixel_size', 'res'} & set(spec):
+		args['fov'] = camera.fov_y
+	for key, value in spec.items():
+		args[key] = value if key in ('variables', 'res', 'feat_size',
+			'precision') else _axis(value)
+	return args
+
+# tasks, run once per distinct key
+
+def _sweep_task(key, args, out_dir, use_cache):
+	run = cache.cached_sweep if use_cache else sweep.sweep
+	r = run(**args)
+	path = os.path.join(out_dir, 'sweeps', key[:16] + '.npz')
+	arrays = {'axis.' + a: v for a, v in r.axes.items()}
+	arrays.update(('var.' + n, np.asarray(v)) for n, v in r.data.items())
+	np.savez(path, **arrays)
+	return dict(path=path, dims={n: list(d) for n, d in r.dims.items()},
+		storage=r.attrs.get('storage'))
+
+def _export_task(key, args, out_dir, camera):
+	path = os.path.join(out_dir, 'exports', key[:16])
+	if os.path.exists(path):		# a table left by an earlier run
+		shutil.rmtree(path)
+	meta = export.export_sweep(path, attrs=dict(camera=camera), **args)
+	return dict(path=path, rows=meta['rows'])
+
+def _figure_task(name, data, out_dir, formats):
+	paths = report.render(name, report.compute(data),
+		os.path.join(out_dir, 'figures'), formats)
+	return dict(paths=paths)
+
+def _run_task(task):
+	kind, args = task
+	if kind == 'sweep':
+		return _sweep_task(*args)
+	if kind == 'export':
+		return _export_task(*args)
+	return _figure_task(*args)
+
+def _figure_data(name, camera, req, spec):
+	"""the report.py 'coc' scenario drawing the camera's CoC curve"""
+	dist = _axis(spec['distance']) if 'distance' in spec else report.DIST_FINAL
+	return dict(kind='coc', title='Circle of confusion, {}'.format(name),
+		dist=np.atleast_1d(dist), configs=[(camera.focal_length, camera.f_number)],
+		focus=camera.focus, pixel_size=camera.pixel_size,
+		accept_coc=req.accept_coc if req is not None else 4, colors=['k'],
+		labels=['f/{:g}, {:g}mm'.format(camera.f_number, camera.focal_length)])
+
+def _check(req, critical):
+	"""return the reasons the usable range misses the requirement"""
+	lo, hi = critical['min_usable'], critical['max_usable']
+	if math.isnan(lo):
+		return ['no usable range (in focus and detectable)']
+	reasons = []
+	if lo > req.near:
+		reasons.append('usable from {:.4g} m, required from {:.4g} m'.format(lo,
+			req.near))
+	if hi < req.far:
+		reasons.append('usable to {:.4g} m, required to {:.4g} m'.format(hi,
+			req.far))
+	return reasons
+
+def run(scenarios, out_dir = 'scenario_out', processes = None,
+	use_cache = False):
+	"""
+	run validated raw scenarios (see load) and return {name: result};
+	processes: pool size for sweeps and figures, 1 runs them in process
+	use_cache: sweeps through cache.cached_sweep (persistent across runs)
+	"""
+	for sub in ('sweeps', 'figures', 'exports'):
+		os.makedirs(os.path.join(out_dir, sub), exist_ok=True)
+	cams = [make_camera(s['camera']) for s in scenarios]
+	reqs = [make_requirement(s.get('requirement')) for s in scenarios]
+	results = {s['name']: dict(camera=c.name) for s, c in zip(scenarios, cams)}
+
+	# critical distances of every scenario in one vectorized call
+	def field(name, default):
+		return np.array([getattr(r, name) if r is not None else default
+			for r in reqs], dtype=np.float64)
+
+	crit = catalog.Catalog.from_cameras(cams).critical_distances(
+		field('accept_coc', 4), field('feat_size', 0.1),
+		field('min_n_pixel', 10), field('cover', 1))
+
+	tasks, wanted = {}, []
+	for i, (s, cam, req) in enumerate(zip(scenarios, cams, reqs)):
+		name, res = s['name'], results[s['name']]
+		outputs = s.get('outputs', DEFAULT_OUTPUTS)
+		critical = {k: float(crit[k][i]) for k in CRITICAL}
+		if 'critical' in outputs:
+			res['critical'] = critical
+		if 'check' in outputs:
+			reasons = _check(req, critical)
+			res['check'] = dict(passed=not reasons, reasons=reasons,
+				expect=s.get('expect', 'pass'))
+		spec = s.get('sweep', {})
+		if 'sweep' in outputs:
+			args = sweep_args(cam, req, spec)
+			key = cache.cache_key('sweep', **args)
+			tasks.setdefault(key, ('sweep', (key, args, out_dir, use_cache)))
+			wanted.append((name, 'sweep', key))
+		if 'export' in outputs:
+			args = sweep_args(cam, req, spec)
+			camera = {f: getattr(cam, f) for f in catalog.FIELDS}
+			key = cache.cache_key('export', camera, **args)
+			tasks.setdefault(key, ('export', (key, args, out_dir, camera)))
+			wanted.append((name, 'export', key))
+		if 'figure' in outputs:
+			data = _figure_data(name, cam, req, spec)
+			formats = tuple(s.get('formats', ['png']))
+			key = cache.cache_key('figure', data, formats)
+			tasks.setdefault(key, ('figure', (name, data, out_dir, formats)))
+			wanted.append((name, 'figure', key))
+
+	keys = list(tasks)
+	if processes == 1 or len(keys) < 2:
+		done = dict(zip(keys, map(_run_task, tasks.values())))
+	else:
+		from concurrent.futures import ProcessPoolExecutor
+		with ProcessPoolExecutor(max_workers=processes) as pool:
+			done = dict(zip(keys, pool.map(_run_task, tasks.values())))
+	for name, kind, key in wanted:
+		results[name][kind] = done[key]
+	return results, dict(scenarios=len(scenarios), tasks=len(tasks),
+		requested=len(wanted))
+
+def compare(results, baseline, rtol = RTOL):
+	"""
+	return the differences of the critical distances against a baseline
+	results dict, one line per changed value; scenarios new or gone are
+	listed too
+	"""
+	diffs = []
+	for name, old in baseline.items():
+		if name not in results:
+			diffs.append('{}: missing from this run'.format(name))
+			continue
+		new = results[name].get('critical', {})
+		for k, a in old.get('critical', {}).items():
+			b = new.get(k)
+			same = b is not None and (a == b or (math.isnan(a) and math.isnan(b))
+				or abs(b - a) <= rtol*abs(a))
+			if not same:
+				diffs.append('{}: {} changed from {} to {}'.format(name, k, a, b))
+	diffs += ['{}: not in the baseline'.format(n) for n in results
+		if n not in baseline]
+	return diffs
+
+def main():
+	parser = argparse.ArgumentParser(
+		description='validate and run scenario files (JSON or TOML)')
+	parser.add_argument('files', nargs='+')
+	parser.add_argument('-o', '--out-dir', default='scenario_out')
+	parser.add_argument('-j', '--processes', type=int, default=None)
+	parser.add_argument('--baseline', metavar='RESULTS_JSON',
+		help='compare the critical distances with an earlier results.json')
+	parser.add_argument('--rtol', type=float, default=RTOL)
+	parser.add_argument('--cache', action='store_true',
+		help='run sweeps through the persistent cache (cache.py)')
+	parser.add_argument('--check-only', action='store_true',
+		help='validate the files and exit')
+	args = parser.parse_args()
+
+	try:
+		scenarios = load(args.files)
+	except ScenarioError as e:
+		print(e, file=sys.stderr)
+		return 2
+	if args.check_only:
+		print('{} scenarios ok'.format(len(scenarios)))
+		return 0
+	results, counts = run(scenarios, args.out_dir, args.processes, args.cache)
+	with open(os.path.join(args.out_dir, 'results.json'), 'w') as f:
+		json.dump(results, f, indent=1)
+
+	failed = 0
+	for name, res in results.items():
+		check = res.get('check')
+		if check is None:
+			continue
+		reasons = '; '.join(check['reasons'])
+		if check['expect'] == 'fail':
+			if check['passed']:
+				failed += 1
+				print('XPASS {}: passes, drop its expect = "fail"'.format(name))
+			else:
+				print('XFAIL {}: {}'.format(name, reasons))
+		elif check['passed']:
+			print('PASS {}'.format(name))
+		else:
+			failed += 1
+			print('FAIL {}: {}'.format(name, reasons))
+	diffs = []
+	if args.baseline:
+		with open(args.baseline) as f:
+			diffs = compare(results, json.load(f), args.rtol)
+		for d in diffs:
+			print('CHANGED ' + d)
+	print('{scenarios} scenarios, {requested} sweeps / figures / exports from {tasks} '
+		'distinct tasks'.format(**counts), file=sys.stderr)
+	return 1 if failed or diffs else 0
+
+if __name__ == '__main__':
+	sys.exit(main())
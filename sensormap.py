@@ -0,0 +1,213 @@
+#!/usr/bin/python3
+
+#
+# sensormap.py
+#
+# per pixel image plane maps over the whole sensor (e.g. 2592x1944) for a
+# sweep of target distances: ground sample size, blur and feature pixel
+# count, off axis included
+#
+# geometry is a pinhole whose focal length in pixels matches the on axis
+# pixel angle of camera_model.target_size_in_pix on each axis,
+# fx = 1/tan(fov_x/res_x). a pixel at normalized image position (u, v) =
+# (x/fx, y/fy), field angle theta, looks along a ray of slant range d; a
+# one pixel step along x turns the ray by sqrt(1 + v^2)*cos(theta)^2/fx,
+# along y by sqrt(1 + u^2)*cos(theta)^2/fy (on the x axis: the radial
+# cos^2 and the tangential cos foreshortening). for a target facing the
+# camera the footprint along each axis is d times that, and the sample
+# size is the larger of the two, the axis that limits detection: at the
+# centre it is d*tan(fov/res) of the coarser axis, so feature_pixels is
+# camera_model.target_size_in_pix on that axis. defocus is that of the
+# object plane at depth d*cos(theta)
+#
+# the map is evaluated tile by tile over all distances and only per tile
+# min / max / sum are kept, so memory is tiles x distances, not pixels x
+# distances. region queries combine the stored tiles that lie inside the
+# region and evaluate the partial tiles at its border exactly
+#
+# usage:
+#	m = SensorMap(catalog.LIES[2], np.geomspace(0.1, 20, 50))
+#	m.stats('blur', y=slice(0, 200), x=slice(0, 200))['max']
+#	m.values('feature_pixels', 10)		# full map at distances[10]
+#
+
+import numpy as np
+import camera_model as cm
+import blur
+
+QUANTITIES = ('gsd', 'blur', 'feature_pixels')
+UNITS = {'gsd': 'm', 'blur': 'pixels', 'feature_pixels': 'pixels'}
+TILE = 64
+
+class SensorMap:
+	"""
+	maps of every QUANTITY over the sensor of camera for every distance
+	camera: catalog.Camera, focus None is the hyperfocal distance
+	distances: slant ranges to the target in m
+	feat_size: feature size in m, for feature_pixels
+	accept_coc: acceptable CoC in pixels, only used for the hyperfocal focus
+	diffraction: include diffraction and pixel aperture in the blur (see
+	blur.effective_blur_in_pix), otherwise defocus only
+	"""
+
+	def __init__(self, camera, distances, feat_size = 0.1, accept_coc = 4,
+		diffraction = True, tile = TILE):
+		self.camera = camera
+		self.distances = np.atleast_1d(np.asarray(distances, dtype=np.float64))
+		self.feat_size = feat_size
+		self.diffraction = diffraction
+		self.tile = tile
+		self.shape = (camera.res_y, camera.res_x)
+		self.fx = 1/np.tan(np.radians(camera.fov_x)/camera.res_x)
+		self.fy = 1/np.tan(np.radians(camera.fov_y)/camera.res_y)
+		focus = camera.focus
+		if focus is None:
+			focus = cm.hyperfocal_dist(camera.focal_length, camera.f_number,
+				accept_coc*camera.pixel_size/cm.MM_2_UM)/cm.M_2_MM
+		self.s_s = cm.dof2s_s(focus, camera.focal_length)
+		self.tiles = (-(-self.shape[0]//tile), -(-self.shape[1]//tile))
+		self._build()
+
+	def __repr__(self):
+		return 'SensorMap({}, {}x{} px, {} distances, {}x{} tiles)'.format(
+			self.camera.name, self.shape[1], self.shape[0], len(self.distances),
+			self.tiles[1], self.tiles[0])
+
+	# evaluation
+
+	def _uv(self, y0, y1, x0, x1):
+		"""normalized image coordinates of the pixel centres in a rectangle"""
+		ry, rx = self.shape
+		v = (np.arange(y0, y1) - (ry - 1)/2)/self.fy
+		u = (np.arange(x0, x1) - (rx - 1)/2)/self.fx
+		return v[:, None], u[None, :]
+
+	def _cos(self, y0, y1, x0, x1):
+		"""cos of the field angle of the pixel centres in a rectangle"""
+		v, u = self._uv(y0, y1, x0, x1)
+		return 1/np.sqrt(1 + v**2 + u**2)
+
+	def footprint(self, y0, y1, x0, x1, k = slice(None)):
+		"""
+		return (along x, along y) footprints in m of the pixels of a
+		rectangle at distance indices k on a target facing the camera
+		"""
+		d = self.distances[k]
+		d = d.reshape(np.shape(d) + (1, 1))
+		v, u = self._uv(y0, y1, x0, x1)
+		cos2 = 1/(1 + v**2 + u**2)
+		return (d*np.sqrt(1 + v**2)*cos2/self.fx,
+			d*np.sqrt(1 + u**2)*cos2/self.fy)
+
+	def evaluate(self, quantity, y0, y1, x0, x1, k = slice(None)):
+		"""
+		return quantity over pixel rows y0:y1, columns x0:x1 at distance
+		indices k, shape (distances,) + rectangle
+		"""
+		d = self.distances[k]
+		d = d.reshape(np.shape(d) + (1, 1))
+		cos = self._cos(y0, y1, x0, x1)
+		if quantity == 'blur':
+			c = self.camera
+			if self.diffraction:
+				return blur.effective_blur_in_pix(d*cos, c.f_number,
+					c.focal_length, self.s_s, c.pixel_size)
+			return cm.get_circle_of_confusion_in_pix(d*cos, c.f_number,
+				c.focal_length, self.s_s, c.pixel_size)
+		gsd = np.maximum(*self.footprint(y0, y1, x0, x1, k))
+		if quantity == 'gsd':
+			return gsd
+		if quantity == 'feature_pixels':
+			return np.ceil(self.feat_size/gsd)
+		raise KeyError('unknown quantity: {}'.format(quantity))
+
+	def _build(self):
+		n = len(self.distances)
+		ty, tx = self.tiles
+		self._min = {q: np.empty((n, ty, tx)) for q in QUANTITIES}
+		self._max = {q: np.empty((n, ty, tx)) for q in QUANTITIES}
+		self._sum = {q: np.empty((n, ty, tx)) for q in QUANTITIES}
+		T = self.tile
+		for i in range(ty):
+			for j in range(tx):
+				rect = (i*T, min((i + 1)*T, self.shape[0]), j*T,
+					min((j + 1)*T, self.shape[1]))
+				for q in QUANTITIES:
+					v = self.evaluate(q, *rect)
+					self._min[q][:, i, j] = v.min(axis=(1, 2))
+					self._max[q][:, i, j] = v.max(axis=(1, 2))
+					self._sum[q][:, i, j] = v.sum(axis=(1, 2))
+
+	# queries
+
+	def _rect(self, y, x):
+		ry, rx = self.shape
+		y0, y1, sy = y.indices(ry)
+		x0, x1, sx = x.indices(rx)
+		if sy != 1 or sx != 1:
+			raise ValueError('region slices must have step 1')
+		return y0, max(y0, y1), x0, max(x0, x1)
+
+	def values(self, quantity, k, y = slice(None), x = slice(None)):
+		"""
+		return the exact map of quantity at distance index k over a region,
+		evaluated tile row by tile row
+		"""
+		y0, y1, x0, x1 = self._rect(y, x)
+		out = np.empty((y1 - y0, x1 - x0))
+		for a in range(y0, y1, self.tile):
+			b = min(a + self.tile, y1)
+			out[a - y0:b - y0] = self.evaluate(quantity, a, b, x0, x1, k)
+		return out
+
+	def pixel(self, quantity, y, x):
+		"""return quantity at pixel (y, x) for every distance"""
+		return self.evaluate(quantity, y, y + 1, x, x + 1)[:, 0, 0]
+
+	def stats(self, quantity, y = slice(None), x = slice(None)):
+		"""
+		return dict(min, max, mean) of quantity over a region, one value per
+		distance; whole tiles come from the stored tile stats, only the
+		partial tiles at the border are evaluated
+		"""
+		y0, y1, x0, x1 = self._rect(y, x)
+		n = len(self.distances)
+		lo, hi = np.full(n, np.inf), np.full(n, -np.inf)
+		total, count = np.zeros(n), 0
+		if y1 == y0 or x1 == x0:
+			return dict(min=lo, max=hi, mean=np.full(n, np.nan))
+		T = self.tile
+		# whole tiles inside the region
+		ia, ib = -(-y0//T), y1//T if y1 < self.shape[0] else self.tiles[0]
+		ja, jb = -(-x0//T), x1//T if x1 < self.shape[1] else self.tiles[1]
+		if ia < ib and ja < jb:
+			Y0, Y1 = ia*T, min(ib*T, self.shape[0])
+			X0, X1 = ja*T, min(jb*T, self.shape[1])
+			lo = self._min[quantity][:, ia:ib, ja:jb].min(axis=(1, 2))
+			hi = self._max[quantity][:, ia:ib, ja:jb].max(axis=(1, 2))
+			total = self._sum[quantity][:, ia:ib, ja:jb].sum(axis=(1, 2))
+			count = (Y1 - Y0)*(X1 - X0)
+			# the border: strips above and below, then left and right
+			parts = [(y0, Y0, x0, x1), (Y1, y1, x0, x1), (Y0, Y1, x0, X0),
+				(Y0, Y1, X1, x1)]
+		else:
+			parts = [(y0, y1, x0, x1)]
+		for a, b, c, d in parts:
+			if a >= b or c >= d:
+				continue
+			for r in range(a, b, T):
+				v = self.evaluate(quantity, r, min(r + T, b), c, d)
+				lo = np.minimum(lo, v.min(axis=(1, 2)))
+				hi = np.maximum(hi, v.max(axis=(1, 2)))
+				total = total + v.sum(axis=(1, 2))
+				count += v.shape[1]*v.shape[2]
+		return dict(min=lo, max=hi, mean=total/count)
+
+	def tile_stats(self, quantity):
+		"""return (min, max, mean) per tile, each (distances, tiles_y, tiles_x)"""
+		T = self.tile
+		h = np.minimum(T, self.shape[0] - T*np.arange(self.tiles[0]))
+		w = np.minimum(T, self.shape[1] - T*np.arange(self.tiles[1]))
+		return (self._min[quantity], self._max[quantity],
+			self._sum[quantity]/(h[:, None]*w[None, :]))
+
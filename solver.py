@@ -0,0 +1,133 @@
+#!/usr/bin/python3
+
+#
+# solver.py
+#
+# exact critical distances for batches of camera configurations: where the
+# CoC crosses the acceptable CoC, DoF limits and detection distances.
+# closed form where the model can be inverted, vectorized bracketed root
+# finding everywhere else
+#
+
+import numpy as np
+import camera_model as cm
+
+def coc_crossings(N, f, s_s, c):
+	"""
+	return (near, far): target distances in m where the CoC equals c;
+	the CoC is below c in between, far is np.inf if it never comes back up
+	CoC = (1/N)*|f - s_s + s_s*f/s_t| is linear in u = 1/s_t, so
+	u = (s_s - f +/- N*c)/(s_s*f)
+	N: f-number
+	f: focal length in mm
+	s_s: distance b/w lens and sensor when in focus, in mm
+	c: acceptable CoC in mm
+	"""
+	Nc = np.multiply(N, c)
+	den = np.multiply(s_s, f)
+	defocus = np.subtract(s_s, f)
+	u_near = (defocus + Nc)/den
+	u_far = (defocus - Nc)/den
+	# focused at the hyperfocal distance s_s - f == N*c up to the rounding of
+	# s_s, treat anything within that cancellation error as infinitely far
+	tol = 8*np.finfo(np.float64).eps*np.abs(s_s)/den
+	with np.errstate(divide='ignore'):
+		far = np.where(u_far > tol, 1/u_far, np.inf)
+	# an unknown parameter (nan) leaves far unknown, not infinite
+	far = np.where(np.isnan(u_far), np.nan, far)
+	return 1/u_near/cm.M_2_MM, far/cm.M_2_MM
+
+def coc_crossings_in_pix(N, f, s_s, accept_coc, pixel_size = 2.2):
+	"""
+	return (near, far) in m like coc_crossings, for an acceptable CoC in pixels
+	pixel_size: size of a pixel square on the sensor, measured in um
+	"""
+	c = np.multiply(accept_coc, pixel_size)/cm.MM_2_UM
+	return coc_crossings(N, f, s_s, c)
+
+def dof_limits(f, N, focus, accept_coc, pixel_size = 2.2):
+	"""
+	return (near, far): depth of field limits in m
+	f: focal length in mm
+	N: f-number
+	focus: focus distance in m, None to focus at the hyperfocal distance
+	accept_coc: acceptable CoC in pixels
+	pixel_size: in um
+	"""
+	if focus is None:
+		c = np.multiply(accept_coc, pixel_size)/cm.MM_2_UM
+		focus = cm.hyperfocal_dist(f, N, c)/cm.M_2_MM
+	s_s = cm.dof2s_s(focus, f)
+	return coc_crossings_in_pix(N, f, s_s, accept_coc, pixel_size)
+
+def detection_range(FoV, res, feat_size, min_n_pixel, cover = 1):
+	"""
+	return (min, max) target distances in m at which the feature is detectable:
+	still fitting within cover of the FoV, and still covering min_n_pixel
+	FoV: field of view, in degrees (one dimension)
+	res: the sensor resolution in pixels (one dimension)
+	feat_size: size of target feature in m
+	"""
+	return (cm.min_target_dist_with_cover(FoV, feat_size, cover),
+		cm.max_target_dist(FoV, res, min_n_pixel, feat_size))
+
+def critical_distances(f, N, pixel_size, res, focus, accept_coc, feat_size,
+	min_n_pixel, cover = 1, FoV = None):
+	"""
+	return a dict of broadcast arrays, all distances in m:
+	near, far: DoF limits
+	min_detect, max_detect: detection range from FoV and pixel count
+	min_usable, max_usable: in focus and detectable, nan where empty
+	FoV: in degrees, default derived from focal length, pixel size and res
+	"""
+	if FoV is None:
+		FoV = cm.sensor_FoV(f, pixel_size, res)
+	near, far = dof_limits(f, N, focus, accept_coc, pixel_size)
+	min_d, max_d = detection_range(FoV, res, feat_size, min_n_pixel, cover)
+	lo = np.maximum(near, min_d)
+	hi = np.minimum(far, max_d)
+	empty = lo > hi
+	return dict(near=near, far=far, min_detect=min_d, max_detect=max_d,
+		min_usable=np.where(empty, np.nan, lo),
+		max_usable=np.where(empty, np.nan, hi))
+
+def find_root(func, lo, hi, xtol = 1e-9, rtol = 1e-12, maxiter = 100):
+	"""
+	return x in [lo, hi] with func(x) == 0, for every element of a batch;
+	vectorized regula falsi with the Illinois modification, nan where the
+	bracket does not change sign
+	func: elementwise function of an array of the batch shape, may close over
+	per-element parameters of the same shape
+	lo, hi: bracket ends, broadcast to the batch shape
+	"""
+	a, b = np.broadcast_arrays(np.asarray(lo, dtype=np.float64),
+		np.asarray(hi, dtype=np.float64))
+	a, b = a.copy(), b.copy()
+	fa = np.broadcast_to(func(a), a.shape).astype(np.float64)
+	fb = np.broadcast_to(func(b), b.shape).astype(np.float64)
+	bad = np.sign(fa)*np.sign(fb) > 0
+	x = np.where(fa == 0, a, b)
+	done = bad | (fa == 0) | (fb == 0)
+	side = np.zeros(a.shape, dtype=np.int8)	# end replaced last step
+	for _ in range(maxiter):
+		if done.all():
+			break
+		with np.errstate(divide='ignore', invalid='ignore'):
+			xn = (a*fb - b*fa)/(fb - fa)
+		# fall back to bisection if the secant step leaves the bracket
+		inside = (xn > np.minimum(a, b)) & (xn < np.maximum(a, b))
+		xn = np.where(inside, xn, 0.5*(a + b))
+		x = np.where(done, x, xn)
+		fx = np.broadcast_to(func(x), x.shape)
+		live = ~done
+		left = np.sign(fx) == np.sign(fa)
+		# the same end replaced twice in a row: halve the other's value
+		fb = np.where(live & left & (side == 1), fb/2, fb)
+		fa = np.where(live & ~left & (side == -1), fa/2, fa)
+		a = np.where(live & left, x, a)
+		fa = np.where(live & left, fx, fa)
+		b = np.where(live & ~left, x, b)
+		fb = np.where(live & ~left, fx, fb)
+		side = np.where(live, np.where(left, 1, -1), side).astype(np.int8)
+		done |= (fx == 0) | (np.abs(b - a) <= xtol + rtol*np.abs(x))
+	return np.where(bad, np.nan, x)
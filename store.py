@@ -0,0 +1,247 @@
+#!/usr/bin/python3
+
+#
+# store.py
+#
+# out-of-core result store for trade studies bigger than RAM
+#
+# a store is a directory: meta.json describes the axes and variables, and
+# every variable is tiled by blocks, each a memory-mapped .npy file. the
+# sweep engine writes a block chunk by chunk and records its progress
+# after every chunk, so an interrupted study resumes where it stopped.
+# appending values along any axis adds one block per variable covering
+# the new slab; slicing a sub-cube that lies in one block is a zero-copy
+# view of the file
+#
+# usage:
+#	s = ResultStore.create('study', focal_length=..., f_number=..., ...)
+#	s.fill()			# resumable
+#	s.append('distance', np.arange(100, 1000, 10))
+#	coc = s.isel('coc', f_number=2, distance=slice(0, 500))
+#
+
+import json
+import os
+import numpy as np
+from numpy.lib.format import open_memmap
+import sweep
+
+META = 'meta.json'
+
+class ResultStore:
+	"""
+	chunked, memory-mapped sweep results in directory path
+	open with ResultStore(path) or ResultStore.create(path, ...)
+	"""
+
+	def __init__(self, path, mode = 'r+'):
+		self.path = path
+		self.mode = mode
+		with open(os.path.join(path, META)) as f:
+			self.meta = json.load(f)
+		self._maps = {}
+
+	@classmethod
+	def create(cls, path, focal_length, f_number, pixel_size, focus, distance,
+		accept_coc, res = 1944, feat_size = 0.1, variables = None,
+		chunk_size = sweep.CHUNK_SIZE):
+		"""
+		create an empty store over the sweep axes (see sweep.sweep); nothing
+		is computed until fill()
+		"""
+		axes = sweep.make_axes(focal_length, f_number, pixel_size, focus,
+			distance, accept_coc)
+		os.makedirs(path, exist_ok=True)
+		if os.path.exists(os.path.join(path, META)):
+			raise FileExistsError('store already exists: ' + path)
+		meta = dict(axes={a: v.tolist() for a, v in axes.items()},
+			res=res, feat_size=feat_size, chunk_size=chunk_size, variables={})
+		for name in variables or sweep.DEFAULT_VARIABLES:
+			dims = sweep.variable_dims(name, axes)
+			meta['variables'][name] = dict(dims=list(dims),
+				dtype=np.dtype(sweep.VARIABLES[name][2]).str, blocks=[])
+		store = cls._write_meta(path, meta)
+		for name in store.variables:
+			store._add_block(name, {a: 0 for a in store.dims(name)})
+		return store
+
+	@classmethod
+	def _write_meta(cls, path, meta):
+		tmp = os.path.join(path, META + '.tmp')
+		with open(tmp, 'w') as f:
+			json.dump(meta, f)
+		os.replace(tmp, os.path.join(path, META))
+		return cls(path)
+
+	def _save(self):
+		tmp = os.path.join(self.path, META + '.tmp')
+		with open(tmp, 'w') as f:
+			json.dump(self.meta, f)
+		os.replace(tmp, os.path.join(self.path, META))
+
+	# layout
+
+	@property
+	def variables(self):
+		return list(self.meta['variables'])
+
+	@property
+	def axes(self):
+		return {a: np.array(v) for a, v in self.meta['axes'].items()}
+
+	def dims(self, name):
+		return tuple(self.meta['variables'][name]['dims'])
+
+	def shape(self, name):
+		return tuple(len(self.meta['axes'][a]) for a in self.dims(name))
+
+	def blocks(self, name):
+		return self.meta['variables'][name]['blocks']
+
+	def complete(self):
+		"""return True once every block of every variable has been written"""
+		return all(b['complete'] for n in self.variables for b in self.blocks(n))
+
+	def _add_block(self, name, offset):
+		"""add a block from offset to the end of every axis of variable name"""
+		var = self.meta['variables'][name]
+		shape = [len(self.meta['axes'][a]) - offset[a] for a in var['dims']]
+		block = dict(file='{}.{}.npy'.format(name, len(var['blocks'])),
+			offset=offset, shape=shape, done=0, complete=False)
+		open_memmap(os.path.join(self.path, block['file']), mode='w+',
+			dtype=np.dtype(var['dtype']), shape=tuple(shape))
+		var['blocks'].append(block)
+		self._save()
+
+	def _map(self, block):
+		"""return the memmap of a block, opened once"""
+		if block['file'] not in self._maps:
+			self._maps[block['file']] = np.load(
+				os.path.join(self.path, block['file']), mmap_mode=self.mode)
+		return self._maps[block['file']]
+
+	# writing
+
+	def fill(self, progress = None):
+		"""
+		compute every block not yet complete, resuming partly written ones
+		progress: optional callable(name, block index, cells written so far)
+		"""
+		axes = self.axes
+		for name in self.variables:
+			for i, block in enumerate(self.blocks(name)):
+				if not block['complete']:
+					self._fill_block(name, i, block, axes, progress)
+
+	def _fill_block(self, name, i, block, axes, progress):
+		# the block only: axes grown by later appends have their own blocks
+		sub = dict(axes)
+		for a, size in zip(self.dims(name), block['shape']):
+			off = block['offset'][a]
+			sub[a] = axes[a][off:off + size]
+		flat = self._map(block).reshape(-1)
+		chunks = sweep.iter_chunks(sub, name, self.meta['res'],
+			self.meta['feat_size'], self.meta['chunk_size'], block['done'])
+		for start, stop, values in chunks:
+			flat[start:stop] = values
+			flat.flush()
+			block['done'] += 1
+			self._save()
+			if progress:
+				progress(name, i, stop)
+		block['complete'] = True
+		self._save()
+
+	def append(self, axis, values, fill = True):
+		"""
+		append values to axis, adding a block for the new slab of every
+		variable laid out over it; computed right away unless fill is False
+		"""
+		if axis not in self.meta['axes']:
+			raise KeyError('store has no axis ' + axis)
+		start = len(self.meta['axes'][axis])
+		self.meta['axes'][axis] += np.atleast_1d(
+			np.asarray(values, dtype=np.float64)).tolist()
+		for name in self.variables:
+			if axis in self.dims(name):
+				offset = {a: 0 for a in self.dims(name)}
+				offset[axis] = start
+				self._add_block(name, offset)
+		self._save()
+		if fill:
+			self.fill()
+
+	# reading
+
+	def _global_indices(self, name, indices):
+		"""return per dim arrays of global indices, and which dims are ints"""
+		idx, drop = [], []
+		for a, n in zip(self.dims(name), self.shape(name)):
+			key = indices.get(a, slice(None))
+			idx.append(np.atleast_1d(np.arange(n)[key]))
+			drop.append(not isinstance(key, slice) and np.ndim(key) == 0)
+		return idx, drop
+
+	def _view(self, name, indices):
+		"""return a zero-copy view if the request lies in one block, or None"""
+		for block in self.blocks(name):
+			key = []
+			for a, n, size in zip(self.dims(name), self.shape(name),
+				block['shape']):
+				off = block['offset'][a]
+				k = indices.get(a, slice(None))
+				if isinstance(k, slice):
+					start, stop, step = k.indices(n)
+					count = len(range(start, stop, step))
+					last = start + step*(count - 1)
+					if step < 0 or count == 0 or start < off or last >= off + size:
+						break
+					key.append(slice(start - off, last - off + 1, step))
+				elif np.ndim(k) == 0:
+					k = int(k) % n
+					if not off <= k < off + size:
+						break
+					key.append(k - off)
+				else:
+					break
+			else:
+				return self._map(block)[tuple(key)]
+		return None
+
+	def isel(self, name, **indices):
+		"""
+		return variable name indexed by axis position (ints, slices or index
+		arrays); a view of the file when the request lies in one block, an
+		assembled copy when it spans several
+		"""
+		view = self._view(name, indices)
+		if view is not None:
+			return view
+		idx, drop = self._global_indices(name, indices)
+		dtype = np.dtype(self.meta['variables'][name]['dtype'])
+		out = np.empty(tuple(i.size for i in idx), dtype=dtype)
+		for block in self.blocks(name):
+			dst, src = [], []
+			for a, g, size in zip(self.dims(name), idx, block['shape']):
+				off = block['offset'][a]
+				pos = np.nonzero((g >= off) & (g < off + size))[0]
+				dst.append(pos)
+				src.append(g[pos] - off)
+			if all(p.size for p in dst):
+				out[np.ix_(*dst)] = self._map(block)[np.ix_(*src)]
+		return out.reshape(tuple(i.size for i, d in zip(idx, drop) if not d))
+
+	def sel(self, name, **values):
+		"""return variable name at the axis values closest to those given"""
+		axes = self.axes
+		indices = {a: int(np.abs(axes[a] - v).argmin())
+			for a, v in values.items()}
+		return self.isel(name, **indices)
+
+	def result(self):
+		"""return the whole store as a sweep.SweepResult"""
+		data = {n: self.isel(n) for n in self.variables}
+		dims = {n: self.dims(n) for n in self.variables}
+		return sweep.SweepResult(self.axes, dims, data,
+			dict(res=self.meta['res'], feat_size=self.meta['feat_size']))
+
@@ -0,0 +1,441 @@
+#!/usr/bin/python3
+
+#
+# sweep.py
+#
+# design-space sweeps over the camera model: every combination of focal
+# length, f-number, pixel size, focus distance, target distance and
+# acceptable CoC, evaluated in memory-bounded chunks
+#
+
+import numpy as np
+import camera_model as cm
+import blur
+import instrument
+
+# axis order of every result tensor
+AXES = ('focal_length', 'f_number', 'pixel_size', 'focus', 'distance',
+	'accept_coc')
+UNITS = {
+	'focal_length': 'mm',
+	'f_number': '',
+	'pixel_size': 'um',
+	'focus': 'm',
+	'distance': 'm',
+	'accept_coc': 'pixels',
+	'coc': 'pixels',
+	'blur': 'pixels',
+	'hyperfocal': 'm',
+	'near': 'm',
+	'far': 'm',
+	'feature_pixels': 'pixels',
+	'in_focus': '',
+}
+
+# cells evaluated per chunk, bounds the size of the temporaries
+CHUNK_SIZE = 1 << 20
+
+# precision='compact': name -> (dtype computed in, storage). float32 where
+# the rounding is far below what the value is used for; the CoC cancels f
+# against s_s*(S - f)/S, losing about eps*f/(N*pixel size) pixels, so it is
+# computed in float32 only while twice that is within its tolerance. far
+# has a pole at focus == H and blur computes in float64 internally, so
+# both are only stored in float32; pixel counts and in-focus decisions are
+# computed in float64 so they come out exact, stored as the smallest
+# unsigned integer holding the largest count and as packed bits
+COMPACT = {
+	'coc': (np.float32, np.float32),
+	'blur': (np.float64, np.float32),
+	'hyperfocal': (np.float32, np.float32),
+	'near': (np.float32, np.float32),
+	'far': (np.float64, np.float32),
+	'feature_pixels': (np.float64, 'uint'),
+	'in_focus': (np.float64, 'bits'),
+}
+# (atol, rtol) a compact variable may differ from float64 by on the sample
+COMPACT_TOLERANCES = {
+	'coc': (1e-2, 1e-5),
+	'blur': (1e-3, 1e-5),
+	'hyperfocal': (0, 1e-5),
+	'near': (0, 1e-5),
+	'far': (0, 1e-5),
+	'feature_pixels': (0, 0),
+	'in_focus': (0, 0),
+}
+CHECK_SAMPLES = 4096
+PRECISIONS = ('float64', 'compact')
+
+class PrecisionError(ArithmeticError):
+	"""a compact sweep differs from the float64 reference beyond tolerance"""
+
+def _focus_mm(v):
+	"""focus distance in mm; focused at the hyperfocal distance if no axis"""
+	if 'focus' in v:
+		return np.multiply(v['focus'], cm.M_2_MM)
+	return _hyperfocal_mm(v)
+
+def _hyperfocal_mm(v):
+	c_mm = v['accept_coc']*v['pixel_size']/cm.MM_2_UM
+	return cm.hyperfocal_dist(v['focal_length'], v['f_number'], c_mm)
+
+def _coc(v, res, feat_size):
+	f = v['focal_length']
+	s_s = cm.dof2s_s(_focus_mm(v)/cm.M_2_MM, f)
+	return cm.get_circle_of_confusion_in_pix(v['distance'], v['f_number'], f,
+		s_s, v['pixel_size'])
+
+def _blur(v, res, feat_size):
+	# defocus, diffraction over the visible band and pixel aperture
+	f = v['focal_length']
+	s_s = cm.dof2s_s(_focus_mm(v)/cm.M_2_MM, f)
+	return blur.effective_blur_in_pix(v['distance'], v['f_number'], f, s_s,
+		v['pixel_size'], band=blur.VISIBLE)
+
+def _hyperfocal(v, res, feat_size):
+	return _hyperfocal_mm(v)/cm.M_2_MM
+
+def _near(v, res, feat_size):
+	near = cm.near_dist_acceptable(v['focal_length'], _focus_mm(v),
+		_hyperfocal_mm(v))
+	return near/cm.M_2_MM
+
+def _far(v, res, feat_size):
+	focus = _focus_mm(v)
+	H = _hyperfocal_mm(v)
+	far = cm.far_dist_acceptable(v['focal_length'], focus, H)
+	# focused at or beyond the hyperfocal distance: sharp out to infinity
+	return np.where(focus >= H, np.inf, far/cm.M_2_MM)
+
+def _feature_pixels(v, res, feat_size):
+	# the lens' own field of view if given (see sweep), else the sensor's
+	if 'fov' in v:
+		FoV = v['fov']
+	else:
+		FoV = cm.sensor_FoV(v['focal_length'], v['pixel_size'], res)
+	return cm.target_size_in_pix(v['distance'], FoV, res, feat_size)
+
+def _in_focus(v, res, feat_size):
+	return _coc(v, res, feat_size) <= v['accept_coc']
+
+# name: (axes the variable depends on, function, dtype)
+VARIABLES = {
+	'coc': (('focal_length', 'f_number', 'pixel_size', 'focus', 'distance'),
+		_coc, np.float64),
+	'blur': (('focal_length', 'f_number', 'pixel_size', 'focus', 'distance'),
+		_blur, np.float64),
+	'hyperfocal': (('focal_length', 'f_number', 'pixel_size', 'accept_coc'),
+		_hyperfocal, np.float64),
+	'near': (('focal_length', 'f_number', 'pixel_size', 'focus', 'accept_coc'),
+		_near, np.float64),
+	'far': (('focal_length', 'f_number', 'pixel_size', 'focus', 'accept_coc'),
+		_far, np.float64),
+	'feature_pixels': (('focal_length', 'pixel_size', 'distance'),
+		_feature_pixels, np.float64),
+	'in_focus': (AXES, _in_focus, np.bool_),
+}
+# computed when no variables are given; blur integrates over the band and
+# costs more than all the others together, so it is only computed by name
+DEFAULT_VARIABLES = tuple(n for n in VARIABLES if n != 'blur')
+
+def variable_dims(name, axes):
+	"""
+	return the axes a variable is laid out over for the given sweep axes;
+	without a focus axis the camera is focused at the hyperfocal distance,
+	which depends on the acceptable CoC instead
+	"""
+	dims = VARIABLES[name][0]
+	if 'focus' not in axes and 'focus' in dims:
+		dims = dims + ('accept_coc',)
+	return tuple(a for a in AXES if a in dims and a in axes)
+
+class SweepResult:
+	"""
+	labeled N-D sweep result
+	axes: dict of axis name -> 1-D array of axis values
+	dims: dict of variable name -> tuple of axis names it is laid out over
+	data: dict of variable name -> array with one dimension per entry in dims
+	"""
+	__slots__ = ('axes', 'dims', 'data', 'attrs')
+
+	def __init__(self, axes, dims, data, attrs = None):
+		self.axes = axes
+		self.dims = dims
+		self.data = data
+		self.attrs = attrs or {}
+
+	def __getitem__(self, name):
+		"""return the values of variable name, packed bits unpacked"""
+		shape = self.attrs.get('packed', {}).get(name)
+		if shape is None:
+			return self.data[name]
+		bits = np.unpackbits(self.data[name], count=int(np.prod(shape)))
+		return bits.reshape(shape).view(np.bool_)
+
+	def __contains__(self, name):
+		return name in self.data
+
+	def __repr__(self):
+		axes = ', '.join('{}: {}'.format(a, v.size) for a, v in self.axes.items())
+		return 'SweepResult({}; {})'.format(axes, ', '.join(self.data))
+
+	def index(self, axis, value):
+		"""return the index of the axis value closest to value"""
+		return int(np.abs(self.axes[axis] - value).argmin())
+
+	def isel(self, name, **indices):
+		"""return variable name indexed by axis position, e.g. f_number=2"""
+		key = tuple(indices.get(a, slice(None)) for a in self.dims[name])
+		shape = self.attrs.get('packed', {}).get(name)
+		if shape is None:
+			return self.data[name][key]
+		# only the selected bits are unpacked
+		idx = [np.arange(n)[k] for n, k in zip(shape, key)]
+		flat = np.ravel_multi_index(np.ix_(*(np.atleast_1d(i) for i in idx)),
+			shape)
+		keep = tuple(slice(None) if np.ndim(i) else 0 for i in idx)
+		return _bits_at(self.data[name], flat)[keep]
+
+	def sel(self, name, **values):
+		"""return variable name at the axis values closest to those given"""
+		indices = {a: self.index(a, v) for a, v in values.items()}
+		return self.isel(name, **indices)
+
+def make_axes(focal_length, f_number, pixel_size, focus, distance, accept_coc):
+	"""
+	return the dict of sweep axes, each a 1-D float array; scalars become
+	length one axes, focus None drops the axis (focused at hyperfocal)
+	"""
+	values = dict(focal_length=focal_length, f_number=f_number,
+		pixel_size=pixel_size, focus=focus, distance=distance,
+		accept_coc=accept_coc)
+	return {a: np.atleast_1d(np.asarray(values[a], dtype=np.float64))
+		for a in AXES if values[a] is not None}
+
+def _bits_at(packed, flat):
+	"""return the bools at flat indices of a C-order array packed by bits"""
+	flat = np.asarray(flat)
+	return (packed[flat >> 3] >> (7 - (flat & 7)).astype(np.uint8)) & 1 == 1
+
+def _write_bits(packed, start, values):
+	"""write bools into a flat bit-packed array from bit start"""
+	values = np.asarray(values, dtype=np.bool_)
+	stop = start + values.size
+	a = min(-(-start//8)*8, stop)		# whole bytes cover [a, b)
+	b = max(stop//8*8, a)
+	if b > a:
+		packed[a//8:b//8] = np.packbits(values[a - start:b - start])
+	# partial bytes at either end: read, modify, write
+	for lo, hi in ((start, a), (b, stop)):
+		if lo < hi:
+			byte = np.unpackbits(packed[lo//8:lo//8 + 1])
+			byte[lo % 8:lo % 8 + hi - lo] = values[lo - start:hi - start]
+			packed[lo//8] = np.packbits(byte)[0]
+
+def _uint_dtype(bound):
+	"""return the smallest unsigned integer dtype holding bound, or None"""
+	for dtype in (np.uint8, np.uint16, np.uint32):
+		if np.isfinite(bound) and bound <= np.iinfo(dtype).max:
+			return np.dtype(dtype)
+	return None
+
+def storage(name, axes, res = 1944, feat_size = 0.1, precision = 'float64',
+	fov = None):
+	"""
+	return (compute dtype, storage dtype, packed) of variable name, see
+	COMPACT; pixel counts fall back to float64 when no integer holds them
+	"""
+	if precision not in PRECISIONS:
+		raise ValueError('unknown precision: {}, expected one of {}'.format(
+			precision, ', '.join(PRECISIONS)))
+	if precision == 'float64':
+		return np.dtype(np.float64), np.dtype(VARIABLES[name][2]), False
+	compute, store = COMPACT[name]
+	if name == 'coc':
+		eps = np.finfo(np.float32).eps
+		loss = 2*eps*axes['focal_length'].max()*cm.MM_2_UM/(
+			axes['f_number'].min()*axes['pixel_size'].min())
+		if not loss <= COMPACT_TOLERANCES['coc'][0]:
+			compute = np.float64
+	if store == 'bits':
+		return np.dtype(compute), np.dtype(np.uint8), True
+	if store == 'uint':
+		# most pixels: nearest distance, narrowest FoV
+		FoV = fov if fov is not None else cm.sensor_FoV(
+			axes['focal_length'].max(), axes['pixel_size'].min(), res)
+		# over the whole axis as an array: a distance of 0 makes it inf
+		with np.errstate(divide='ignore', invalid='ignore'):
+			bound = np.max(cm.target_size_in_pix(axes['distance'], FoV, res,
+				feat_size))
+		store = _uint_dtype(bound) or np.float64
+	return np.dtype(compute), np.dtype(store), False
+
+def _layout(shape, chunk_size):
+	"""
+	return (k, n_rows, rows): the trailing axes shape[k:] that fit in one
+	chunk are broadcast whole, the leading ones (n_rows cells) are gathered
+	rows at a time
+	"""
+	k = len(shape)
+	while k > 0 and np.prod(shape[k-1:]) <= chunk_size:
+		k -= 1
+	n_inner = int(np.prod(shape[k:]))
+	return k, int(np.prod(shape[:k])), max(1, chunk_size // n_inner)
+
+def chunk_bounds(axes, name, chunk_size = CHUNK_SIZE):
+	"""
+	return the (start, stop) flat cell range of every chunk iter_chunks
+	yields for variable name, without evaluating anything
+	"""
+	shape = tuple(axes[a].size for a in variable_dims(name, axes))
+	k, n_rows, rows = _layout(shape, chunk_size)
+	n_inner = int(np.prod(shape[k:]))
+	return [(r0*n_inner, min(r0 + rows, n_rows)*n_inner)
+		for r0 in range(0, n_rows, rows)]
+
+def iter_chunks(axes, name, res = 1944, feat_size = 0.1,
+	chunk_size = CHUNK_SIZE, first_chunk = 0, dtype = np.float64, fov = None):
+	"""
+	yield (start, stop, values) over the flattened grid of variable name,
+	evaluating at most chunk_size cells at a time, in order
+	first_chunk: number of leading chunks to skip without evaluating them,
+	to resume an interrupted write with the same chunk_size
+	dtype: floating point type the axis values enter the model in
+	fov: fixed field of view in degrees, see sweep
+	"""
+	dims = variable_dims(name, axes)
+	func = VARIABLES[name][1]
+	shape = tuple(axes[a].size for a in dims)
+	k, n_rows, rows = _layout(shape, chunk_size)
+	inner = shape[k:]
+	n_inner = int(np.prod(inner))
+	for r0 in range(first_chunk*rows, n_rows, rows):
+		r1 = min(r0 + rows, n_rows)
+		idx = np.unravel_index(np.arange(r0, r1), shape[:k]) if k else ()
+		v = {} if fov is None else dict(fov=fov)
+		for j, a in enumerate(dims):
+			if j < k:
+				v[a] = axes[a][idx[j]].astype(dtype, copy=False).reshape(
+					(-1,) + (1,)*len(inner))
+			else:
+				before, after = 1+j-k, len(dims)-j-1
+				v[a] = axes[a].astype(dtype, copy=False).reshape(
+					(1,)*before + (-1,) + (1,)*after)
+		values = np.broadcast_to(func(v, res, feat_size), (r1-r0,) + inner)
+		yield r0*n_inner, r1*n_inner, values.reshape(-1)
+
+def check_precision(result, n = CHECK_SAMPLES, seed = 0):
+	"""
+	return {variable: dict(max_abs, max_rel, ok)}: the stored values of n
+	random cells of every variable against float64 evaluations of the same
+	cells, within COMPACT_TOLERANCES
+	"""
+	rng = np.random.default_rng(seed)
+	res, feat_size = result.attrs['res'], result.attrs['feat_size']
+	report = {}
+	for name, dims in result.dims.items():
+		shape = tuple(result.axes[a].size for a in dims)
+		flat = rng.integers(0, int(np.prod(shape)), min(n, int(np.prod(shape))))
+		idx = np.unravel_index(flat, shape)
+		v = {a: result.axes[a][i] for a, i in zip(dims, idx)}
+		if 'fov' in result.attrs:
+			v['fov'] = result.attrs['fov']
+		ref = np.broadcast_to(VARIABLES[name][1](v, res, feat_size),
+			flat.shape).astype(np.float64)
+		if name in result.attrs.get('packed', {}):
+			got = _bits_at(result.data[name], flat).astype(np.float64)
+		else:
+			got = np.asarray(result.data[name]).reshape(-1)[flat].astype(
+				np.float64)
+		report[name] = precision_error(name, got, ref)
+	return report
+
+def require_precision(check):
+	"""return a check_precision report, raise PrecisionError if not ok"""
+	bad = [n for n, c in check.items() if not c['ok']]
+	if bad:
+		raise PrecisionError('compact sweep off the float64 reference: ' +
+			', '.join('{} (max abs {:.3g}, rel {:.3g})'.format(n,
+			check[n]['max_abs'], check[n]['max_rel']) for n in bad))
+	return check
+
+def precision_error(name, got, ref):
+	"""
+	return dict(max_abs, max_rel, ok) of compact values got of variable name
+	against float64 values ref, ok within COMPACT_TOLERANCES
+	"""
+	got = np.asarray(got, dtype=np.float64)
+	ref = np.asarray(ref, dtype=np.float64)
+	same = (got == ref) | (np.isnan(got) & np.isnan(ref))
+	with np.errstate(invalid='ignore'):
+		err = np.where(same, 0., np.abs(got - ref))
+	with np.errstate(divide='ignore', invalid='ignore'):
+		rel = np.where(same | (ref == 0), 0., err/np.abs(ref))
+	atol, rtol = COMPACT_TOLERANCES[name]
+	ok = bool(np.all(same | (err <= atol + rtol*np.abs(ref))))
+	return dict(max_abs=float(err.max(initial=0)),
+		max_rel=float(rel.max(initial=0)), ok=ok)
+
+def sweep(focal_length, f_number, pixel_size, focus, distance, accept_coc,
+	res = 1944, feat_size = 0.1, variables = None, chunk_size = CHUNK_SIZE,
+	out = None, precision = 'float64', check = True, fov = None):
+	"""
+	return a SweepResult over every combination of the axes
+	focal_length: in mm
+	f_number: f-number
+	pixel_size: in um
+	focus: focus distance in m, None to focus at the hyperfocal distance
+	distance: target distance in m
+	accept_coc: acceptable CoC in pixels
+	res: sensor resolution in pixels (one dimension), sets the FoV
+	feat_size: size of target feature in m, for feature_pixels
+	variables: names from VARIABLES to compute, default DEFAULT_VARIABLES
+	out: optional dict of name -> C-contiguous array to write results into
+	(e.g. np.memmap), so the result never has to fit in RAM; for packed
+	variables a flat uint8 array of one bit per cell
+	precision: 'float64', or 'compact' for the reduced storage of COMPACT
+	(result.attrs['storage'] lists what each variable got)
+	check: for 'compact', compare a sample against float64 (see
+	check_precision, stored in result.attrs['check']) and raise
+	PrecisionError beyond tolerance
+	fov: field of view in degrees over res of a lens that does not fill the
+	sensor as its focal length says, for every cell; None derives it from
+	focal length and pixel size (stored in result.attrs['fov'] if given)
+	"""
+	axes = make_axes(focal_length, f_number, pixel_size, focus, distance,
+		accept_coc)
+	variables = variables or list(DEFAULT_VARIABLES)
+	out = dict(out or {})
+	dims, packed, stored = {}, {}, {}
+	for name in variables:
+		dims[name] = variable_dims(name, axes)
+		shape = tuple(axes[a].size for a in dims[name])
+		compute, dtype, bits = storage(name, axes, res, feat_size, precision,
+			fov)
+		stored[name] = 'bits' if bits else dtype.name
+		if bits:
+			packed[name] = shape
+			shape = (-(-int(np.prod(shape))//8),)
+		if name not in out:
+			out[name] = np.empty(shape, dtype=dtype)
+		elif out[name].shape != shape:
+			raise ValueError("out['{}'] has shape {}, expected {}".format(
+				name, out[name].shape, shape))
+		elif not out[name].flags.c_contiguous:
+			raise ValueError("out['{}'] must be C-contiguous".format(name))
+		flat = out[name].reshape(-1)
+		with instrument.stage('sweep.' + name, flat.size):
+			for start, stop, values in iter_chunks(axes, name, res, feat_size,
+				chunk_size, dtype=compute, fov=fov):
+				if bits:
+					_write_bits(flat, start, values)
+				else:
+					flat[start:stop] = values
+	attrs = dict(res=res, feat_size=feat_size)
+	if fov is not None:
+		attrs['fov'] = fov
+	if precision != 'float64':
+		attrs.update(precision=precision, storage=stored, packed=packed)
+	result = SweepResult(axes, dims, {n: out[n] for n in variables}, attrs)
+	if precision != 'float64' and check:
+		attrs['check'] = require_precision(check_precision(result))
+	return result
@@ -1,11 +1,12 @@
 #!/usr/bin/python3
 
+import sys
 import numpy as np 
 import matplotlib.pyplot as plt
 from matplotlib.ticker import FormatStrFormatter
 from math import fabs, ceil, floor, tan, radians, degrees
-import sys # for maxsize
 import camera_model as cm
+import plotting
 
 
 #=================================== MAIN =====================================#
@@ -51,10 +52,10 @@ def final_test():#res = 1944, focal_length = 16, f_number = 2.2, pixel_size = 2.
 	cover = 0.90
 
 	print("Hyperfocal distance is: ", str(hyperfocal), " mm")
-	if (far_d == sys.maxsize):
+	if (np.isinf(far_d)):
 		far_str = "infinity"
 	else:
-		far_str = "{:d} m".format(far_d/cm.M_2_MM)
+		far_str = "{} m".format(far_d/cm.M_2_MM)
 	print("Depth of field spans: [{} m, {}]".format((ceil(near_d)/cm.M_2_MM),
 		far_str))
 	print("target size in pixels from 30 cm away: ", min_feat_pix)
@@ -72,15 +73,11 @@ def final_test():#res = 1944, focal_length = 16, f_number = 2.2, pixel_size = 2.
 
 	if pixel_flag:
 		# pixel way
-		vget_circle_of_confusion_in_pix =  np.vectorize(cm.get_circle_of_confusion_in_pix, 
-			excluded = ['N', 'f', 's_s', 'pixel_size'])
-		coc_pix = vget_circle_of_confusion_in_pix(dist, f_number, focal_length, 
+		coc_pix = cm.get_circle_of_confusion_in_pix(dist, f_number, focal_length, 
 			cm.dof2s_s(dof,focal_length), pixel_size)
 	else:
 		# mm way
-		vget_circle_of_confusion =  np.vectorize(cm.get_circle_of_confusion, 
-			excluded = ['N', 'f', 's_s'])
-		coc = vget_circle_of_confusion(dist, f_number, focal_length, 
+		coc = cm.get_circle_of_confusion(dist, f_number, focal_length, 
 			cm.dof2s_s(dof,focal_length))
 		# valid_idx = np.where(coc <= acceptCoC_mm)[0]
 		# point_idx = valid_idx[coc[valid_idx].argmax()]
@@ -88,36 +85,12 @@ def final_test():#res = 1944, focal_length = 16, f_number = 2.2, pixel_size = 2.
 
 
 	# Create plots with pre-defined labels.
-	fig, ax = plt.subplots()
 	if pixel_flag:
-		ax.plot(dist, coc_pix, 'k', label='CoC diameter [pixels]')
-		ax.hlines(acceptCoC, -0.5, dist[dist.size-1], colors='r', 
-			linestyles='dashdot', label='Acceptable CoC [pixels]')
-		plt.ylabel('CoC diameter [pixels]')
+		plotting.coc_figure(dist, [coc_pix], None, acceptCoC,
+			near_d/cm.M_2_MM, pixel_flag, 'Circle of confusion', ['k'])
 	else:
-		ax.plot(dist, coc, 'k--', label='CoC diameter [mm]')
-		ax.hlines(acceptCoC_mm, -0.5, dist[dist.size-1], colors='r', 
-			linestyles='dashdot', label='Acceptable CoC [mm]')
-		plt.ylabel('CoC diameter [mm]')
-
-
-	plt.annotate(['Near distance: ', str(ceil(near_d)/cm.M_2_CM),'cm'],
-	         xy=(near_d, acceptCoC), 
-	         xycoords='data',
-	         xytext=(+0, +0), 
-	         textcoords='offset points', 
-	         fontsize=10,
-	         arrowprops=dict(facecolor='blue'))
-	ax.set_ylim([-1,15])
-	# plt.xscale('log')
-	plt.title('Circle of confusion')
-	plt.grid(b=True, which='major', color='k', linestyle='-')
-	plt.grid(b=True, which='minor', color='grey', linestyle='--')
-	legend = ax.legend(loc='best', shadow=True)
-	plt.xlabel('Distance [m]')
-	plt.tick_params(axis='x', which='minor')
-	# ax.xaxis.set_minor_formatter(FormatStrFormatter('%.1f'))
-
+		plotting.coc_figure(dist, [coc], None, acceptCoC_mm,
+			near_d/cm.M_2_MM, pixel_flag, 'Circle of confusion', ['k--'])
 	plt.show()
 	pass 
 
@@ -137,7 +110,7 @@ def FoV_test():
 	FoV_list = [44, 31, 24, 17, 12]
 
 	for FoV in FoV_list:
-		min_dist = cm.min_target_dist(FoV, res, min_feat_size)
+		min_dist = cm.min_target_dist(FoV, min_feat_size)
 		max_dist = cm.max_target_dist(FoV, res, n_pixels, max_feat_size)
 
 		print(('{}deg: min distance [m]: {}; max distance [m]: {}').format(
@@ -162,12 +135,6 @@ def f_number_test():
 	acceptCoC = 4 #8		# pixels
 	acceptCoC_mm = acceptCoC*pixel_size/cm.MM_2_UM # to mm
 	
-	vget_circle_of_confusion_in_pix =  np.vectorize(
-		cm.get_circle_of_confusion_in_pix, 
-		excluded = ['N', 'f', 's_s', 'pixel_size'])
-	vget_circle_of_confusion =  np.vectorize(cm.get_circle_of_confusion, 
-		excluded = ['N', 'f', 's_s'])
-	
 
 	f_number = [1, 1.2, 1.4, 1.8, 2, 2.2, 2.8, 4, 5.6]
 	coc_pix = []
@@ -182,7 +149,7 @@ def f_number_test():
 
 		print("{:d}: f/{:.1f}".format(i, f_number[i]))
 		print("Hyperfocal distance is: ", hyperfocal.__str__(), " mm")
-		if (far_d == sys.maxsize):
+		if (np.isinf(far_d)):
 			far_str = "infinity"
 		else:
 			far_str = [(far_d/cm.M_2_MM).__str__(), " m" ]
@@ -192,56 +159,25 @@ def f_number_test():
 
 		if pixel_flag:
 			# pixel way
-			arr = vget_circle_of_confusion_in_pix(dist, f_number[i], focal_length, 
+			arr = cm.get_circle_of_confusion_in_pix(dist, f_number[i], focal_length, 
 				cm.dof2s_s(dof,focal_length), pixel_size)
 			coc_pix.append(arr)
 		else:
 			# mm way
-			arr = vget_circle_of_confusion(dist, f_number[i], focal_length, 
+			arr = cm.get_circle_of_confusion(dist, f_number[i], focal_length, 
 				cm.dof2s_s(dof,focal_length))
 			coc.append(arr)
 
 
 		pass
 	# Create plots with pre-defined labels.
-	fig, ax = plt.subplots()
-	colors = ['r', 'k', 'b', 'c', 'm', 'g', '#D2691E', 'y', '#556b2f']
-
-	if pixel_flag:
-		for i in range(0, len(f_number)):
-			ax.plot(dist, coc_pix[i], colors[i], 
-				label=('f/{:.1f}').format(f_number[i]))
-	else:
-		for i in range(0, len(f_number)):
-			ax.plot(dist, coc[i], colors[i], 
-				label=('f/{:.1f}').format(f_number[i]))
-
+	labels = [('f/{:.1f}').format(N) for N in f_number]
 	if pixel_flag:
-		ax.hlines(acceptCoC, -0.5, dist[dist.size-1], colors='r', 
-			linestyles='dashdot', label='Acceptable CoC [pixels]')
-		plt.ylabel('CoC diameter [pixels]')
+		plotting.coc_figure(dist, coc_pix, labels, acceptCoC,
+			near_d/cm.M_2_MM, pixel_flag, 'Circle of confusion, [variable N]')
 	else:
-		ax.hlines(acceptCoC_mm, -0.5, dist[dist.size-1], colors='r', 
-			linestyles='dashdot', label='Acceptable CoC [mm]')
-		plt.ylabel('CoC diameter [mm]')
-	
-	plt.annotate(['Near distance: ', str(ceil(near_d)/cm.M_2_CM),'cm'],
-	         xy=(near_d, acceptCoC), 
-	         xycoords='data',
-	         xytext=(+0, +0), 
-	         textcoords='offset points', 
-	         fontsize=10,
-	         arrowprops=dict(facecolor='blue'))
-	ax.set_ylim([-1,15])
-	# plt.xscale('log')
-	plt.title('Circle of confusion, [variable N]')
-	plt.grid(b=True, which='major', color='k', linestyle='-')
-	plt.grid(b=True, which='minor', color='grey', linestyle='--')
-	legend = ax.legend(loc='best', shadow=True)
-	plt.xlabel('Distance [m]')
-	plt.tick_params(axis='x', which='minor')
-	# ax.xaxis.set_minor_formatter(FormatStrFormatter('%.1f'))
-
+		plotting.coc_figure(dist, coc, labels, acceptCoC_mm,
+			near_d/cm.M_2_MM, pixel_flag, 'Circle of confusion, [variable N]')
 	plt.show()
 	pass 
 
@@ -261,12 +197,6 @@ def focal_test():
 	acceptCoC = 4 #8		# pixels
 	acceptCoC_mm = acceptCoC*pixel_size/cm.MM_2_UM # to mm
 	
-	vget_circle_of_confusion_in_pix =  np.vectorize(
-		cm.get_circle_of_confusion_in_pix, 
-		excluded = ['N', 'f', 's_s', 'pixel_size'])
-	vget_circle_of_confusion =  np.vectorize(cm.get_circle_of_confusion, 
-		excluded = ['N', 'f', 's_s'])
-	
 
 	f_number = 4.6
 	focal_length = [8, 12, 16, 20, 24, 28, 36, 40, 50] #12	# mm
@@ -282,7 +212,7 @@ def focal_test():
 		
 		print("{:d}: {:d}mm".format(i, focal_length[i]))
 		print("Hyperfocal distance is: ", hyperfocal.__str__(), " mm")
-		if (far_d == sys.maxsize):
+		if (np.isinf(far_d)):
 			far_str = "infinity"
 		else:
 			far_str = [(far_d/cm.M_2_MM).__str__(), " m" ]
@@ -292,56 +222,25 @@ def focal_test():
 
 		if pixel_flag:
 			# pixel way
-			arr = vget_circle_of_confusion_in_pix(dist, f_number, focal_length[i], 
+			arr = cm.get_circle_of_confusion_in_pix(dist, f_number, focal_length[i], 
 				cm.dof2s_s(dof,focal_length[i]), pixel_size)
 			coc_pix.append(arr)
 		else:
 			# mm way
-			arr = vget_circle_of_confusion(dist, f_number, focal_length[i], 
+			arr = cm.get_circle_of_confusion(dist, f_number, focal_length[i], 
 				cm.dof2s_s(dof,focal_length[i]))
 			coc.append(arr)
 
 
 		pass
 	# Create plots with pre-defined labels.
-	fig, ax = plt.subplots()
-	colors = ['r', 'k', 'b', 'c', 'm', 'g', '#D2691E', 'y', '#556b2f']
-
+	labels = [('f/{:.1f}, {:d}mm').format(f_number, f) for f in focal_length]
 	if pixel_flag:
-		for i in range(0, len(focal_length)):
-			ax.plot(dist, coc_pix[i], colors[i], 
-				label=('f/{:.1f}, {:d}mm').format(f_number, focal_length[i]))
+		plotting.coc_figure(dist, coc_pix, labels, acceptCoC,
+			near_d/cm.M_2_MM, pixel_flag, 'Circle of confusion, [variable f]')
 	else:
-		for i in range(0, len(focal_length)):
-			ax.plot(dist, coc[i], colors[i], 
-				label=('f/{:.1f}, {:d}mm').format(f_number, focal_length[i]))
-
-	if pixel_flag:
-		ax.hlines(acceptCoC, -0.5, dist[dist.size-1], colors='r', 
-			linestyles='dashdot', label='Acceptable CoC [pixels]')
-		plt.ylabel('CoC diameter [pixels]')
-	else:
-		ax.hlines(acceptCoC_mm, -0.5, dist[dist.size-1], colors='r', 
-			linestyles='dashdot', label='Acceptable CoC [mm]')
-		plt.ylabel('CoC diameter [mm]')
-	
-	plt.annotate(['Near distance: ', str(ceil(near_d)/cm.M_2_CM),'cm'],
-	         xy=(near_d, acceptCoC), 
-	         xycoords='data',
-	         xytext=(+0, +0), 
-	         textcoords='offset points', 
-	         fontsize=10,
-	         arrowprops=dict(facecolor='blue'))
-	ax.set_ylim([-1,15])
-	# plt.xscale('log')
-	plt.title('Circle of confusion, [variable f]')
-	plt.grid(b=True, which='major', color='k', linestyle='-')
-	plt.grid(b=True, which='minor', color='grey', linestyle='--')
-	legend = ax.legend(loc='best', shadow=True)
-	plt.xlabel('Distance [m]')
-	plt.tick_params(axis='x', which='minor')
-	# ax.xaxis.set_minor_formatter(FormatStrFormatter('%.1f'))
-
+		plotting.coc_figure(dist, coc, labels, acceptCoC_mm,
+			near_d/cm.M_2_MM, pixel_flag, 'Circle of confusion, [variable f]')
 	plt.show()
 	pass 
 
@@ -361,12 +260,6 @@ def focal_and_f_test():
 	acceptCoC = 4 #8		# pixels
 	acceptCoC_mm = acceptCoC*pixel_size/cm.MM_2_UM # to mm
 	
-	vget_circle_of_confusion_in_pix =  np.vectorize(
-		cm.get_circle_of_confusion_in_pix, 
-		excluded = ['N', 'f', 's_s', 'pixel_size'])
-	vget_circle_of_confusion =  np.vectorize(cm.get_circle_of_confusion, 
-		excluded = ['N', 'f', 's_s'])
-	
 
 	f_number = [1, 1.2, 1.4, 1.8, 2, 2.2, 2.8, 4, 5.6]
 	focal_length = [8, 12, 16, 20, 24, 28, 36, 40, 50] #12	# mm
@@ -381,7 +274,7 @@ def focal_and_f_test():
 		far_d = cm.far_dist_acceptable(focal_length[i], (dof*cm.M_2_MM), hyperfocal)
 
 		print("Hyperfocal distance is: ", hyperfocal.__str__(), " mm")
-		if (far_d == sys.maxsize):
+		if (np.isinf(far_d)):
 			far_str = "infinity"
 		else:
 			far_str = [(far_d/cm.M_2_MM).__str__(), " m" ]
@@ -391,60 +284,34 @@ def focal_and_f_test():
 
 		if pixel_flag:
 			# pixel way
-			arr = vget_circle_of_confusion_in_pix(dist, f_number[i], focal_length[i], 
+			arr = cm.get_circle_of_confusion_in_pix(dist, f_number[i], focal_length[i], 
 				cm.dof2s_s(dof,focal_length[i]), pixel_size)
 			coc_pix.append(arr)
 		else:
 			# mm way
-			arr = vget_circle_of_confusion(dist, f_number[i], focal_length[i], 
+			arr = cm.get_circle_of_confusion(dist, f_number[i], focal_length[i], 
 				cm.dof2s_s(dof,focal_length[i]))
 			coc.append(arr)
 
 
 		pass
 	# Create plots with pre-defined labels.
-	fig, ax = plt.subplots()
-	colors = ['r', 'k', 'b', 'c', 'm', 'g', '#D2691E', 'y', '#556b2f']
-
+	labels = [('f/{:.1f}, {:d}mm').format(N, f)
+		for N, f in zip(f_number, focal_length)]
 	if pixel_flag:
-		for i in range(0, len(f_number)):
-			ax.plot(dist, coc_pix[i], colors[i], 
-				label=('f/{:.1f}, {:d}mm').format(f_number[i], focal_length[i]))
+		plotting.coc_figure(dist, coc_pix, labels, acceptCoC,
+			near_d/cm.M_2_MM, pixel_flag, 'Circle of confusion, [variable N, f]')
 	else:
-		for i in range(0, len(f_number)):
-			ax.plot(dist, coc[i], colors[i], 
-				label=('f/{:.1f}, {:d}mm').format(f_number[i], focal_length[i]))
-
-	if pixel_flag:
-		ax.hlines(acceptCoC, -0.5, dist[dist.size-1], colors='r', 
-			linestyles='dashdot', label='Acceptable CoC [pixels]')
-		plt.ylabel('CoC diameter [pixels]')
-	else:
-		ax.hlines(acceptCoC_mm, -0.5, dist[dist.size-1], colors='r', 
-			linestyles='dashdot', label='Acceptable CoC [mm]')
-		plt.ylabel('CoC diameter [mm]')
-	
-	plt.annotate(['Near distance: ', str(ceil(near_d)/cm.M_2_CM),'cm'],
-	         xy=(near_d, acceptCoC), 
-	         xycoords='data',
-	         xytext=(+0, +0), 
-	         textcoords='offset points', 
-	         fontsize=10,
-	         arrowprops=dict(facecolor='blue'))
-	ax.set_ylim([-1,15])
-	# plt.xscale('log')
-	plt.title('Circle of confusion, [variable N, f]')
-	plt.grid(b=True, which='major', color='k', linestyle='-')
-	plt.grid(b=True, which='minor', color='grey', linestyle='--')
-	legend = ax.legend(loc='best', shadow=True)
-	plt.xlabel('Distance [m]')
-	plt.tick_params(axis='x', which='minor')
-	# ax.xaxis.set_minor_formatter(FormatStrFormatter('%.1f'))
-
+		plotting.coc_figure(dist, coc, labels, acceptCoC_mm,
+			near_d/cm.M_2_MM, pixel_flag, 'Circle of confusion, [variable N, f]')
 	plt.show()
 	pass 
 
-final_test()
-# FoV_test()
-# f_number_test()
-# focal_and_f_test()
\ No newline at end of file
+# analyses by name, e.g. python test.py FoV f_number (default final); batch
+# runs over many cameras go through scenario.py instead
+TESTS = {'final': final_test, 'FoV': FoV_test, 'f_number': f_number_test,
+	'focal': focal_test, 'focal_and_f': focal_and_f_test}
+
+if __name__ == '__main__':
+	for name in sys.argv[1:] or ['final']:
+		TESTS[name]()
\ No newline at end of file
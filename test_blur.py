@@ -0,0 +1,69 @@
+#!/usr/bin/python3
+
+#
+# test_blur.py
+#
+# the combined blur reduces to the CoC, its variances add, bands integrate
+# like single wavelengths, and the MTFs behave (python -m pytest)
+#
+
+import numpy as np
+import camera_model as cm
+import blur
+
+F, N, PIXEL = 16, 2.2, 2.2
+S_S = cm.dof2s_s(5, F)
+DIST = np.geomspace(0.5, 100, 50)
+
+def test_defocus_only_is_the_coc():
+	b = blur.effective_blur_in_pix(DIST, N, F, S_S, PIXEL, diffraction=False,
+		pixel=False)
+	assert np.allclose(b, cm.get_circle_of_confusion_in_pix(DIST, N, F, S_S,
+		PIXEL), rtol=1e-12)
+
+def test_variances_add():
+	b = blur.effective_blur(DIST, N, F, S_S, PIXEL, wavelength=600)
+	coc = cm.get_circle_of_confusion(DIST, N, F, S_S)
+	sigma = blur.AIRY_SIGMA*600*blur.NM_2_MM*N
+	p = PIXEL/cm.MM_2_UM
+	assert np.allclose(b, 4*np.sqrt(coc**2/16 + sigma**2 + p**2/12),
+		rtol=1e-12)
+	assert np.all(b > coc)
+
+def test_band():
+	one = blur.effective_blur(DIST, N, F, S_S, PIXEL, wavelength=500)
+	band = blur.effective_blur(DIST, N, F, S_S, PIXEL, band=([500.], [3.]))
+	assert np.allclose(one, band, rtol=1e-12)
+	visible = blur.effective_blur(DIST, N, F, S_S, PIXEL, band=blur.VISIBLE)
+	lo = blur.effective_blur(DIST, N, F, S_S, PIXEL, wavelength=450)
+	hi = blur.effective_blur(DIST, N, F, S_S, PIXEL, wavelength=650)
+	assert np.all((lo < visible) & (visible < hi))
+	m = blur.mtf(0.3, DIST, N, F, S_S, PIXEL, band=([500.], [1.]))
+	assert np.allclose(m, blur.mtf(0.3, DIST, N, F, S_S, PIXEL, 500),
+		rtol=1e-12)
+
+def test_broadcast_matches_scalars():
+	Ns = np.array([1.4, 2.8, 5.6])[:, None]
+	b = blur.effective_blur_in_pix(DIST, Ns, F, S_S, PIXEL, band=blur.VISIBLE)
+	assert b.shape == (3, DIST.size)
+	for i, n in enumerate(Ns[:, 0]):
+		for j in (0, 17, 49):
+			assert np.isclose(b[i, j], blur.effective_blur_in_pix(float(DIST[j]),
+				float(n), F, S_S, PIXEL, band=blur.VISIBLE), rtol=1e-12)
+
+def test_j1():
+	x = np.linspace(0, 20, 401)
+	tau = np.linspace(0, np.pi, 20001)
+	# J1(x) = 1/pi integral_0^pi cos(tau - x sin tau) dtau
+	ref = np.trapezoid(np.cos(tau - x[:, None]*np.sin(tau)), tau, axis=1)/np.pi
+	assert np.abs(blur._j1(x) - ref).max() < 1e-7
+
+def test_mtf():
+	assert np.allclose(blur.mtf(0, DIST, N, F, S_S, PIXEL), 1)
+	nu = blur.mtf50(DIST, N, F, S_S, PIXEL)
+	ok = ~np.isnan(nu)
+	assert ok.any()
+	assert np.allclose(blur.mtf(nu[ok], DIST[ok], N, F, S_S, PIXEL), 0.5,
+		atol=1e-8)
+	# sharpest at the focus distance
+	assert np.nanargmax(nu) == np.abs(DIST - 5).argmin()
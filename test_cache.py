@@ -0,0 +1,99 @@
+#!/usr/bin/python3
+
+#
+# test_cache.py
+#
+# cache hits are read-only and consistent between the tiers, keys are
+# canonical and follow the decorated function's source, a failed write
+# leaves nothing behind (python -m pytest)
+#
+
+import importlib.util
+import os
+import numpy as np
+import pytest
+import cache
+import sweep
+
+def _counted(c):
+	calls = []
+
+	@c
+	def g(n, scale = 2):
+		calls.append(n)
+		return np.arange(n)*scale
+	return g, calls
+
+def test_hit_is_read_only(tmp_path):
+	g, calls = _counted(cache.Cache(str(tmp_path)))
+	a = g(3)
+	with pytest.raises(ValueError):
+		a[0] = 99
+	assert g(3).tolist() == [0, 2, 4]
+	assert len(calls) == 1
+
+def test_memory_and_disk_hits_agree(tmp_path):
+	g, _ = _counted(cache.Cache(str(tmp_path)))
+	memory = g(3)
+	h, calls = _counted(cache.Cache(str(tmp_path)))		# same name, empty memory
+	disk = h(3)
+	assert not calls
+	assert isinstance(disk, np.memmap)
+	assert not memory.flags.writeable and not disk.flags.writeable
+	assert np.array_equal(memory, disk)
+
+def test_default_arguments_share_a_key(tmp_path):
+	g, calls = _counted(cache.Cache(str(tmp_path)))
+	g(3)
+	g(3, scale=2)
+	g(n=3)
+	assert len(calls) == 1
+	g(3, 3)
+	assert len(calls) == 2
+
+def test_numpy_bool_and_number_keys():
+	assert cache.cache_key('f', np.True_) == cache.cache_key('f', True)
+	assert cache.cache_key('f', np.float32(2)) == cache.cache_key('f', 2)
+	assert cache.cache_key('f', True) != cache.cache_key('f', 1)
+
+def test_cached_sweep_read_only(tmp_path):
+	c = cache.Cache(str(tmp_path))
+	run = c(sweep.sweep)
+	r = run(16, [2, 2.8], 2.2, None, [1., 10.], 4, variables=['coc'])
+	assert not r.data['coc'].flags.writeable
+	again = cache.Cache(str(tmp_path))(sweep.sweep)(16, [2, 2.8], 2.2, None,
+		[1., 10.], 4, variables=['coc'])
+	assert np.array_equal(r['coc'], again['coc'])
+
+def _module(path, source):
+	path.write_text(source)
+	spec = importlib.util.spec_from_file_location('report_mod', str(path))
+	module = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(module)
+	return module
+
+def test_key_follows_the_source_of_the_function(tmp_path):
+	c = cache.Cache(None)
+	body = 'calls = []\ndef f(n):\n\tcalls.append(n)\n\treturn n*{}\n'
+	(tmp_path/'a').mkdir()
+	(tmp_path/'b').mkdir()
+	(tmp_path/'c').mkdir()
+	a = _module(tmp_path/'a'/'m.py', body.format(2))
+	b = _module(tmp_path/'b'/'m.py', body.format(3))		# edited
+	same = _module(tmp_path/'c'/'m.py', body.format(2))
+	assert c(a.f)(5) == 10
+	assert c(b.f)(5) == 15 and b.calls == [5]
+	assert c(same.f)(5) == 10 and not same.calls
+
+def test_failed_store_leaves_no_temporary(tmp_path, monkeypatch):
+	def full(*args, **kwargs):
+		raise OSError('no space left on device')
+
+	c = cache.Cache(str(tmp_path))
+	monkeypatch.setattr(np, 'save', full)
+	with pytest.raises(OSError):
+		c.put('k', np.arange(3.))
+	assert os.listdir(str(tmp_path)) == []
+	monkeypatch.undo()
+	c.put('k', np.arange(3.))
+	assert cache.Cache(str(tmp_path)).get('k').tolist() == [0, 1, 2]
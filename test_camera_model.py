@@ -0,0 +1,85 @@
+#!/usr/bin/python3
+
+#
+# test_camera_model.py
+#
+# scalar calls reproduce the original math based model bit for bit, and
+# arrays broadcast to the same values (python -m pytest)
+#
+
+from math import fabs, ceil, tan, atan, radians, degrees
+import numpy as np
+import camera_model as cm
+
+# the model as it was before it broadcast over arrays
+ORIGINAL = {
+	'get_circle_of_confusion': lambda s_t, N, f, s_s:
+		(1/N) * fabs(f-s_s*(s_t*1000-f)/(s_t*1000)),
+	'target_size_in_pix': lambda s_t, FoV, res, feat_size:
+		ceil(feat_size/(s_t * tan(radians(FoV)/res))),
+	'min_target_dist': lambda FoV, feat_size:
+		(feat_size/2)/tan(radians(FoV)/2),
+	'min_FoV': lambda dist, feat_size: degrees(2*atan(feat_size/(2*dist))),
+	'max_target_dist': lambda FoV, res, n, feat_size:
+		(feat_size/n)/tan(radians(FoV)/res),
+	'hyperfocal_dist': lambda f, N, c: ((f**2)/(N*c)) + f,
+	'near_dist_acceptable': lambda f, focus, H:
+		(focus*(H-f))/(H+focus-(2*f)),
+	'far_dist_acceptable': lambda f, focus, H: (focus*(H-f))/(H-focus),
+	'dof2s_s': lambda dof, f: (f * (dof*1000)) / ((dof*1000) - f),
+	's_s2dof': lambda s_s, f: ((f * s_s) / (s_s - f))/1000,
+}
+
+def _arguments(rng, name, n):
+	u = rng.uniform
+	return {
+		'get_circle_of_confusion': (u(.1, 100, n), u(1, 16, n), u(3, 50, n),
+			u(3.1, 60, n)),
+		'target_size_in_pix': (u(.1, 100, n), u(5, 90, n), np.full(n, 1944),
+			u(.01, 1, n)),
+		'min_target_dist': (u(5, 90, n), u(.01, 1, n)),
+		'min_FoV': (u(.1, 100, n), u(.01, 1, n)),
+		'max_target_dist': (u(5, 90, n), np.full(n, 1944), np.full(n, 10),
+			u(.01, 1, n)),
+		'hyperfocal_dist': (u(3, 50, n), u(1, 16, n), u(.001, .02, n)),
+		'near_dist_acceptable': (u(3, 50, n), u(100, 1e5, n), u(100, 1e5, n)),
+		'far_dist_acceptable': (u(3, 50, n), u(100, 1e5, n), u(100, 1e5, n)),
+		'dof2s_s': (u(.1, 100, n), u(3, 50, n)),
+		's_s2dof': (u(3.1, 60, n), u(3, 50, n)),
+	}[name]
+
+def test_scalars_bit_identical():
+	rng = np.random.default_rng(0)
+	for name, original in ORIGINAL.items():
+		columns = _arguments(rng, name, 2000)
+		for args in zip(*(c.tolist() for c in columns)):
+			got = getattr(cm, name)(*args)
+			assert got == original(*args), (name, args)
+			assert type(got) is type(original(*args))
+
+def test_arrays_match_scalars():
+	rng = np.random.default_rng(1)
+	for name in ORIGINAL:
+		columns = _arguments(rng, name, 500)
+		array = getattr(cm, name)(*columns)
+		scalar = [getattr(cm, name)(*args) for args in zip(*(c.tolist()
+			for c in columns))]
+		assert isinstance(array, np.ndarray)
+		assert np.allclose(array, scalar, rtol=1e-12, atol=0)
+
+def test_numpy_scalars_take_the_same_path():
+	args = (np.float64(5.), np.float64(2.2), np.float64(16.), np.float64(16.1))
+	assert cm.get_circle_of_confusion(*args) == \
+		cm.get_circle_of_confusion(*(float(a) for a in args))
+
+def test_zero_division_falls_back_to_numpy():
+	with np.errstate(divide='ignore', invalid='ignore'):
+		assert cm.min_FoV(0, 0.1) == 180
+		assert cm.s_s2dof(16, 16) == np.inf
+		assert cm.get_circle_of_confusion(0, 2, 16, 16) == np.inf
+		assert cm.target_size_in_pix(0, 60, 1944, 0.1) == np.inf
+		assert np.isnan(cm.target_size_in_pix(0., 60., 1944, 0.))
+		assert cm.target_size_in_pix(np.array([0., 1.]), 60, 1944,
+			0.1)[0] == np.inf
+	assert cm.near_dist_acceptable(10, 0, 20) == np.inf
+	assert cm.far_dist_acceptable(10, 100, 100) == np.inf
@@ -0,0 +1,74 @@
+#!/usr/bin/python3
+
+#
+# test_catalog.py
+#
+# batch evaluation over a catalog against the model one camera at a time,
+# and the table round trips (python -m pytest)
+#
+
+import numpy as np
+import camera_model as cm
+import catalog
+import solver
+
+def _random(n, seed = 0):
+	rng = np.random.default_rng(seed)
+	focus = rng.uniform(0.5, 50, n)
+	focus[::3] = np.nan		# hyperfocal
+	return catalog.Catalog.from_columns(name=['c{}'.format(i) for i in
+		range(n)], focal_length=rng.uniform(3, 50, n),
+		f_number=rng.uniform(1.4, 16, n), pixel_size=rng.uniform(1.4, 5.5, n),
+		focus=focus)
+
+def test_batch_matches_single_cameras():
+	cat = _random(50)
+	dist = np.geomspace(0.15, 100, 30)
+	coc = cat.coc(dist, 4)
+	pixels = cat.target_pixels(dist, 0.1)
+	crit = cat.critical_distances(4, 0.1, 10, 0.9)
+	for i, c in enumerate(cat):
+		focus = c.focus
+		if focus is None:
+			focus = cm.hyperfocal_dist(c.focal_length, c.f_number,
+				4*c.pixel_size/cm.MM_2_UM)/cm.M_2_MM
+		s_s = cm.dof2s_s(focus, c.focal_length)
+		assert np.allclose(coc[i], cm.get_circle_of_confusion_in_pix(dist,
+			c.f_number, c.focal_length, s_s, c.pixel_size), rtol=1e-12)
+		assert np.array_equal(pixels[i], cm.target_size_in_pix(dist, c.fov_y,
+			c.res_y, 0.1))
+		one = solver.critical_distances(c.focal_length, c.f_number,
+			c.pixel_size, c.res_y, focus, 4, 0.1, 10, 0.9, c.fov_y)
+		for k, v in one.items():
+			assert np.allclose(crit[k][i], v, rtol=1e-12, equal_nan=True), k
+
+def test_derived_fov():
+	cat = _random(5)
+	assert np.allclose(cat.fov('x'), cm.sensor_FoV(cat['focal_length'],
+		cat['pixel_size'], 2592))
+	assert np.allclose(cat.fov('y'), cm.sensor_FoV(cat['focal_length'],
+		cat['pixel_size'], 1944))
+
+def test_csv_round_trip(tmp_path):
+	cat = _random(20)
+	path = str(tmp_path/'cat.csv')
+	cat.save_csv(path)
+	back = catalog.Catalog.load_csv(path)
+	for name in catalog.FIELDS:
+		if name == 'name':
+			assert back[name].tolist() == cat[name].tolist()
+		else:
+			assert np.allclose(back[name], cat[name], equal_nan=True)
+
+def test_indexing():
+	cat = _random(10)
+	assert np.shares_memory(cat[2:5].table, cat.table)
+	c = cat[4]
+	assert isinstance(c, catalog.Camera) and c.name == 'c4'
+	row = catalog.Catalog.from_cameras([c])
+	for name in catalog.FIELDS[1:]:
+		assert np.array_equal(row[name], cat[name][4:5], equal_nan=True)
+	fast = cat.filter(f_number=(None, 4), focal_length=(10, None))
+	assert np.all(fast['f_number'] <= 4) and np.all(fast['focal_length'] >= 10)
+	assert len(fast) == np.sum((cat['f_number'] <= 4) &
+		(cat['focal_length'] >= 10))
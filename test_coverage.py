@@ -0,0 +1,49 @@
+#!/usr/bin/python3
+
+#
+# test_coverage.py
+#
+# the interval index against a brute force scan of the ranges
+# (python -m pytest)
+#
+
+import numpy as np
+import coverage
+
+def _random(n, seed = 0):
+	rng = np.random.default_rng(seed)
+	lo = rng.uniform(0, 50, n)
+	hi = lo + rng.uniform(0, 30, n)
+	hi[::5] = np.inf
+	lo[3] = np.nan		# unknown range
+	hi[4] = lo[4]		# empty range
+	return coverage.CoverageIndex(['c{}'.format(i) for i in range(n)], lo, hi)
+
+def _brute(index, dist):
+	d = np.asarray(dist)[..., None]
+	with np.errstate(invalid='ignore'):
+		return (d >= index.lo) & (d < index.hi)
+
+def test_queries_match_brute_force():
+	index = _random(40)
+	rng = np.random.default_rng(1)
+	dist = np.concatenate((rng.uniform(-5, 120, 5000), index.bounds,
+		np.nextafter(index.bounds, -np.inf)))
+	covered = _brute(index, dist)
+	assert np.array_equal(index.query(dist), covered)
+	assert np.array_equal(index.count(dist), covered.sum(axis=-1))
+	first = np.where(covered.any(axis=-1), covered.argmax(axis=-1), -1)
+	assert np.array_equal(index.select(dist), first)
+
+def test_gaps_and_overlaps():
+	index = coverage.CoverageIndex(['a', 'b', 'c'], [1, 4, 10], [5, 8, 12])
+	assert index.gaps(0, 20) == [(0., 1.), (8., 10.), (12., 20.)]
+	assert index.overlaps() == [(4., 5., ['a', 'b'])]
+	assert index.handovers(0, 20) == [(1., None, 'a'), (5., 'a', 'b'),
+		(8., 'b', None), (10., None, 'c'), (12., 'c', None)]
+	assert index.add('d', 0, 100).gaps(0, 20) == []
+
+def test_lies_index():
+	index = coverage.lies_index()
+	assert index.names == ['docking', 'near_range', 'star_tracker']
+	assert index.select(1.) == 0 and index.select(1000.) == 2
@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+
+#
+# test_decimate.py
+#
+# the decimated polyline crosses a level where the full one does, keeps
+# the envelope and the gaps (python -m pytest)
+#
+
+import numpy as np
+import pytest
+import camera_model as cm
+import decimate
+
+def _crossings(x, y, level):
+	# x of every crossing of the polyline through level, interpolated
+	above = y > level
+	i = np.flatnonzero(above[:-1] != above[1:])
+	t = (level - y[i])/(y[i + 1] - y[i])
+	return x[i] + t*(x[i + 1] - x[i])
+
+def _coc():
+	x = np.linspace(0.5, 200, 200001)
+	f = 16
+	y = cm.get_circle_of_confusion(x, 2.2, f, cm.dof2s_s(5, f))
+	return x, y, 4*2.2/cm.MM_2_UM
+
+@pytest.mark.parametrize('method', decimate.METHODS)
+def test_threshold_crossings_kept(method):
+	x, y, c = _coc()
+	xd, yd = decimate.decimate(x, y, 100, method, thresholds=[c])
+	assert xd.size < x.size/100
+	full = _crossings(x, y, c)
+	assert full.size == 2
+	assert np.array_equal(_crossings(xd, yd, c), full)
+
+@pytest.mark.parametrize('method', decimate.METHODS)
+def test_endpoints_and_order(method):
+	x, y, _ = _coc()
+	xd, yd = decimate.decimate(x, y, 50, method)
+	assert xd[0] == x[0] and xd[-1] == x[-1]
+	assert np.all(np.diff(xd) > 0)
+	assert np.array_equal(yd, y[np.searchsorted(x, xd)])
+
+def test_minmax_keeps_the_envelope():
+	rng = np.random.default_rng(1)
+	x = np.arange(100000.)
+	y = rng.normal(size=x.size)
+	idx = decimate.minmax_indices(x, y, 100)
+	assert idx.size <= 400
+	starts = decimate.bin_starts(x, 100)
+	for s, e in zip(starts, np.append(starts[1:], x.size)):
+		kept = idx[(idx >= s) & (idx < e)]
+		assert y[s:e].min() == y[kept].min() and y[s:e].max() == y[kept].max()
+
+def test_lttb_budget():
+	x = np.arange(10000.)
+	y = np.sin(x/100)
+	assert decimate.lttb_indices(x, y, 200).size == 200
+
+@pytest.mark.parametrize('method', decimate.METHODS)
+def test_gaps_and_keep_x(method):
+	x = np.linspace(1, 100, 50000)
+	y = np.sin(x)
+	y[20000:21000] = np.nan
+	xd, yd = decimate.decimate(x, y, 40, method, keep_x=[37.])
+	assert np.isnan(yd).any()
+	assert x[20000] in xd
+	j = np.searchsorted(x, 37.)
+	assert x[j - 1] in xd and x[j] in xd
+
+def test_unknown_method():
+	x = np.arange(10000.)
+	with pytest.raises(ValueError):
+		decimate.decimate(x, x, 10, 'every_other')
@@ -0,0 +1,52 @@
+#!/usr/bin/python3
+
+#
+# test_design.py
+#
+# the closed form design bounds against the forward model: every point of
+# the feasible region meets its requirement, and the bounds are tight
+# (python -m pytest)
+#
+
+import numpy as np
+import pytest
+import design
+
+REQUIREMENTS = [design.DOCKING, design.NEAR_RANGE,
+	design.Requirement('close', 0.3, 5, feat_size=0.05, accept_coc=2),
+	design.Requirement('far', 10, 200, min_n_pixel=4, cover=0.5)]
+
+@pytest.mark.parametrize('req', REQUIREMENTS, ids=lambda r: r.name)
+@pytest.mark.parametrize('pixel_size', [1.4, 2.2, 5.5])
+def test_feasible_region_meets_requirement(req, pixel_size):
+	r = design.feasible_region(req, pixel_size)
+	assert r['focal_length'].size
+	assert np.all(design.feasible(r['focal_length'], r['N_min'], req,
+		pixel_size))
+	# any faster lens loses the DoF
+	assert not np.any(design.feasible(r['focal_length'], r['N_min']*(1 - 1e-6),
+		req, pixel_size))
+
+@pytest.mark.parametrize('req', REQUIREMENTS, ids=lambda r: r.name)
+def test_focal_length_bounds_tight(req):
+	f_min, f_max = design.focal_length_bounds(req)
+	f = np.array([f_min*(1 - 1e-6), f_max*(1 + 1e-6)])
+	assert not np.any(design.feasible(f, np.full(2, 1e3), req))
+	f = np.array([f_min*(1 + 1e-6), f_max*(1 - 1e-6)])
+	assert np.all(design.feasible(f, design.min_f_number(f, req), req))
+
+def test_pareto_designs_against_brute_force():
+	rng = np.random.default_rng(0)
+	f, N = rng.uniform(1, 30, 2000), rng.uniform(1, 22, 2000)
+	req = design.DOCKING
+	d = design.pareto_designs(req, f, N)
+	ok = design.feasible(f, N, req)
+	assert np.all(ok[d['index']])
+	# nothing feasible dominates a design, every feasible lens is dominated
+	# by or equal to one
+	for i in np.flatnonzero(ok):
+		better = (N[d['index']] <= N[i]) & (f[d['index']] <= f[i])
+		assert better.any()
+	for j in d['index']:
+		assert not np.any(ok & (N <= N[j]) & (f <= f[j]) & ((N < N[j]) |
+			(f < f[j])))
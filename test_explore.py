@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+
+#
+# test_explore.py
+#
+# the graph recomputes only what a slider move reaches, early cutoff stops
+# at unchanged values, the served state matches the model (python -m pytest)
+#
+
+import json
+import numpy as np
+import pytest
+import camera_model as cm
+import explore
+
+def _names(g):
+	return {n for n, _ in g.recomputed}
+
+def test_early_cutoff():
+	g = explore.Graph()
+	g.input('a', 1)
+	g.derived('odd', ('a',), lambda a: a % 2)
+	g.derived('b', ('odd',), lambda odd: odd*10)
+	assert g.get('b') == 10
+	g.recomputed = []
+	assert not g.set('a', 1)
+	assert g.set('a', 3)
+	assert g.get('b') == 10 and _names(g) == {'odd'}
+	g.recomputed = []
+	g.set('a', 4)
+	assert g.get('b') == 0 and _names(g) == {'odd', 'b'}
+	g.recomputed = []
+	assert g.get('b') == 0 and not g.recomputed
+
+@pytest.fixture(scope='module')
+def explorer():
+	return explore.Explorer(points=5000)
+
+def test_accept_coc_at_fixed_focus(explorer):
+	explorer.update(dict(focus=5, accept_coc=4))
+	state = json.loads(explorer.update(dict(accept_coc=6)))
+	names = {n for n, _ in state['recomputed']}
+	assert {'hyperfocal', 'dof', 'coc_plot'} <= names
+	assert not names & {'s_s', 'fov', 'coc', 'pixels', 'pixels_plot'}
+
+def test_accept_coc_at_hyperfocal_moves_the_curve(explorer):
+	explorer.update(dict(focus=0, accept_coc=4))
+	state = json.loads(explorer.update(dict(accept_coc=6)))
+	names = {n for n, _ in state['recomputed']}
+	assert {'focus_m', 's_s', 'coc', 'coc_plot'} <= names
+	assert not names & {'fov', 'pixels'}
+
+def test_state_matches_the_model(explorer):
+	state = json.loads(explorer.update(dict(focal_length=16, f_number=2.2,
+		pixel_size=2.2, accept_coc=4, focus=0)))
+	c = 4*2.2/cm.MM_2_UM
+	H = cm.hyperfocal_dist(16, 2.2, c)
+	assert state['hyperfocal'] == pytest.approx(H/cm.M_2_MM)
+	assert state['near'] == pytest.approx(
+		cm.near_dist_acceptable(16, H, H)/cm.M_2_MM)
+	assert state['far'] is None
+	x, y = np.array(state['coc']['x']), np.array(state['coc']['y'])
+	assert x.size < explorer.dist.size and np.all(np.diff(x) > 0)
+	d = explorer.dist		# x and y went out rounded to 6 digits
+	d = d[np.abs(d[:, None] - x).argmin(axis=0)]
+	assert np.allclose(y, cm.get_circle_of_confusion_in_pix(d, 2.2, 16,
+		cm.dof2s_s(H/cm.M_2_MM, 16), 2.2), rtol=0, atol=1e-6)
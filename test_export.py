@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+
+#
+# test_export.py
+#
+# exported tables round trip, and only complete ones can be read
+# (python -m pytest)
+#
+
+import os
+import numpy as np
+import pytest
+import export
+import sweep
+
+AXES = dict(focal_length=[3, 16], f_number=[2.2, 5.6], pixel_size=2.2,
+	focus=None, distance=np.geomspace(0.15, 100, 40), accept_coc=[2, 4])
+
+def _grid(r, name, dims):
+	"""variable name of a SweepResult broadcast over the table dims"""
+	v = r[name]
+	return np.broadcast_to(np.expand_dims(v, tuple(i for i, a in
+		enumerate(dims) if a not in r.dims[name])), [r.axes[a].size
+		for a in dims])
+
+@pytest.mark.parametrize('format', export.FORMATS)
+def test_round_trip(tmp_path, format):
+	path = str(tmp_path/('t.csv' if format == 'csv' else 't'))
+	export.export_sweep(path, **AXES, format=format, chunk_size=50)
+	columns, meta = export.read(path)
+	r = sweep.sweep(**AXES)
+	dims, shape = meta['attrs']['dims'], meta['attrs']['shape']
+	assert meta['rows'] == np.prod(shape)
+	for name in r.data:
+		assert np.array_equal(columns[name].reshape(shape), _grid(r, name,
+			dims), equal_nan=True)
+	if format == 'columns':
+		assert isinstance(columns['coc'], np.memmap)
+
+def test_export_result_matches_export_sweep(tmp_path):
+	r = sweep.sweep(**AXES, precision='compact')
+	export.export_result(str(tmp_path/'r'), r, chunk_size=77)
+	export.export_sweep(str(tmp_path/'s'), **AXES, precision='compact')
+	a, _ = export.read(str(tmp_path/'r'))
+	b, _ = export.read(str(tmp_path/'s'))
+	for name in a:
+		assert a[name].dtype == b[name].dtype
+		assert np.array_equal(a[name], b[name], equal_nan=True)
+
+def test_aborted_columns_not_readable(tmp_path):
+	path = str(tmp_path/'t')
+	with pytest.raises(RuntimeError):
+		with export.ColumnWriter(path, [('x', np.float64)]) as w:
+			w.write(dict(x=np.arange(5.)))
+			raise RuntimeError('cancelled')
+	with pytest.raises(export.ExportError):
+		export.read(path)
+
+def test_aborted_csv_renamed(tmp_path):
+	path = str(tmp_path/'t.csv')
+	with pytest.raises(RuntimeError):
+		with export.ColumnWriter(path, [('x', np.float64)], format='csv') as w:
+			w.write(dict(x=np.arange(5.)))
+			raise RuntimeError('cancelled')
+	assert not os.path.exists(path) and os.path.exists(path + '.partial')
+
+def test_short_table_rejected(tmp_path):
+	path = str(tmp_path/'t')
+	with pytest.raises(export.ExportError):
+		with export.ColumnWriter(path, [('x', np.float64)],
+			attrs=dict(rows=10)) as w:
+			w.write(dict(x=np.arange(5.)))
+	with pytest.raises(export.ExportError):
+		export.read(path)
+
+def test_compact_checked(tmp_path, monkeypatch):
+	meta = export.export_sweep(str(tmp_path/'c'), **AXES,
+		variables=['coc', 'in_focus'], precision='compact')
+	assert all(c['ok'] for c in meta['attrs']['check'].values())
+	monkeypatch.setitem(sweep.COMPACT_TOLERANCES, 'coc', (0, 0))
+	with pytest.raises(sweep.PrecisionError):
+		export.export_sweep(str(tmp_path/'bad'), **AXES, variables=['coc'],
+			precision='compact')
+	assert not os.path.exists(str(tmp_path/'bad'))
+
+def test_write_table(tmp_path):
+	path = str(tmp_path/'w')
+	export.write_table(path, dict(dist=[1., 2.], ok=[True, False]),
+		units=dict(dist='m'), attrs=dict(camera='docking'))
+	columns, meta = export.read(path)
+	assert columns['ok'].tolist() == [True, False]
+	assert meta['columns'][0]['unit'] == 'm'
+	assert meta['attrs']['camera'] == 'docking'
@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+
+#
+# test_instrument.py
+#
+# nothing is wrapped unless enabled, nested calls and stages are counted,
+# the originals come back on disable (python -m pytest)
+#
+
+import json
+import numpy as np
+import pytest
+import camera_model as cm
+import instrument
+import sweep
+
+COC = cm.get_circle_of_confusion
+COC_PIX = cm.get_circle_of_confusion_in_pix
+
+def test_disabled_is_free():
+	assert instrument.active() is None
+	assert instrument.stage('x') is instrument.stage('y')
+	assert cm.get_circle_of_confusion is COC
+
+def test_nested_calls_counted():
+	d = np.linspace(1, 10, 7)
+	with instrument.profile(targets=('camera_model',)) as prof:
+		assert cm.get_circle_of_confusion_in_pix is not COC_PIX
+		for _ in range(3):
+			cm.get_circle_of_confusion_in_pix(d, 2.2, 16, 16.1)
+	assert cm.get_circle_of_confusion_in_pix is COC_PIX
+	assert cm.get_circle_of_confusion is COC
+	s = prof.summary()
+	outer = s['camera_model.get_circle_of_confusion_in_pix']
+	inner = s['camera_model.get_circle_of_confusion']
+	assert outer['calls'] == inner['calls'] == 3
+	assert outer['elements'] == 3*d.size and outer['bytes'] == 3*d.nbytes
+	assert 0 <= outer['self_time'] <= outer['time']
+	assert ('camera_model.get_circle_of_confusion_in_pix;'
+		'camera_model.get_circle_of_confusion') in prof.folded
+	assert [e[4] for e in prof.events] == [1, 0]*3
+
+def test_restored_after_an_exception():
+	with pytest.raises(ZeroDivisionError):
+		with instrument.profile(targets=('camera_model',)):
+			1/0
+	assert instrument.active() is None
+	assert cm.get_circle_of_confusion is COC
+
+def test_one_profiler_at_a_time():
+	with instrument.profile(targets=()):
+		with pytest.raises(RuntimeError):
+			instrument.profile(targets=()).enable()
+
+def test_sweep_stages(tmp_path):
+	with instrument.profile(max_events=2) as prof:
+		sweep.sweep([8, 16], [2.2], [2.2], [5], np.linspace(1, 50, 9), [4],
+			variables=['coc'])
+	assert prof.stats['sweep.coc'].calls == 1
+	assert prof.stats['sweep.coc'].elements == 18
+	assert len(prof.events) == 2 and prof.dropped > 0
+	prof.save(str(tmp_path/'p'))
+	with open(str(tmp_path/'p.json')) as f:
+		assert 'sweep.coc' in json.load(f)['stages']
+	with open(str(tmp_path/'p.trace.json')) as f:
+		assert len(json.load(f)['traceEvents']) == 2
+	assert (tmp_path/'p.folded').read_text().count('\n') == len(prof.folded)
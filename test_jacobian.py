@@ -0,0 +1,82 @@
+#!/usr/bin/python3
+
+#
+# test_jacobian.py
+#
+# the analytic partials against central finite differences of the model
+# (python -m pytest)
+#
+
+import numpy as np
+import pytest
+import camera_model as cm
+import jacobian
+
+def _batch(n = 200, seed = 0):
+	rng = np.random.default_rng(seed)
+	p = dict(f=rng.uniform(3, 50, n), N=rng.uniform(1.4, 16, n),
+		focus=rng.uniform(0.5, 5, n), pixel_size=rng.uniform(1.4, 5.5, n),
+		distance=rng.uniform(0.3, 50, n))
+	# keep away from the pole of far at the hyperfocal distance
+	H = cm.hyperfocal_dist(p['f'], p['N'], 4*p['pixel_size']/cm.MM_2_UM)
+	ratio = p['focus']*cm.M_2_MM/H
+	keep = (ratio < 0.9) | (ratio > 1.1)
+	return {k: v[keep] for k, v in p.items()}
+
+ARGS = ('f', 'N', 'focus', 'pixel_size', 'distance')
+
+def _values(p, focus, accept_coc):
+	j = jacobian.camera_jacobian(p['f'], p['N'], p['focus'] if focus else None,
+		p['pixel_size'], p['distance'], accept_coc)
+	return {q: j[q]['value'] for q in jacobian.QUANTITIES}
+
+@pytest.mark.parametrize('focus', [True, False], ids=['focus', 'hyperfocal'])
+def test_camera_jacobian_finite_differences(focus):
+	p = _batch()
+	jac = jacobian.camera_jacobian(p['f'], p['N'], p['focus'] if focus else None,
+		p['pixel_size'], p['distance'], 4)
+	for arg, param in zip(ARGS, jacobian.PARAMS):
+		if param == 'focus' and not focus:
+			continue
+		h = 1e-6*p[arg]
+		up = _values(dict(p, **{arg: p[arg] + h}), focus, 4)
+		down = _values(dict(p, **{arg: p[arg] - h}), focus, 4)
+		for q in jacobian.QUANTITIES:
+			got = jac[q][param]
+			with np.errstate(invalid='ignore'):
+				fd = (up[q] - down[q])/(2*h)
+			# focused at or beyond the hyperfocal distance far is infinite,
+			# without partials
+			finite = np.isfinite(jac[q]['value'])
+			assert np.array_equal(np.isfinite(got), finite), (q, param)
+			scale = np.abs(jac[q]['value'][finite]).max(initial=0)
+			assert np.allclose(got[finite], fd[finite], rtol=1e-5,
+				atol=1e-9*scale), (q, param)
+
+def test_single_functions():
+	rng = np.random.default_rng(1)
+	f, N, c = rng.uniform(3, 50, 100), rng.uniform(1.4, 16, 100), 0.0088
+	focus, dof = rng.uniform(500, 5000, 100), rng.uniform(0.5, 50, 100)
+	H = cm.hyperfocal_dist(f, N, c)
+	cases = [(jacobian.d_hyperfocal_dist, cm.hyperfocal_dist,
+		dict(f=f, N=N, c=c)),
+		(jacobian.d_near_dist_acceptable, cm.near_dist_acceptable,
+		dict(f=f, focus=focus, H=H)),
+		(jacobian.d_far_dist_acceptable, cm.far_dist_acceptable,
+		dict(f=f, focus=focus, H=H*1.5 + 6000)),
+		(jacobian.d_dof2s_s, cm.dof2s_s, dict(dof=dof, f=f))]
+	for d, model, kwargs in cases:
+		got = d(*kwargs.values())
+		for k, x in kwargs.items():
+			h = 1e-6*np.abs(x)
+			up = model(*(v + h if n == k else v for n, v in kwargs.items()))
+			down = model(*(v - h if n == k else v for n, v in kwargs.items()))
+			assert np.allclose(got[k], (up - down)/(2*h), rtol=1e-5), (d, k)
+
+def test_kink_and_stack():
+	j = jacobian.camera_jacobian(16, 2.2, 5., 2.2, [1., 5., 10.], 4)
+	assert np.isnan(j['coc']['distance'][1])		# at the focus distance
+	values, J = jacobian.stack(j)
+	assert values.shape == (3, len(jacobian.QUANTITIES))
+	assert J.shape == (3, len(jacobian.QUANTITIES), len(jacobian.PARAMS))
+	assert J[0, 4, 4] == j['coc']['distance'][0]
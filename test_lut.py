@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+
+#
+# test_lut.py
+#
+# lookups stay within their stored error bound, and that bound within the
+# requested tolerance, checked against the model on a dense grid
+# (python -m pytest)
+#
+
+import numpy as np
+import pytest
+import camera_model as cm
+import catalog
+import lut
+
+DENSE = np.geomspace(0.15, 100, 400001)
+
+@pytest.mark.parametrize('tol', [1e-2, 1e-3])
+def test_coc_within_bound(tol):
+	rng = np.random.default_rng(0)
+	for _ in range(10):
+		f, N = rng.uniform(3, 50), rng.uniform(1.4, 16)
+		pixel_size, focus = rng.uniform(1.4, 5.5), rng.uniform(0.2, 80)
+		s_s = cm.dof2s_s(focus, f)
+		table = lut.coc_table(N, f, s_s, pixel_size, tol=tol)
+		truth = cm.get_circle_of_confusion_in_pix(DENSE, N, f, s_s, pixel_size)
+		assert table.bound <= tol
+		assert np.abs(table(DENSE) - truth).max() <= table.bound*(1 + 1e-9)
+
+def test_pixels_within_bound():
+	FoV, res, feat_size = 61.93, 1944, 0.1
+	table = lut.pixel_table(FoV, res, feat_size, tol=1e-3)
+	truth = feat_size/(DENSE*np.tan(np.radians(FoV)/res))
+	assert table.bound <= 1e-3
+	assert np.abs(table(DENSE) - truth).max() <= table.bound*(1 + 1e-9)
+	# rounded up it is the model, away from integers
+	n = cm.target_size_in_pix(DENSE, FoV, res, feat_size)
+	clear = np.abs(truth - np.round(truth)) > table.bound
+	assert np.array_equal(np.ceil(table(DENSE))[clear], n[clear])
+
+def test_scalar_path_and_range():
+	table = lut.coc_table(5.6, 3, cm.dof2s_s(0.3, 3))
+	d = np.geomspace(0.15, 100, 101)
+	assert np.allclose([table(float(x)) for x in d], table(d), rtol=1e-15,
+		atol=0)
+	assert np.isnan(table(0.1)) and np.isnan(table(200.)) and np.isnan(table(0))
+	assert np.isnan(table(np.array([0.1, 200.]))).all()
+
+def test_save_load(tmp_path):
+	tables = lut.camera_tables(catalog.Camera('docking', 3, 5.6))
+	for kind, table in tables.items():
+		path = str(tmp_path/(kind + '.lut'))
+		table.save(path)
+		back = lut.LogTable.load(path)
+		assert isinstance(back.values, np.memmap) and back.kind == kind
+		assert back.bound == table.bound
+		assert np.array_equal(back(DENSE[::1000]), table(DENSE[::1000]))
@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+
+#
+# test_montecarlo.py
+#
+# tolerance analysis results depend on the seed only, never on the worker
+# count, and agree with the nominal camera at zero tolerance
+# (python -m pytest)
+#
+
+import numpy as np
+import pytest
+import catalog
+import design
+import montecarlo
+import solver
+
+CAMERA = catalog.Camera('docking', 3, 5.6)
+REQ = design.Requirement('docking', 0.2, 15)
+
+def _same(a, b):
+	for k in ('n', 'passed', 'yield', 'ci', 'rates'):
+		assert a[k] == b[k], k
+	for k in a['stats']:
+		assert a['stats'][k] == b['stats'][k], k
+	for k in a['hist']:
+		assert np.array_equal(a['hist'][k], b['hist'][k]), k
+
+def test_independent_of_processes():
+	kwargs = dict(n=50000, seed=7, batch_size=4096)
+	serial = montecarlo.tolerance_analysis(CAMERA, REQ, processes=1, **kwargs)
+	for processes in (2, 3):
+		_same(serial, montecarlo.tolerance_analysis(CAMERA, REQ,
+			processes=processes, **kwargs))
+	other = montecarlo.tolerance_analysis(CAMERA, REQ, processes=1,
+		**dict(kwargs, seed=8))
+	assert other['stats']['near'] != serial['stats']['near']
+
+def test_partial_last_batch():
+	r = montecarlo.tolerance_analysis(CAMERA, REQ, n=20001, batch_size=3000,
+		processes=1)
+	assert r['n'] == 20001
+	assert sum(r['hist']['coc_far']) == sum(r['hist']['coc_near']) == 20001
+	assert 0 <= r['passed'] <= r['n']
+
+def test_zero_tolerance_is_the_nominal_camera():
+	r = montecarlo.tolerance_analysis(CAMERA, REQ, dict(focal_length=0,
+		s_s=0, f_number=0, focus=0), n=1000, processes=1)
+	near, far = solver.dof_limits(3, 5.6, None, REQ.accept_coc)
+	assert r['stats']['near']['mean'] == pytest.approx(near, rel=1e-12)
+	assert r['stats']['near']['std'] == pytest.approx(0, abs=1e-12)
+	min_d, max_d = solver.detection_range(CAMERA.fov_y, CAMERA.res_y,
+		REQ.feat_size, REQ.min_n_pixel, REQ.cover)
+	checks = dict(in_focus=near <= REQ.near and far >= REQ.far,
+		detect_far=max_d >= REQ.far, fit_near=min_d <= REQ.near)
+	assert r['rates'] == {k: float(v) for k, v in checks.items()}
+	assert r['yield'] == float(all(checks.values()))
+
+def test_wilson_interval_covers():
+	lo, hi = montecarlo.wilson_interval(90, 100)
+	assert lo < 0.9 < hi
+	assert montecarlo.wilson_interval(0, 0) == (0., 1.)
+
+@pytest.mark.parametrize('n', [0, -5])
+def test_no_samples_rejected(n):
+	with pytest.raises(ValueError):
+		montecarlo.tolerance_analysis(CAMERA, REQ, n=n)
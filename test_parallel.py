@@ -0,0 +1,42 @@
+#!/usr/bin/python3
+
+#
+# test_parallel.py
+#
+# the process pool sweep against the serial one, bit for bit, in either
+# precision and with units ending mid byte (python -m pytest)
+#
+
+import numpy as np
+import pytest
+import parallel
+import sweep
+
+AXES = dict(focal_length=[3, 8, 16], f_number=[2.2, 5.6],
+	pixel_size=[1.4, 2.2], focus=None, distance=np.geomspace(0.15, 100, 37),
+	accept_coc=[2, 4])
+
+@pytest.mark.parametrize('precision', sweep.PRECISIONS)
+@pytest.mark.parametrize('chunk_size', [13, 1000])
+def test_matches_serial(precision, chunk_size):
+	s = sweep.sweep(**AXES, precision=precision)
+	p = parallel.parallel_sweep(**AXES, precision=precision,
+		chunk_size=chunk_size, processes=3)
+	assert p.attrs.keys() == s.attrs.keys()
+	for name in s.data:
+		assert p.data[name].dtype == s.data[name].dtype
+		assert np.array_equal(p.data[name], s.data[name], equal_nan=True)
+	if precision == 'compact':
+		assert p.attrs['packed'] == s.attrs['packed']
+		assert np.array_equal(p['in_focus'], s['in_focus'])
+
+def test_cancel_and_resume():
+	s = sweep.sweep(**AXES, variables=['in_focus'], precision='compact')
+	with parallel.ParallelSweep(**AXES, variables=['in_focus'],
+		precision='compact', chunk_size=13, processes=2) as ps:
+		with pytest.raises(parallel.SweepCancelled):
+			ps.run(cancel=lambda: True)
+		assert 0 < len(ps.done) < len(ps._units)
+		r = ps.run()
+		assert np.array_equal(r.data['in_focus'], s.data['in_focus'])
+		assert r.attrs['check']['in_focus']['ok']
@@ -0,0 +1,52 @@
+#!/usr/bin/python3
+
+#
+# test_sampling.py
+#
+# the adaptive samplings stay within their tolerance everywhere, checked
+# against the model on a dense grid (python -m pytest)
+#
+
+import numpy as np
+import camera_model as cm
+import sampling
+
+DENSE = np.geomspace(0.15, 100, 200001)
+
+def _max_error(x, y, truth, atol, rtol):
+	"""return the worst interpolation error over DENSE, in tolerances"""
+	return (np.abs(np.interp(DENSE, x, y) - truth)/(atol +
+		rtol*np.abs(truth))).max()
+
+def test_coc_curve_docking():
+	# LIES docking camera at the hyperfocal distance: the kink at 0.19 m
+	f, N, pixel_size = 3, 5.6, 2.2
+	H = cm.hyperfocal_dist(f, N, 4*pixel_size/cm.MM_2_UM)
+	s_s = cm.dof2s_s(H/cm.M_2_MM, f)
+	x, y = sampling.coc_curve(N, f, s_s, pixel_size, accept_coc=4)
+	truth = cm.get_circle_of_confusion_in_pix(DENSE, N, f, s_s, pixel_size)
+	assert _max_error(x, y, truth, 1e-2, 1e-3) <= 1
+
+def test_coc_curve_random_cameras():
+	rng = np.random.default_rng(0)
+	for _ in range(50):
+		f, N = rng.uniform(3, 50), rng.uniform(1, 16)
+		pixel_size, focus = rng.uniform(1.4, 5.5), rng.uniform(0.2, 80)
+		s_s = cm.dof2s_s(focus, f)
+		x, y = sampling.coc_curve(N, f, s_s, pixel_size, accept_coc=4)
+		truth = cm.get_circle_of_confusion_in_pix(DENSE, N, f, s_s, pixel_size)
+		assert _max_error(x, y, truth, 1e-2, 1e-3) <= 1
+
+def test_coc_curve_crossings_exact():
+	f, N, pixel_size = 16, 2.2, 2.2
+	s_s = cm.dof2s_s(5, f)
+	x, y = sampling.coc_curve(N, f, s_s, pixel_size, accept_coc=4)
+	assert np.any(np.isclose(x, 5, rtol=1e-12))
+	assert np.sum(np.isclose(y, 4, rtol=1e-9)) == 2
+
+def test_pixel_curve():
+	FoV, res, feat_size = 61.93, 1944, 0.1
+	x, y = sampling.pixel_curve(FoV, res, feat_size, min_n_pixel=10)
+	truth = feat_size/(DENSE*np.tan(np.radians(FoV)/res))
+	assert _max_error(x, y, truth, 1e-2, 1e-3) <= 1
+	assert np.any(np.isclose(x, cm.max_target_dist(FoV, res, 10, feat_size)))
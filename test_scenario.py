@@ -0,0 +1,63 @@
+#!/usr/bin/python3
+
+#
+# test_scenario.py
+#
+# scenario files validate, and the shipped ones pass on a clean tree
+# (python -m pytest)
+#
+
+import json
+import os
+import sys
+import numpy as np
+import camera_model as cm
+import export
+import scenario
+
+def _run(monkeypatch, tmp_path, *files):
+	monkeypatch.setattr(sys, 'argv', ['scenario.py', *files, '-o',
+		str(tmp_path/'out'), '-j', '1'])
+	return scenario.main()
+
+def test_lies_passes(monkeypatch, tmp_path):
+	lies = os.path.join(os.path.dirname(__file__), 'scenarios', 'lies.toml')
+	assert _run(monkeypatch, tmp_path, lies) == 0
+
+def test_expect_validated():
+	errors = scenario.validate(dict(name='a', camera='docking',
+		outputs=['critical'], expect='maybe'))
+	assert errors == ['scenario.expect: expected one of pass, fail']
+
+def test_check_needs_a_requirement():
+	errors = scenario.validate(dict(name='a', camera='docking'))
+	assert errors == ['scenario.outputs: check needs a requirement']
+	assert not scenario.validate(dict(name='a', camera='docking',
+		outputs=['critical']))
+
+def test_expected_failure_that_passes(monkeypatch, tmp_path, capsys):
+	path = tmp_path/'s.json'
+	path.write_text(json.dumps(dict(scenario=[dict(name='easy',
+		camera='docking', requirement=dict(near=1, far=2), expect='fail'),
+		dict(name='hard', camera='docking', requirement=dict(near=0.01,
+		far=2), expect='fail')])))
+	assert _run(monkeypatch, tmp_path, str(path)) == 1
+	out = capsys.readouterr().out
+	assert 'XPASS easy' in out and 'XFAIL hard' in out
+
+def test_sweep_uses_the_camera_fov(monkeypatch, tmp_path):
+	# fov_y = 61.93 against the 70.9 degrees of the sensor
+	camera = dict(name='final', focal_length=3, f_number=5.6, fov_y=61.93)
+	path = tmp_path/'s.json'
+	path.write_text(json.dumps(dict(scenario=[dict(name='final',
+		camera=camera, outputs=['critical', 'export'])])))
+	assert _run(monkeypatch, tmp_path, str(path)) == 0
+	with open(tmp_path/'out'/'results.json') as f:
+		res = json.load(f)['final']
+	columns, meta = export.read(res['export']['path'])
+	assert meta['attrs']['fov'] == 61.93
+	assert np.array_equal(columns['feature_pixels'], cm.target_size_in_pix(
+		columns['distance'], 61.93, 1944, 0.1))
+	# the critical distances of the same scenario use the same FoV
+	assert np.isclose(res['critical']['max_detect'], cm.max_target_dist(61.93,
+		1944, 10, 0.1))
@@ -0,0 +1,52 @@
+#!/usr/bin/python3
+
+#
+# test_sensormap.py
+#
+# the sensor map against the 1-D model at the centre and against ray
+# geometry off axis (python -m pytest)
+#
+
+import numpy as np
+import camera_model as cm
+import catalog
+import sensormap
+
+def _camera(name):
+	return catalog.LIES[int(np.flatnonzero(catalog.LIES['name'] == name)[0])]
+
+def test_centre_matches_limiting_axis():
+	c = _camera('docking')
+	d = np.array([0.5, 1., 5.])
+	m = sensormap.SensorMap(c, d)
+	centre = m.pixel('feature_pixels', c.res_y//2, c.res_x//2)
+	one_d = np.minimum(cm.target_size_in_pix(d, c.fov_x, c.res_x, 0.1),
+		cm.target_size_in_pix(d, c.fov_y, c.res_y, 0.1))
+	assert np.array_equal(centre, one_d)
+
+def _ray(m, y, x):
+	ry, rx = m.shape
+	r = np.array([(x - (rx - 1)/2)/m.fx, (y - (ry - 1)/2)/m.fy, 1.])
+	return r/np.linalg.norm(r)
+
+def test_footprint_matches_ray_angles():
+	c = _camera('docking')
+	m = sensormap.SensorMap(c, [2.], tile=256)
+	for y, x in [(0, 0), (100, 2000), (1900, 50), (972, 2500)]:
+		fx, fy = m.footprint(y, y + 1, x, x + 1)
+		h = 1e-3		# pixel step, small against the curvature
+		ax = np.linalg.norm(_ray(m, y, x + h/2) - _ray(m, y, x - h/2))/h
+		ay = np.linalg.norm(_ray(m, y + h/2, x) - _ray(m, y - h/2, x))/h
+		assert np.isclose(fx[0, 0, 0], 2*ax, rtol=1e-5)
+		assert np.isclose(fy[0, 0, 0], 2*ay, rtol=1e-5)
+
+def test_region_stats_match_values():
+	c = _camera('docking')
+	m = sensormap.SensorMap(c, [0.3, 3.])
+	region = dict(y=slice(30, 300), x=slice(100, 700))
+	for q in sensormap.QUANTITIES:
+		s = m.stats(q, **region)
+		v = np.stack([m.values(q, k, **region) for k in range(2)])
+		assert np.allclose(s['min'], v.min(axis=(1, 2)))
+		assert np.allclose(s['max'], v.max(axis=(1, 2)))
+		assert np.allclose(s['mean'], v.mean(axis=(1, 2)))
@@ -0,0 +1,44 @@
+#!/usr/bin/python3
+
+#
+# test_solver.py
+#
+# the closed form crossings against the model, unknown parameters stay
+# unknown (python -m pytest)
+#
+
+import numpy as np
+import camera_model as cm
+import catalog
+import solver
+
+def test_crossings_on_the_acceptable_coc():
+	N, f, c = np.array([2.2, 5.6]), 16, 4*2.2/cm.MM_2_UM
+	s_s = cm.dof2s_s(5, f)
+	near, far = solver.coc_crossings(N, f, s_s, c)
+	for d in (near, far):
+		assert np.allclose(cm.get_circle_of_confusion(d, N, f, s_s), c,
+			rtol=1e-9)
+
+def test_hyperfocal_far_is_infinite():
+	near, far = solver.dof_limits(3, 5.6, None, 4)
+	assert np.isfinite(near) and far == np.inf
+
+def test_nan_f_number_propagates():
+	near, far = solver.coc_crossings(np.array([2.2, np.nan]), 16,
+		cm.dof2s_s(5, 16), 4*2.2/cm.MM_2_UM)
+	assert np.isfinite(far[0])
+	assert np.isnan(near[1]) and np.isnan(far[1])
+
+def test_star_tracker_usable_range_unknown():
+	i = int(np.flatnonzero(catalog.LIES['name'] == 'star_tracker')[0])
+	d = catalog.LIES.critical_distances(4, 0.1, 10)
+	assert np.isfinite(d['max_detect'][i])
+	assert np.isnan(d['far'][i])
+	assert np.isnan(d['min_usable'][i]) and np.isnan(d['max_usable'][i])
+
+def test_find_root():
+	a = np.array([1., 2., 3.])
+	x = solver.find_root(lambda x: x**2 - a, np.zeros(3), 10)
+	assert np.allclose(x, np.sqrt(a))
+	assert np.isnan(solver.find_root(lambda x: x**2 + 1, 0, 1))
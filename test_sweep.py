@@ -0,0 +1,125 @@
+#!/usr/bin/python3
+
+#
+# test_sweep.py
+#
+# sweeps against the model cell by cell, in any chunking and precision
+# (python -m pytest)
+#
+
+import numpy as np
+import pytest
+import camera_model as cm
+import store
+import sweep
+
+AXES = dict(focal_length=[3, 16], f_number=[2.2, 5.6], pixel_size=2.2,
+	focus=[1., 5.], distance=np.geomspace(0.15, 100, 40), accept_coc=[2, 4])
+
+def test_blur_only_by_name():
+	assert 'blur' not in sweep.sweep(**AXES).data
+	r = sweep.sweep(**AXES, variables=['blur', 'coc'])
+	assert list(r.data) == ['blur', 'coc']
+	assert np.all(r['blur'] >= r['coc'])
+
+def _model(r, name):
+	"""variable name evaluated in one call over its whole grid"""
+	dims = r.dims[name]
+	v = {a: r.axes[a].reshape([-1 if b == a else 1 for b in dims])
+		for a in dims}
+	shape = tuple(r.axes[a].size for a in dims)
+	return np.broadcast_to(sweep.VARIABLES[name][1](v, r.attrs['res'],
+		r.attrs['feat_size']), shape)
+
+@pytest.mark.parametrize('focus', [[1., 5.], None])
+def test_chunking_changes_nothing(focus):
+	axes = dict(AXES, focus=focus)
+	whole = sweep.sweep(**axes, chunk_size=1 << 30)
+	for name in whole.data:
+		assert np.array_equal(whole[name], _model(whole, name), equal_nan=True)
+	for chunk_size in (1, 7, 40, 81, 1000):
+		r = sweep.sweep(**axes, chunk_size=chunk_size)
+		for name in whole.data:
+			assert np.array_equal(r[name], whole[name], equal_nan=True), (
+				chunk_size, name)
+
+def test_out_memmap(tmp_path):
+	r = sweep.sweep(**AXES, precision='compact')
+	out = {}
+	for name, a in r.data.items():
+		out[name] = np.lib.format.open_memmap(str(tmp_path/(name + '.npy')),
+			'w+', a.dtype, a.shape)
+	m = sweep.sweep(**AXES, precision='compact', out=out, chunk_size=13)
+	for name in r.data:
+		assert m.data[name] is out[name]
+		assert np.array_equal(m.data[name], r.data[name], equal_nan=True)
+	with pytest.raises(ValueError):
+		sweep.sweep(**AXES, variables=['coc'], out=dict(coc=np.empty(3)))
+
+def test_compact_within_tolerance():
+	r = sweep.sweep(**AXES, precision='compact', chunk_size=29)
+	assert set(r.attrs['check']) == set(r.data)
+	assert all(c['ok'] for c in r.attrs['check'].values())
+	report = sweep.check_precision(r, n=10**6)
+	assert all(c['ok'] for c in report.values()), report
+	exact = sweep.sweep(**AXES)
+	assert np.array_equal(r['in_focus'], exact['in_focus'])
+	assert np.array_equal(r['feature_pixels'], exact['feature_pixels'])
+
+def test_compact_beyond_tolerance(monkeypatch):
+	monkeypatch.setitem(sweep.COMPACT_TOLERANCES, 'coc', (0, 0))
+	with pytest.raises(sweep.PrecisionError):
+		sweep.sweep(**AXES, variables=['coc'], precision='compact')
+	r = sweep.sweep(**AXES, variables=['coc'], precision='compact',
+		check=False)
+	assert not sweep.check_precision(r)['coc']['ok']
+
+def test_packed_selection():
+	r = sweep.sweep(**AXES, variables=['in_focus'], precision='compact')
+	full = r['in_focus']
+	assert full.dtype == np.bool_ and full.shape == r.attrs['packed']['in_focus']
+	assert np.array_equal(r.isel('in_focus', f_number=1, distance=slice(3, 30,
+		4)), full[:, 1, :, :, 3:30:4])
+	assert r.isel('in_focus', focal_length=0, f_number=1, pixel_size=0,
+		focus=1, distance=17, accept_coc=0) == full[0, 1, 0, 1, 17, 0]
+	assert np.array_equal(r.sel('in_focus', focus=5, distance=2.),
+		full[:, :, :, 1, r.index('distance', 2.)])
+
+def test_store_matches_sweep(tmp_path):
+	s = store.ResultStore.create(str(tmp_path/'s'), **AXES, chunk_size=50)
+	s.fill()
+	s.append('distance', [150., 200.])
+	r = sweep.sweep(**dict(AXES, distance=np.append(AXES['distance'],
+		[150., 200.])))
+	assert s.complete() and s.variables == list(r.data)
+	for name in r.data:
+		assert np.array_equal(s.isel(name), r[name], equal_nan=True)
+
+def test_store_appends_before_fill(tmp_path):
+	s = store.ResultStore.create(str(tmp_path/'s'), **AXES, chunk_size=50)
+	s.append('distance', [150.], fill=False)
+	s.append('focal_length', [25.], fill=False)
+	s.append('distance', [200., 300.], fill=False)
+	assert not s.complete()
+	s.fill()
+	assert s.complete()
+	r = sweep.sweep(**dict(AXES, focal_length=[3, 16, 25],
+		distance=np.append(AXES['distance'], [150., 200., 300.])))
+	for name in r.data:
+		assert np.array_equal(s.isel(name), r[name], equal_nan=True), name
+
+def test_fixed_fov():
+	r = sweep.sweep(**AXES, variables=['feature_pixels'], fov=61.93,
+		precision='compact')
+	assert r.attrs['fov'] == 61.93 and r.attrs['check']['feature_pixels']['ok']
+	truth = cm.target_size_in_pix(AXES['distance'], 61.93, 1944, 0.1)
+	assert np.array_equal(r['feature_pixels'], np.broadcast_to(truth,
+		r['feature_pixels'].shape))
+
+def test_compact_at_distance_zero():
+	axes = dict(AXES, distance=[0., 1., 10.])
+	with np.errstate(divide='ignore', invalid='ignore'):
+		r = sweep.sweep(**axes, precision='compact')
+	assert r.attrs['storage']['feature_pixels'] == 'float64'
+	assert np.all(r['feature_pixels'][:, :, 0] == np.inf)
+	assert all(c['ok'] for c in r.attrs['check'].values())
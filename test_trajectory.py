@@ -0,0 +1,66 @@
+#!/usr/bin/python3
+
+#
+# test_trajectory.py
+#
+# streamed summaries do not depend on how the trajectory is chunked, and
+# match a direct evaluation of the whole trajectory (python -m pytest)
+#
+
+import numpy as np
+import pytest
+import catalog
+import trajectory
+
+CAMERA = catalog.Camera('docking', 3, 5.6)
+
+def _approach(n = 5000):
+	t = np.linspace(0, 900, n)
+	return t, 30*np.exp(-t/100) + 0.02		# 30 m down to a few cm
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1000, 1 << 20])
+def test_chunking_changes_nothing(chunk_size):
+	t, dist = _approach()
+	s = trajectory.evaluate(trajectory.chunked(t, dist, chunk_size), CAMERA,
+		cover=0.9)
+	frames = trajectory.TrajectoryEvaluator(CAMERA, cover=0.9).update(t, dist)
+	f, d = frames['in_focus'], frames['detectable']
+	dt = np.diff(t)
+	assert s['frames'] == t.size
+	assert s['first_detection'] == t[d][0] and s['last_detection'] == t[d][-1]
+	assert s['first_in_focus'] == t[f][0]
+	assert s['time_in_focus'] == pytest.approx(dt[f[:-1]].sum(), rel=1e-12)
+	assert s['time_detectable'] == pytest.approx(dt[d[:-1]].sum(), rel=1e-12)
+	assert s['max_blur'] == frames['blur'].max()
+	assert s['min_range'] == dist.min()
+
+def test_detectable_frames():
+	t, dist = _approach()
+	ev = trajectory.TrajectoryEvaluator(CAMERA, min_n_pixel=10, cover=0.9)
+	f = ev.update(t, dist)
+	assert np.array_equal(f['detectable'], f['in_focus'] & (f['pixels'] >= 10)
+		& (dist >= ev.min_dist))
+	# far away too few pixels, at the end too close to fit the view
+	assert not f['detectable'][0] and not f['detectable'][-1]
+	assert f['detectable'].any()
+
+def test_readers(tmp_path):
+	t, dist = _approach(1000)
+	csv = tmp_path/'a.csv'
+	np.savetxt(csv, np.column_stack((t, dist)), delimiter=',',
+		header='t,range', comments='')
+	npy = tmp_path/'a.npy'
+	rec = np.empty(t.size, dtype=[('t', 'f8'), ('range', 'f8')])
+	rec['t'], rec['range'] = t, dist
+	np.save(npy, rec)
+	ref = trajectory.evaluate(trajectory.chunked(t, dist, 64), CAMERA)
+	for chunks in (trajectory.read_csv(str(csv), 64),
+		trajectory.read_npy(str(npy), 64)):
+		s = trajectory.evaluate(chunks, CAMERA)
+		assert s == pytest.approx(ref, rel=1e-12)
+
+def test_empty_chunks_ignored():
+	t, dist = _approach(100)
+	chunks = [(t[:50], dist[:50]), (t[:0], dist[:0]), (t[50:], dist[50:])]
+	assert trajectory.evaluate(chunks, CAMERA) == pytest.approx(
+		trajectory.evaluate([(t, dist)], CAMERA), rel=1e-12)
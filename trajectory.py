@@ -0,0 +1,171 @@
+#!/usr/bin/python3
+
+#
+# trajectory.py
+#
+# streaming evaluation of a camera along an approach / docking trajectory:
+# timestamped target ranges come in chunks (from a CSV or .npy file, or
+# any generator), every frame gets its blur, pixels on target and a
+# detectability flag, and running summaries (first detection, time in
+# focus, ...) are updated chunk by chunk. memory is bounded by the chunk
+# size, not by the length of the trajectory
+#
+# usage:
+#	ev = TrajectoryEvaluator(catalog.LIES[2], feat_size=0.1)	# docking
+#	for frames in ev.run(read_csv('approach.csv')):
+#		...				# per frame arrays, one chunk at a time
+#	ev.summary()
+#
+
+from itertools import islice
+import numpy as np
+import camera_model as cm
+
+CHUNK_SIZE = 1 << 16
+
+def read_csv(path, chunk_size = CHUNK_SIZE, columns = (0, 1), header = 1):
+	"""
+	yield (t, dist) chunks of a CSV trajectory, time in s, range in m
+	columns: indices of the time and range columns
+	header: number of header lines to skip
+	"""
+	with open(path) as f:
+		for _ in range(header):
+			f.readline()
+		while True:
+			lines = list(islice(f, chunk_size))
+			if not lines:
+				return
+			data = np.loadtxt(lines, delimiter=',', usecols=columns, ndmin=2)
+			yield data[:, 0], data[:, 1]
+
+def read_npy(path, chunk_size = CHUNK_SIZE):
+	"""
+	yield (t, dist) chunks of a .npy trajectory, either an (n, 2) array or
+	a structured one with 't' and 'range' fields; the file is memory-mapped
+	"""
+	data = np.load(path, mmap_mode='r')
+	for start in range(0, len(data), chunk_size):
+		block = data[start:start + chunk_size]
+		if block.dtype.names:
+			yield np.asarray(block['t'], float), np.asarray(block['range'], float)
+		else:
+			yield np.asarray(block[:, 0], float), np.asarray(block[:, 1], float)
+
+def chunked(t, dist, chunk_size = CHUNK_SIZE):
+	"""yield (t, dist) chunks of in-memory arrays"""
+	for start in range(0, len(t), chunk_size):
+		yield t[start:start + chunk_size], dist[start:start + chunk_size]
+
+class TrajectoryEvaluator:
+	"""
+	one camera along one trajectory; feed chunks in time order to update()
+	camera: catalog.Camera, focus None is the hyperfocal distance
+	accept_coc: acceptable CoC in pixels
+	feat_size: feature size in m, min_n_pixel pixels needed to detect it
+	cover: fraction of the FoV the feature may fill (see
+	camera_model.min_target_dist_with_cover)
+	a frame is detectable when the feature is in focus, spans at least
+	min_n_pixel and fits in the view; a frame's state holds until the next
+	timestamp
+	"""
+
+	def __init__(self, camera, accept_coc = 4, feat_size = 0.1,
+		min_n_pixel = 10, cover = 1):
+		self.camera = camera
+		self.accept_coc = accept_coc
+		self.feat_size = feat_size
+		self.min_n_pixel = min_n_pixel
+		focus = camera.focus
+		if focus is None:
+			focus = cm.hyperfocal_dist(camera.focal_length, camera.f_number,
+				accept_coc*camera.pixel_size/cm.MM_2_UM)/cm.M_2_MM
+		self.s_s = cm.dof2s_s(focus, camera.focal_length)
+		self.min_dist = cm.min_target_dist_with_cover(camera.fov_y, feat_size,
+			cover)
+		self.reset()
+
+	def reset(self):
+		self.frames = 0
+		self.t_start = self.t_end = None
+		self.first_detection = self.last_detection = None
+		self.first_in_focus = None
+		self.time_in_focus = 0.
+		self.time_detectable = 0.
+		self.max_blur = 0.
+		self.min_range = np.inf
+		self._last = None		# (t, in_focus, detectable) of the last frame
+
+	def update(self, t, dist):
+		"""
+		evaluate one chunk, return the per frame dict: t, dist, blur (CoC in
+		pixels), pixels (on target), in_focus, detectable
+		"""
+		t = np.asarray(t, dtype=np.float64)
+		dist = np.asarray(dist, dtype=np.float64)
+		c = self.camera
+		blur = cm.get_circle_of_confusion_in_pix(dist, c.f_number,
+			c.focal_length, self.s_s, c.pixel_size)
+		pixels = cm.target_size_in_pix(dist, c.fov_y, c.res_y, self.feat_size)
+		in_focus = blur <= self.accept_coc
+		detectable = in_focus & (pixels >= self.min_n_pixel) & \
+			(dist >= self.min_dist)
+		if t.size:
+			self._accumulate(t, dist, blur, in_focus, detectable)
+		return dict(t=t, dist=dist, blur=blur, pixels=pixels, in_focus=in_focus,
+			detectable=detectable)
+
+	def _accumulate(self, t, dist, blur, in_focus, detectable):
+		if self._last is not None:
+			t_prev, f_prev, d_prev = self._last
+			tt = np.concatenate(([t_prev], t))
+			ff = np.concatenate(([f_prev], in_focus))
+			dd = np.concatenate(([d_prev], detectable))
+		else:
+			tt, ff, dd = t, in_focus, detectable
+			self.t_start = float(t[0])
+		dt = np.diff(tt)
+		self.time_in_focus += float(np.sum(dt[ff[:-1]]))
+		self.time_detectable += float(np.sum(dt[dd[:-1]]))
+		self._last = (t[-1], in_focus[-1], detectable[-1])
+		self.t_end = float(t[-1])
+
+		self.frames += t.size
+		self.max_blur = max(self.max_blur, float(np.max(blur)))
+		self.min_range = min(self.min_range, float(np.min(dist)))
+		i = np.flatnonzero(detectable)
+		if i.size:
+			if self.first_detection is None:
+				self.first_detection = float(t[i[0]])
+			self.last_detection = float(t[i[-1]])
+		if self.first_in_focus is None and in_focus.any():
+			self.first_in_focus = float(t[np.argmax(in_focus)])
+
+	def run(self, chunks):
+		"""evaluate every (t, dist) chunk, yielding the per frame dicts"""
+		for t, dist in chunks:
+			yield self.update(t, dist)
+
+	def summary(self):
+		"""return the running summaries as a dict; times in s, ranges in m"""
+		return dict(frames=self.frames, t_start=self.t_start, t_end=self.t_end,
+			first_detection=self.first_detection,
+			last_detection=self.last_detection,
+			first_in_focus=self.first_in_focus,
+			time_in_focus=self.time_in_focus,
+			time_detectable=self.time_detectable,
+			max_blur=self.max_blur, min_range=self.min_range)
+
+def evaluate(chunks, camera, accept_coc = 4, feat_size = 0.1, min_n_pixel = 10,
+	cover = 1, sink = None):
+	"""
+	evaluate a whole trajectory, return the summary dict
+	sink: optional callable(frames) given every per frame chunk, e.g. to
+	write the frames out; nothing is kept otherwise
+	"""
+	ev = TrajectoryEvaluator(camera, accept_coc, feat_size, min_n_pixel, cover)
+	for frames in ev.run(chunks):
+		if sink is not None:
+			sink(frames)
+	return ev.summary()
+